@@ -93,6 +93,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "store",
     'django',
     "corsheaders",  # Correct name
@@ -154,6 +155,9 @@ DATABASES = {
         'OPTIONS': {
             'sslmode': 'require',  # Enforce SSL
         },
+        # Streaming endpoints read with server-side cursors; set this when
+        # connecting through the transaction-mode pooler, which cannot hold them.
+        'DISABLE_SERVER_SIDE_CURSORS': env.bool('DISABLE_SERVER_SIDE_CURSORS', default=False),
     }
 }
 
@@ -232,7 +236,22 @@ LOGGING = {
 }
 
 CACHES = {
+    # Per-process LRU in front of Redis for the hot keys read on every request;
+    # other processes are told to drop their copies over Redis pub/sub
+    # (see store/services/two_tier_cache.py)
     'default': {
+        'BACKEND': 'store.services.two_tier_cache.TwoTierCache',
+        'OPTIONS': {
+            'REMOTE': 'redis',
+            # Catalog/partition generations, featured ranking and seller caches; never locks
+            'LOCAL_KEYS': r'(?!.*:lock$)(catalog_version$|catalog_modified_at$|catalog_partition:'
+                          r'|featured_ranking$|seller_products:|seller_low_stock:)',
+            'MAX_ENTRIES': 2048,
+            'LOCAL_TIMEOUT': 60,  # bounds staleness if an invalidation is missed
+            'INVALIDATION': 'pubsub',
+        },
+    },
+    'redis': {
         'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': 'redis://127.0.0.1:6379/1',  # Adjust host, port, and DB number as needed
         'OPTIONS': {
@@ -244,6 +263,13 @@ CACHES = {
 # Optionally set a default cache timeout (in seconds)
 CACHE_TTL = 60 * 15  # 15 minutes
 
+# Product search backend: "index" (in-memory inverted index) or "postgres"
+# (full-text search + pg_trgm, see store/migrations/0003_product_search_vector.py)
+PRODUCT_SEARCH_BACKEND = env("PRODUCT_SEARCH_BACKEND", default="index")
+
+# Catalog snapshots are keyed by catalog version, so they can live much longer
+CATALOG_CACHE_TTL = 60 * 60 * 24  # 24 hours
+
 # settings.py
 
 # Email settings
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.services.orm_queries import supabase
+from store.services.storage_urls import PRODUCT_IMAGE_BUCKET, clear_public_url_cache, public_url
+
+IMAGE_FIELDS = ("image_url", "image_url2", "image_url3", "image_url4")
+
+
+class Command(BaseCommand):
+    help = "Compare per-product public URL cost of the Supabase client against the local resolver."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500,
+                            help="Number of products to resolve (synthetic keys if the catalog is smaller).")
+        parser.add_argument("--repeat", type=int, default=5, help="Passes over the product set.")
+
+    def _image_keys(self, count):
+        rows = list(Product.objects.filter(is_deleted=False).values_list(*IMAGE_FIELDS)[:count])
+        rows += [tuple(f"uploads/20240101000000_product_{i}_{n}.png" for n in range(4))
+                 for i in range(len(rows), count)]
+        return rows
+
+    def _time(self, resolve, rows, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for keys in rows:
+                for key in keys:
+                    if key:
+                        resolve(key)
+        return (time.perf_counter() - start) * 1_000_000 / (len(rows) * repeat)
+
+    def handle(self, *args, **options):
+        rows = self._image_keys(options["products"])
+        repeat = options["repeat"]
+
+        mismatches = [key for keys in rows for key in keys
+                      if key and public_url(key) != supabase.storage.from_(PRODUCT_IMAGE_BUCKET).get_public_url(key)]
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} keys resolve differently, e.g. {mismatches[0]!r}"))
+
+        client = self._time(lambda key: supabase.storage.from_(PRODUCT_IMAGE_BUCKET).get_public_url(key), rows, repeat)
+        clear_public_url_cache()
+        cold = self._time(public_url, rows, 1)
+        warm = self._time(public_url, rows, repeat)
+
+        self.stdout.write(f"{len(rows)} products x {repeat} passes")
+        self.stdout.write(f"supabase client   {client:8.2f} us/product")
+        self.stdout.write(f"resolver (cold)   {cold:8.2f} us/product")
+        self.stdout.write(f"resolver (warm)   {warm:8.2f} us/product  ({client / warm:.0f}x faster)")
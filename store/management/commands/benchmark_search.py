@@ -0,0 +1,42 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services.orm_queries import search_products_postgres
+from store.services.search_index import get_search_index
+
+DEFAULT_QUERIES = ["shirt", "denim jacket", "vintge", "blue cotton", "sneakers", "dres"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the in-memory and PostgreSQL product search backends against the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", help="Queries to run (defaults to a small mixed set).")
+        parser.add_argument("--repeat", type=int, default=50, help="Runs per query and backend.")
+
+    def _time(self, func, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = func(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return results, timings
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or DEFAULT_QUERIES
+        repeat = options["repeat"]
+
+        start = time.perf_counter()
+        index = get_search_index()
+        self.stdout.write(f"In-memory index ready ({len(index)} products) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        backends = [("index", index.search), ("postgres", search_products_postgres)]
+        for query in queries:
+            for name, func in backends:
+                results, timings = self._time(func, query, repeat)
+                self.stdout.write(
+                    f"{name:<9} {query!r:<18} hits={len(results):<5} "
+                    f"median={statistics.median(timings):.2f} ms  p95={sorted(timings)[max(int(len(timings) * 0.95) - 1, 0)]:.2f} ms"
+                )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from store.services import search_cache
+from store.services.cache_flight import reset_shared_stats, shared_stats
+
+
+class Command(BaseCommand):
+    help = ("Show the cache rebuild, lock-wait and stale-serve counters and the search result cache "
+            "hit rate, summed over all workers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = shared_stats()
+        for metric, value in stats.items():
+            self.stdout.write(f"{metric:<20} {value}")
+        if stats["rebuilds"]:
+            self.stdout.write(f"{'avg_build_ms':<20} {stats['build_ms'] / stats['rebuilds']:.1f}")
+        if stats["lock_waits"]:
+            self.stdout.write(f"{'avg_lock_wait_ms':<20} {stats['lock_wait_ms'] / stats['lock_waits']:.1f}")
+
+        self.stdout.write("")
+        self.stdout.write("search result cache")
+        for metric, value in search_cache.shared_stats().items():
+            self.stdout.write(f"{metric:<20} {'-' if value is None else value}")
+
+        if options["reset"]:
+            reset_shared_stats()
+            search_cache.reset_shared_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services.featured import compute_featured_ranking
+
+
+class Command(BaseCommand):
+    help = "Recompute the storefront featured ranking (run from cron, e.g. hourly)."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ranking = compute_featured_ranking()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {len(ranking['ids'])} products in {elapsed:.0f} ms"
+        ))
+        for product_id, score in list(zip(ranking["ids"], ranking["scores"]))[:10]:
+            self.stdout.write(f"  #{product_id}: {score:.3f}")
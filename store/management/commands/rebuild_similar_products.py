@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services.similar import SIMILAR_BATCH_SIZE, SIMILAR_TOP_K, rebuild_similar_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the TF-IDF product vectors and precompute every product's similar items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SIMILAR_BATCH_SIZE,
+                            help="Products scored per pass.")
+        parser.add_argument("--top-k", type=int, default=SIMILAR_TOP_K, help="Neighbours stored per product.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_similar_products(batch_size=options["batch_size"], limit=options["top_k"])
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(self.style.SUCCESS(f"Computed similar items for {count} products in {elapsed:.0f} ms"))
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'is_deleted', '-created_at'], name='product_listing_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'is_deleted', 'price'], name='product_listing_price_idx'),
+        ),
+    ]
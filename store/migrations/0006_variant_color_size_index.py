@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_co_purchase'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['color', 'size'], name='variant_color_size_idx'),
+        ),
+    ]
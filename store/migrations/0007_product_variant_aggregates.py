@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_variant_color_size_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='variant_colors',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='variant_max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='variant_min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='variant_stock',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_variant_aggregates'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_listing_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_listing_price_idx',
+        ),
+    ]
@@ -1,7 +1,145 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils import timezone
 import uuid
 from django.utils.text import slugify
+from store.services.catalog_cache import invalidate_catalog, invalidate_stock, seller_partition, category_partition
+
+
+class CatalogQuerySet(models.QuerySet):
+    """
+    QuerySet for models whose rows show up in the catalog caches. Bulk writes
+    (update, bulk_update, bulk_create, delete) invalidate those caches the way
+    the models' save() and delete() do; update() also moves updated_at unless
+    it is given, so incremental snapshot refreshes and the delta-sync feed see
+    the change.
+    """
+    # field -> partition function; a row belongs to the partitions of its values
+    partition_fields = {}
+    # Deleting these rows cascades to products of other partitions
+    delete_cascades = True
+    # Fields of these rows indexed into Product.search_vector, and the product
+    # lookup that finds the products they feed
+    search_vector_fields = ()
+    search_vector_lookup = None
+
+    def _matched_partitions(self):
+        fields = list(self.partition_fields)
+        partitions = set()
+        for values in self.order_by().values_list(*fields).distinct():
+            partitions.update(self.partition_fields[field](value) for field, value in zip(fields, values)
+                              if value is not None)
+        return partitions
+
+    def update(self, **kwargs):
+        if any(field.name == "updated_at" for field in self.model._meta.concrete_fields):
+            kwargs.setdefault("updated_at", timezone.now())
+        partitions = self._matched_partitions()
+        for field, partition in self.partition_fields.items():
+            for key in (field, f"{field}_id"):
+                if key not in kwargs:
+                    continue
+                value = kwargs[key]
+                if hasattr(value, "resolve_expression"):
+                    partitions = None  # rows move to partitions only the database knows
+                    break
+                partitions.add(partition(value.pk if isinstance(value, models.Model) else value))
+            if partitions is None:
+                break
+        reindexed = None
+        if self.search_vector_lookup and self.search_vector_fields.intersection(kwargs):
+            reindexed = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        if reindexed:
+            Product.update_search_vectors(**{f"{self.search_vector_lookup}__in": reindexed})
+        if rows:
+            invalidate_catalog(partitions)
+        return rows
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        # Runs through update(), one call per batch
+        objs = list(objs)
+        if "updated_at" not in fields and any(field.name == "updated_at" for field in self.model._meta.concrete_fields):
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields = [*fields, "updated_at"]
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+    bulk_update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            invalidate_catalog({
+                partition(getattr(obj, self.model._meta.get_field(field).attname))
+                for obj in objs for field, partition in self.partition_fields.items()
+            })
+        return objs
+    bulk_create.alters_data = True
+
+    def delete(self):
+        partitions = None if self.delete_cascades else self._matched_partitions()
+        result = super().delete()
+        if result[0]:
+            invalidate_catalog(partitions)
+        return result
+    delete.alters_data = True
+
+
+class AdminStoreQuerySet(CatalogQuerySet):
+    partition_fields = {"id": seller_partition}
+
+
+class CategoryQuerySet(CatalogQuerySet):
+    partition_fields = {"id": category_partition}
+    search_vector_fields = {"name"}
+    search_vector_lookup = "category"
+
+
+class SubcategoryQuerySet(CatalogQuerySet):
+    partition_fields = {"category": category_partition}
+    search_vector_fields = {"name"}
+    search_vector_lookup = "subcategory"
+
+
+class ProductQuerySet(CatalogQuerySet):
+    partition_fields = {"admin_id": seller_partition, "category": category_partition}
+    delete_cascades = False
+    search_vector_fields = {"name", "description", "category", "category_id", "subcategory", "subcategory_id"}  # Product.SEARCH_VECTOR_SOURCES
+    search_vector_lookup = "pk"
+
+
+class ProductVariantQuerySet(models.QuerySet):
+    """Bulk variant writes refresh the variant aggregates of the products they touch."""
+
+    def _refresh_products(self, product_ids):
+        for product in Product.objects.filter(id__in=product_ids):
+            product.refresh_variant_aggregates()
+
+    def update(self, **kwargs):
+        product_ids = set(self.values_list("product_id", flat=True))
+        rows = super().update(**kwargs)
+        self._refresh_products(product_ids | ({kwargs["product_id"]} if "product_id" in kwargs else set()))
+        return rows
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._refresh_products({obj.product_id for obj in objs})
+        return objs
+    bulk_create.alters_data = True
+
+    def delete(self):
+        product_ids = set(self.values_list("product_id", flat=True))
+        result = super().delete()
+        self._refresh_products(product_ids)
+        return result
+    delete.alters_data = True
+
 
 class User(models.Model):
     id = models.TextField(primary_key=True)  # Supabase stores user ID as TEXT
@@ -26,9 +164,21 @@ class AdminStore(models.Model):
     pincode = models.CharField(max_length=10)
     is_approved = models.BooleanField(default=False)  # Approval system for admins
 
+    objects = AdminStoreQuerySet.as_manager()
+
     def __str__(self):
         return self.company_name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_catalog({seller_partition(self.pk)})
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        # Cascades to products in every category
+        invalidate_catalog()
+        return result
+
 class PromoCode(models.Model):
     id = models.AutoField(primary_key=True)  # Integer primary key
     code = models.TextField(unique=True, blank=True, null=True)
@@ -51,11 +201,24 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CategoryQuerySet.as_manager()
     
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        # The name is indexed into its products' search_vector
+        renamed = self.pk is not None and Category._base_manager.filter(pk=self.pk).exclude(name=self.name).exists()
         super().save(*args, **kwargs)
+        if renamed:
+            Product.update_search_vectors(category=self.pk)
+        invalidate_catalog({category_partition(self.pk)})
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        # Cascades to products of every seller
+        invalidate_catalog()
+        return result
     
     def __str__(self):
         return self.name
@@ -71,12 +234,26 @@ class Subcategory(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SubcategoryQuerySet.as_manager()
     
     def save(self, *args, **kwargs):
         if not self.slug:
             # Create a unique slug by combining category and subcategory names
             self.slug = slugify(f"{self.category.name}-{self.name}")
+        # The name is indexed into its products' search_vector
+        renamed = (self.pk is not None
+                   and Subcategory._base_manager.filter(pk=self.pk).exclude(name=self.name).exists())
         super().save(*args, **kwargs)
+        if renamed:
+            Product.update_search_vectors(subcategory=self.pk)
+        invalidate_catalog({category_partition(self.category_id)})
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        # Cascades to products of every seller
+        invalidate_catalog()
+        return result
     
     def __str__(self):
         return f"{self.category.name} - {self.name}"
@@ -112,16 +289,145 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)  # Add this line
     is_deleted = models.BooleanField(default=False)  # New field for soft deletion
     stock = models.IntegerField(default=1)
+    # Full-text document over name, description, category and subcategory names
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalised from the variants (see refresh_variant_aggregates) so listings
+    # can show "from ₹X" and "N colors" without loading them
+    variant_min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    variant_max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    variant_stock = models.IntegerField(default=0, editable=False)
+    variant_colors = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    # Fields that feed search_vector; saving a changed value of any of them refreshes it.
+    SEARCH_VECTOR_SOURCES = {"name", "description", "category", "category_id", "subcategory", "subcategory_id"}
+    # A save limited to these (update_fields) is a stock change; see save()
+    STOCK_FIELDS = {"stock", "is_active", "updated_at"}
     
     def __str__(self):
         return f"Product {self.id} - {self.name} ({self.admin_id.company_name if self.admin_id else 'No Admin'})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() can tell what changed since the load
+        instance._loaded_partitions = instance._current_partitions()
+        instance._loaded_listing_state = instance._listing_state()
+        instance._loaded_search_sources = instance._search_sources()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if ((update_fields is None or self.SEARCH_VECTOR_SOURCES.intersection(update_fields))
+                and self._search_sources() != getattr(self, "_loaded_search_sources", None)):
+            self.update_search_vector()
+        if (update_fields is not None and self.STOCK_FIELDS.issuperset(update_fields)
+                and self._listing_state() == getattr(self, "_loaded_listing_state", None)):
+            # Still listed and still (out of) stock: the storefront snapshot may lag
+            invalidate_stock(self.catalog_partitions())
+        else:
+            invalidate_catalog(self.catalog_partitions())
+        self._loaded_partitions = self._current_partitions()
+        self._loaded_listing_state = self._listing_state()
+        self._loaded_search_sources = self._search_sources()
+
+    @staticmethod
+    def variant_aggregates(variants):
+        """Aggregate field values for an iterable of (color, price, stock) rows."""
+        variants = list(variants)
+        prices = [price for _, price, _ in variants if price is not None]
+        colors = []
+        for color, _, _ in variants:
+            if color and color not in colors:
+                colors.append(color)
+        return {
+            "variant_min_price": min(prices) if prices else None,
+            "variant_max_price": max(prices) if prices else None,
+            "variant_stock": sum(stock or 0 for _, _, stock in variants),
+            "variant_colors": colors,
+        }
+
+    def refresh_variant_aggregates(self):
+        """Recompute the variant_* fields from this product's variants."""
+        aggregates = self.variant_aggregates(
+            self.variants.order_by("id").values_list("color", "price", "stock"))
+        for field, value in aggregates.items():
+            setattr(self, field, value)
+        # updated_at moves too, so the delta-sync feed picks the change up
+        Product._base_manager.filter(pk=self.pk).update(updated_at=timezone.now(), **aggregates)
+        invalidate_catalog(self.catalog_partitions())
+
+    def _current_partitions(self):
+        # Read from __dict__ so deferred fields are not loaded just for this
+        values = self.__dict__
+        partitions = set()
+        if values.get("admin_id_id") is not None:
+            partitions.add(seller_partition(values["admin_id_id"]))
+        if values.get("category_id") is not None:
+            partitions.add(category_partition(values["category_id"]))
+        return partitions
+
+    def _search_sources(self):
+        # The values search_vector is built from, as saved
+        values = self.__dict__
+        return tuple(values.get(field) for field in ("name", "description", "category_id", "subcategory_id"))
+
+    def _listing_state(self):
+        # What the storefront snapshot filters on: listed, and in stock
+        values = self.__dict__
+        return values.get("is_active"), values.get("is_deleted"), (values.get("stock") or 0) > 0
+
+    def catalog_partitions(self):
+        """
+        The seller and category cache partitions this product is in, and was in
+        when loaded; see catalog_cache.
+        """
+        return self._current_partitions() | getattr(self, "_loaded_partitions", set())
+
+    def update_search_vector(self):
+        """Rebuild the weighted tsvector for this product (PostgreSQL only)."""
+        Product.update_search_vectors(pk=self.pk)
+
+    @staticmethod
+    def update_search_vectors(**filters):
+        """
+        Rebuild the weighted tsvector of the products matching `filters` in one
+        UPDATE, reading the category and subcategory names in the database
+        (PostgreSQL only).
+        """
+        if connection.vendor != "postgresql":
+            return
+        category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+        subcategory_name = Subquery(Subcategory.objects.filter(pk=OuterRef("subcategory_id")).values("name")[:1])
+        def text(expression):
+            return Coalesce(expression, Value(""), output_field=models.TextField())
+
+        vector = (
+            SearchVector(F("name"), weight="A", config="english")
+            + SearchVector(text(category_name), weight="B", config="english")
+            + SearchVector(text(subcategory_name), weight="B", config="english")
+            + SearchVector(text(F("description")), weight="C", config="english")
+        )
+        # Base manager: not catalog-visible, so no cache invalidation
+        Product._base_manager.filter(**filters).update(search_vector=vector)
+
     def delete(self, *args, **kwargs):
         """Soft delete instead of actual deletion."""
         self.is_deleted = True
         self.save()
     class Meta:
         ordering = ["-created_at"]  # Show latest products first
+        indexes = [
+            # Full-text search and pg_trgm similarity ranking on the name
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(fields=["name"], name="product_name_trgm_idx", opclasses=["gin_trgm_ops"]),
+            # Delta-sync feed: range scans on (updated_at, id) after a token
+            models.Index(fields=["updated_at", "id"], name="product_changes_idx"),
+            # JSON API listing: keyset pages on (created_at, id), newest first
+            models.Index(fields=["-created_at", "-id"], name="product_api_order_idx"),
+        ]
 
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variants")
@@ -134,8 +440,26 @@ class ProductVariant(models.Model):
     # Field to store additional image URLs (as a JSON array)
     additional_image_urls = models.JSONField(blank=True, null=True)
 
+    objects = ProductVariantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Attribute filters and lookups: "black", "black / M"
+            models.Index(fields=["color", "size"], name="variant_color_size_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.color} ({self.size or 'Standard'})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.product.refresh_variant_aggregates()
+
+    def delete(self, *args, **kwargs):
+        product = self.product
+        result = super().delete(*args, **kwargs)
+        product.refresh_variant_aggregates()
+        return result
     
 class Order(models.Model):
     id = models.AutoField(primary_key=True)
@@ -183,6 +507,26 @@ class OrderItem(models.Model):
         return f"Item {self.id} - {self.name} (Store: {self.admin.company_name if self.admin else 'Unknown'})"
 
 
+class ProductCoPurchase(models.Model):
+    """
+    Sparse item-item co-purchase matrix: `orders` is the number of orders that
+    contained both `product` and `other`. Each pair is stored in both directions.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'other')
+        indexes = [
+            # "Frequently bought together": a product's neighbours, most shared orders first
+            models.Index(fields=["product", "-orders"], name="co_purchase_top_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id} ({self.orders} orders)"
+
+
 class Cart(models.Model):
     user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart', to_field="id", db_column="user_id")
     product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
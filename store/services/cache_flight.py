@@ -0,0 +1,197 @@
+"""
+Stampede protection for expensive cached values.
+
+`get_or_build` wraps a cache key whose value is costly to compute (the catalog
+snapshots, a seller's product list, dashboard panels):
+
+- Single flight: on a miss only the process that wins a short `cache.add` lock
+  runs `build()`. The others serve the family's previous value (the same cache
+  under an older version or generation, found through `latest_key`) while the
+  lock is held, so the lock timeout is the grace window for stale reads. With no
+  previous value they wait for the winner, and build themselves if it takes
+  longer than CACHE_LOCK_WAIT.
+- Probabilistic early expiration (XFetch): entries remember how long they took
+  to build, and a reader refreshes one early with a probability that grows as
+  its expiry nears, scaled by that cost, so a hot key is rebuilt by a single
+  reader shortly before it would expire for everyone.
+
+Lock waits, stale serves, early refreshes and rebuilds are counted per worker
+(`local_stats`). Each worker adds its counts to the shared ones
+(`shared_stats`, shown by the `cache_stats` management command) at most every
+CACHE_STATS_FLUSH_INTERVAL seconds, so counting costs no round trip.
+
+A lock is released only by the process holding it: the delete compares the
+lock's token first, in one Lua script on Redis.
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# How long one rebuild may hold the lock, and so how long stale values are served
+CACHE_LOCK_TIMEOUT = getattr(settings, "CACHE_LOCK_TIMEOUT", 30)
+# How long a reader with nothing to serve waits for another process's rebuild
+CACHE_LOCK_WAIT = getattr(settings, "CACHE_LOCK_WAIT", 10)
+# XFetch beta: > 1 refreshes earlier, < 1 later
+CACHE_EARLY_EXPIRY_BETA = getattr(settings, "CACHE_EARLY_EXPIRY_BETA", 1.0)
+# How often a worker adds its counters to the shared ones
+CACHE_STATS_FLUSH_INTERVAL = getattr(settings, "CACHE_STATS_FLUSH_INTERVAL", 10)
+
+LOCK_KEY = "{key}:lock"
+STATS_KEY = "cache_flight_stats:{metric}"
+METRICS = ("rebuilds", "build_ms", "early_refreshes", "stale_serves", "lock_waits", "lock_wait_ms",
+           "lock_wait_timeouts")
+
+# Deletes KEYS[1] if it still holds ARGV[1]
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+_local_stats = dict.fromkeys(METRICS, 0)
+# Counts not yet added to the shared counters
+_unflushed = dict.fromkeys(METRICS, 0)
+_flushed_at = time.monotonic()
+_stats_lock = threading.Lock()
+
+
+def _count(metric, amount=1):
+    global _flushed_at
+    with _stats_lock:
+        _local_stats[metric] += amount
+        _unflushed[metric] += amount
+        if time.monotonic() - _flushed_at < CACHE_STATS_FLUSH_INTERVAL:
+            return
+        _flushed_at = time.monotonic()
+    flush_stats()
+
+
+def flush_stats():
+    """Add this worker's counts since the last flush to the shared counters."""
+    with _stats_lock:
+        pending = {metric: amount for metric, amount in _unflushed.items() if amount}
+        _unflushed.update(dict.fromkeys(pending, 0))
+    try:
+        for metric, amount in pending.items():
+            key = STATS_KEY.format(metric=metric)
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                if not cache.add(key, amount, timeout=None):
+                    cache.incr(key, amount)
+    except Exception as e:
+        logger.warning("Failed to flush cache stats: %s", e)
+
+
+def local_stats():
+    """This worker's counters."""
+    with _stats_lock:
+        return dict(_local_stats)
+
+
+def shared_stats():
+    """Counters summed over every process since they were last reset."""
+    values = cache.get_many([STATS_KEY.format(metric=metric) for metric in METRICS])
+    return {metric: values.get(STATS_KEY.format(metric=metric), 0) for metric in METRICS}
+
+
+def reset_shared_stats():
+    cache.delete_many([STATS_KEY.format(metric=metric) for metric in METRICS])
+
+
+def _release(lock_key, token):
+    """Delete `lock_key` if it still holds `token`; an expired lock may have been taken over."""
+    # The lock keys are never kept in a TwoTierCache's local tier
+    backend = getattr(cache, "remote", cache)
+    client = getattr(backend, "client", None)
+    if hasattr(client, "get_client"):  # django_redis
+        client.get_client(write=True).eval(RELEASE_SCRIPT, 1, client.make_key(lock_key), client.encode(token))
+    elif cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _expired_early(entry):
+    """XFetch: whether to refresh now, given the entry's build time and expiry."""
+    _, delta, expires_at = entry
+    if expires_at is None:
+        return False
+    return time.time() - delta * CACHE_EARLY_EXPIRY_BETA * math.log(1.0 - random.random()) >= expires_at
+
+
+def peek(key):
+    """The value stored at `key` by get_or_build, or None."""
+    entry = cache.get(key)
+    return entry[0] if entry is not None else None
+
+
+def _build(key, build, timeout, latest_key, lock_key, token):
+    started = time.perf_counter()
+    try:
+        value = build()
+        delta = time.perf_counter() - started
+        cache.set(key, (value, delta, time.time() + timeout if timeout else None), timeout)
+        if latest_key:
+            cache.set(latest_key, key, timeout)
+    finally:
+        _release(lock_key, token)
+    _count("rebuilds")
+    _count("build_ms", int(delta * 1000))
+    return value
+
+
+def get_or_build(key, build, timeout, latest_key=None, stale=None):
+    """
+    Return (value, is_stale) for `key`, building it with `build()` when missing
+    or due for early refresh, at most one process at a time.
+
+    `latest_key` is a stable key remembering the last key of this family that
+    was built; its value is served (is_stale=True) while another process
+    rebuilds. `stale`, if given, is served in preference to fetching that.
+    """
+    lock_key = LOCK_KEY.format(key=key)
+    entry = cache.get(key)
+    if entry is not None:
+        if not _expired_early(entry):
+            return entry[0], False
+        token = uuid.uuid4().hex
+        if not cache.add(lock_key, token, CACHE_LOCK_TIMEOUT):
+            return entry[0], False  # someone else is already refreshing it
+        _count("early_refreshes")
+        return _build(key, build, timeout, latest_key, lock_key, token), False
+
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, CACHE_LOCK_TIMEOUT):
+        return _build(key, build, timeout, latest_key, lock_key, token), False
+
+    # Another process is rebuilding: serve the previous value if there is one
+    if stale is None and latest_key:
+        previous_key = cache.get(latest_key)
+        if previous_key is not None and previous_key != key:
+            stale = peek(previous_key)
+    if stale is not None:
+        _count("stale_serves")
+        return stale, True
+
+    # Nothing to serve: wait for the rebuild, then build ourselves as a last resort
+    _count("lock_waits")
+    started = time.perf_counter()
+    delay = 0.05
+    try:
+        while time.perf_counter() - started < CACHE_LOCK_WAIT:
+            time.sleep(delay)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0], False
+            if cache.add(lock_key, token, CACHE_LOCK_TIMEOUT):
+                return _build(key, build, timeout, latest_key, lock_key, token), False
+            delay = min(delay * 2, 0.5)
+        _count("lock_wait_timeouts")
+        logger.warning("Gave up waiting %.0fs for %s to be rebuilt; building it here", CACHE_LOCK_WAIT, key)
+        # Our token never matches the held lock, so it is left alone
+        return _build(key, build, timeout, latest_key, lock_key, token), False
+    finally:
+        _count("lock_wait_ms", int((time.perf_counter() - started) * 1000))
@@ -0,0 +1,72 @@
+"""
+Rendered product cards in the shared cache.
+
+A grid looks up the HTML of all its cards with one `cache.get_many` and only
+renders the cards that are missing. A card's key holds the product id, a stamp
+that moves whenever the product row changes, and a digest of the card
+template's source. Saving a product or deploying a changed template therefore
+misses the old entries without any explicit invalidation; stale cards age out
+after CARD_FRAGMENT_TIMEOUT.
+
+Stamps: catalog snapshot dicts carry `card_stamp` (the product blob stamp, which
+also covers the category and seller names shown on the card). Model instances
+use their updated_at.
+"""
+import hashlib
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+CARD_FRAGMENT_TIMEOUT = getattr(settings, "CARD_FRAGMENT_TIMEOUT", 60 * 60 * 24 * 7)
+CARD_FRAGMENT_KEY = "card_html:{template}:{version}:{product_id}:{stamp}"
+
+
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """Digest of the template source, so an edited card template gets new keys."""
+    source = get_template(template_name).template.source
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def card_stamp(product):
+    if isinstance(product, dict):
+        return product.get("card_stamp") or product.get("updated_at")
+    return product.updated_at.isoformat()
+
+
+def render_cards(template_name, products):
+    """
+    HTML of `template_name` rendered with `product` for each of `products`,
+    concatenated in order. Products without a stamp are rendered uncached.
+    """
+    template = get_template(template_name)
+    version = template_version(template_name)
+    keys = [
+        CARD_FRAGMENT_KEY.format(template=template_name, version=version, product_id=product_id, stamp=stamp)
+        if stamp else None
+        for product_id, stamp in ((_product_id(product), card_stamp(product)) for product in products)
+    ]
+    found = cache.get_many([key for key in keys if key])
+
+    cards, rendered = [], {}
+    for product, key in zip(products, keys):
+        html = found.get(key) if key else None
+        if html is None:
+            html = template.render({"product": product})
+            if key:
+                rendered[key] = html
+        cards.append(html)
+    if rendered:
+        cache.set_many(rendered, CARD_FRAGMENT_TIMEOUT)
+        logger.debug("Rendered %d of %d %s cards", len(rendered), len(keys), template_name)
+    return mark_safe("".join(cards))
+
+
+def _product_id(product):
+    return product["id"] if isinstance(product, dict) else product.id
@@ -0,0 +1,319 @@
+"""
+Versioned catalog snapshots.
+
+The storefront reads the product catalog far more often than sellers change it,
+so the active product list (the "active_products" snapshot behind
+`get_active_products_by_id` and every structure derived from it) is built once
+per catalog version, stored in the configured cache and mirrored in a per-worker
+dict. In steady state a request costs one cache lookup for the
+version number and never touches Postgres.
+
+Any change to catalog-visible state bumps the catalog version; every snapshot
+built for an older version is then ignored and rebuilt lazily on the next read.
+
+Caches that only depend on one seller's or one category's products are keyed
+by that partition's generation instead (`get_partition_generation`). A product
+change bumps only its own seller and category (`bump_partitions`), so those
+caches stay warm for everyone else. Model writes trigger both automatically
+through `invalidate_catalog`, called from the catalog models' save() and
+delete() and from their CatalogQuerySet bulk writes (see store.models). A
+save of a product's stock alone only bumps its partitions
+(`invalidate_stock`).
+
+A snapshot with a registered refresher is not rebuilt from scratch on a
+version bump: the previous snapshot (this worker's, or the latest one in the
+shared cache) is patched with the rows changed since it was built. Only a
+snapshot format change, a missing previous snapshot or a refresher that gives
+up causes a full build. Only one process builds each version; the others keep
+serving the previous snapshot until it is published (see cache_flight).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from store.services.cache_flight import get_or_build, peek
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog_version"
+CATALOG_MODIFIED_KEY = "catalog_modified_at"
+# Bump when the stored shape of any snapshot changes: forces full builds
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_KEY = "catalog_snapshot:{name}:f%d:v{version}" % SNAPSHOT_FORMAT
+SNAPSHOT_LATEST_KEY = "catalog_snapshot:{name}:f%d:latest" % SNAPSHOT_FORMAT
+SNAPSHOT_TIMEOUT = getattr(settings, "CATALOG_CACHE_TTL", 60 * 60 * 24)
+# Per-seller / per-category generations, for caches scoped to one of them
+PARTITION_KEY = "catalog_partition:{partition}"
+ALL_PARTITIONS = "all"
+# Refreshes re-read rows changed this long before the previous build started,
+# so a transaction that commits late with an earlier updated_at is not missed.
+SNAPSHOT_REFRESH_OVERLAP = timedelta(seconds=getattr(settings, "CATALOG_CHANGES_SETTLE_SECONDS", 2))
+
+# name -> (version, data, built_at); shared by all threads of this worker process.
+_local_snapshots = {}
+_local_lock = threading.RLock()
+
+# name -> refresh(data, since); see register_snapshot_refresher
+_refreshers = {}
+
+
+def _initial_version():
+    # Seed from the clock so a version key lost to eviction or a Redis restart
+    # never resets to a number an older snapshot is still stored under.
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    """Return the current catalog version, initialising it if needed."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY) or _initial_version()
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every catalog snapshot by moving to a new version."""
+    try:
+        version = cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key missing: start a fresh, strictly newer sequence.
+        version = _initial_version()
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+    logger.info("Catalog version bumped to %s", version)
+    return version
+
+
+def seller_partition(seller_id):
+    return f"seller:{seller_id}"
+
+
+def category_partition(category_id):
+    return f"category:{category_id}"
+
+
+def get_partition_generation(partition):
+    """
+    Generation of one catalog partition (see seller_partition /
+    category_partition), for keying caches that only depend on that seller's or
+    category's products. Moves when a product in the partition changes, or when
+    every partition is invalidated at once.
+    """
+    return get_partition_generations([partition])
+
+
+def get_partition_generations(partitions):
+    """Combined generation of several partitions, read with one cache round trip."""
+    keys = [PARTITION_KEY.format(partition=partition) for partition in (ALL_PARTITIONS, *partitions)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Clock-seeded like the catalog version, so a lost counter never repeats
+            cache.add(key, _initial_version(), timeout=None)
+            generations[key] = cache.get(key) or _initial_version()
+    return ".".join(str(generations[key]) for key in keys)
+
+
+def bump_partitions(partitions=None):
+    """Invalidate the caches of the given partitions, or of all of them when None."""
+    for partition in (ALL_PARTITIONS,) if partitions is None else set(partitions):
+        key = PARTITION_KEY.format(partition=partition)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def invalidate_catalog(partitions=None):
+    """
+    Bump the catalog version and the given partitions (all of them when None)
+    once the current transaction commits, or right away outside one, so no
+    reader rebuilds a snapshot from rows that are about to change. The catalog
+    models call this from save() and delete() and from their CatalogQuerySet
+    bulk writes.
+    """
+    partitions = None if partitions is None else set(partitions)
+
+    def bump():
+        bump_catalog_version()
+        bump_partitions(partitions)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_stock(partitions):
+    """
+    Like invalidate_catalog, for a product whose stock count moved while it
+    stayed listed and on the same side of zero. Only `partitions` and the
+    modification time move; the catalog version does not, so a checkout does
+    not make every worker rebuild the storefront snapshot and the structures
+    derived from it. Those pick the new count up with the next catalog change.
+    """
+    partitions = set(partitions)
+
+    def bump():
+        cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+        bump_partitions(partitions)
+
+    transaction.on_commit(bump)
+
+
+def get_catalog_revision():
+    """
+    Tag that moves with every catalog change, including the stock-only ones
+    that keep the version (see invalidate_stock); for HTTP validators.
+    """
+    version = get_catalog_version()
+    return f"{version}.{cache.get(CATALOG_MODIFIED_KEY, 0)}"
+
+
+def get_catalog_last_modified():
+    """
+    Return when the catalog last changed, as an aware UTC datetime.
+    If that moment is unknown (e.g. evicted) it is taken to be now, so clients
+    revalidate rather than keep stale data.
+    """
+    modified_at = cache.get(CATALOG_MODIFIED_KEY)
+    if modified_at is None:
+        cache.add(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+        modified_at = cache.get(CATALOG_MODIFIED_KEY) or time.time()
+    return datetime.fromtimestamp(int(modified_at), tz=timezone.utc)
+
+
+def register_snapshot_refresher(name, refresh):
+    """
+    Let snapshot `name` be patched instead of rebuilt. `refresh(data, since)`
+    returns `data` updated with every change made at or after the aware
+    datetime `since`, without mutating it, or None to ask for a full build.
+    """
+    _refreshers[name] = refresh
+
+
+def get_snapshot(name, builder):
+    """
+    Return the snapshot `name` for the current catalog version.
+
+    Lookup order is the worker-local copy, then the shared cache, then a
+    refresh of the previous snapshot or `builder()`, whose result is published
+    to both. `builder` should raise on failure so that errors are never cached
+    as an empty catalog.
+    """
+    return _get_snapshot_entry(name, builder)[1]
+
+
+def _get_snapshot_entry(name, builder):
+    """
+    (version, data) of snapshot `name`. Only one process builds a new version
+    (see cache_flight.get_or_build); while it does, the others keep serving the
+    previous version's snapshot.
+    """
+    version = get_catalog_version()
+
+    entry = _local_snapshots.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[0], entry[1]
+
+    (data, built_at, data_version), _ = get_or_build(
+        SNAPSHOT_KEY.format(name=name, version=version),
+        lambda: _build_snapshot(name, version, builder, entry),
+        SNAPSHOT_TIMEOUT,
+        latest_key=SNAPSHOT_LATEST_KEY.format(name=name),
+        stale=(entry[1], entry[2], entry[0]) if entry is not None else None,
+    )
+
+    with _local_lock:
+        current = _local_snapshots.get(name)
+        if current is None or current[0] <= data_version:
+            _local_snapshots[name] = (data_version, data, built_at)
+    return data_version, data
+
+
+def _build_snapshot(name, version, builder, entry):
+    """(data, built_at, version): the previous snapshot refreshed, or a full build."""
+    started = datetime.now(timezone.utc)
+    refresh = _refreshers.get(name)
+    if refresh is not None:
+        previous = entry[1:] if entry is not None else None
+        if previous is None:
+            latest_key = cache.get(SNAPSHOT_LATEST_KEY.format(name=name))
+            stored = peek(latest_key) if latest_key is not None else None
+            previous = stored[:2] if stored is not None else None
+        if previous is not None:
+            data = refresh(previous[0], previous[1] - SNAPSHOT_REFRESH_OVERLAP)
+            if data is not None:
+                logger.info("Catalog snapshot %s refreshed for v%s", name, version)
+                return data, started, version
+
+    logger.info("Catalog snapshot miss for %s (v%s); rebuilding", name, version)
+    return builder(), started, version
+
+
+# name -> {"version", "products", "value"}; structures derived from snapshots.
+_local_derived = {}
+
+
+def diff_snapshots(old_products, new_products):
+    """
+    Compare two product lists by id.
+    Returns (upserts, removed_ids): products that are new or changed, and ids
+    that are no longer present.
+    """
+    old_by_id = {product["id"]: product for product in old_products}
+    upserts = []
+    for product in new_products:
+        previous = old_by_id.pop(product["id"], None)
+        if previous is None or previous != product:
+            upserts.append(product)
+    return upserts, list(old_by_id)
+
+
+def get_derived(name, snapshot_name, snapshot_builder, factory):
+    """
+    Return a per-worker structure derived from the snapshot `snapshot_name`.
+
+    `factory(products)` builds the structure from scratch. If the structure
+    exposes `apply_delta(upserts, removed_ids)` it is patched with only the
+    products that changed between catalog versions instead of being rebuilt.
+    The patch is applied in place while other threads may be reading the
+    structure, so such structures lock their own reads and writes.
+    """
+    return get_derived_entry(name, snapshot_name, snapshot_builder, factory)[1]
+
+
+def get_derived_entry(name, snapshot_name, snapshot_builder, factory):
+    """
+    (version, value) for `get_derived`: the structure and the catalog version
+    of the snapshot it was built from, which lags the current version while
+    another process builds the new snapshot. Tag anything computed from the
+    structure with that version, not with a fresh get_catalog_version().
+    """
+    version = get_catalog_version()
+    entry = _local_derived.get(name)
+    if entry is not None and entry["version"] == version:
+        return version, entry["value"]
+
+    with _local_lock:
+        entry = _local_derived.get(name)
+        if entry is not None and entry["version"] == version:
+            return version, entry["value"]
+
+        # Older than `version` while another process builds the new snapshot
+        version, products = _get_snapshot_entry(snapshot_name, snapshot_builder)
+        if entry is not None and entry["version"] == version:
+            return version, entry["value"]
+        if entry is not None and hasattr(entry["value"], "apply_delta"):
+            value = entry["value"]
+            upserts, removed_ids = diff_snapshots(entry["products"], products)
+            value.apply_delta(upserts, removed_ids)
+            logger.info("Patched %s: %d upserts, %d removals", name, len(upserts), len(removed_ids))
+        else:
+            value = factory(products)
+
+        _local_derived[name] = {"version": version, "products": products, "value": value}
+        return version, value
@@ -0,0 +1,297 @@
+"""
+Columnar view of the active catalog for storefront filtering and sorting.
+
+The storefront filters (category, subcategory, price range, stock) and sort
+options are evaluated over NumPy arrays built once per catalog version from the
+active-products snapshot: filters become boolean masks and each sort order is an
+`argsort` permutation computed on first use and cached. A request only
+materialises the product dicts of the page it renders.
+
+Variant attributes (color, size, fit) are indexed as attribute -> value -> rows,
+with a second row list for variants in stock. Products without variants
+contribute their `sizes` list and `fit`.
+"""
+from collections import Counter
+
+import numpy as np
+
+from store.services.catalog_cache import get_derived, get_derived_entry
+from store.services.featured import featured_scores, get_featured_ranking
+from store.services.orm_queries import _build_active_products
+
+# Storefront sort options; unknown values fall back to "featured". Every order
+# breaks ties on `id` so that pages are stable. "featured" follows the stored
+# featured ranking; the others are fixed per catalog version.
+SORT_OPTIONS = ("featured", "newest", "price-low", "price-high")
+
+# Filterable variant attributes, in the order of the variant tuples below
+VARIANT_ATTRIBUTES = ("color", "size", "fit")
+
+
+def _code(value):
+    return -1 if value is None else value
+
+
+def _attribute_value(value):
+    value = (value or "").strip()
+    return value or None
+
+
+def product_variants(product):
+    """
+    (color, size, fit, in_stock) per purchasable variant of a snapshot product,
+    values stripped but not lowercased. Products without variants use their
+    comma-separated `sizes` and `fit` with the product stock.
+    """
+    if product.get("variant_attributes"):
+        return [
+            (_attribute_value(color), _attribute_value(size), _attribute_value(fit), (stock or 0) > 0)
+            for color, size, fit, stock in product["variant_attributes"]
+        ]
+    in_stock = (product["stock"] or 0) > 0
+    fit = _attribute_value(product.get("fit"))
+    sizes = [_attribute_value(size) for size in (product.get("sizes") or "").split(",")]
+    return [(None, size, fit, in_stock) for size in sizes if size] or ([(None, None, fit, in_stock)] if fit else [])
+
+
+class CatalogColumns:
+    """Parallel arrays over the active catalog, one row per product."""
+
+    def __init__(self, products):
+        count = len(products)
+        self.ids = np.fromiter((p["id"] for p in products), dtype=np.int64, count=count)
+        self.prices = np.fromiter((float(p["price"] or 0) for p in products), dtype=np.float64, count=count)
+        self.original_prices = np.fromiter(
+            (float(p["original_price"] or 0) for p in products), dtype=np.float64, count=count)
+        self.stock = np.fromiter((p["stock"] or 0 for p in products), dtype=np.int64, count=count)
+        self.category_ids = np.fromiter((_code(p["category"]) for p in products), dtype=np.int64, count=count)
+        self.subcategory_ids = np.fromiter((_code(p["subcategory"]) for p in products), dtype=np.int64, count=count)
+        # created_at is already formatted as "%Y-%m-%d %H:%M:%S" in the snapshot
+        self.created_at = np.array(
+            [p["created_at"] or "1970-01-01 00:00:00" for p in products], dtype="datetime64[s]"
+        ).astype(np.int64)
+
+        # Filters arrive as slugs; map them to the ids stored in the columns.
+        self.category_slugs = {}
+        self.subcategory_slugs = {}
+        self._category_sellers = {}
+        for p in products:
+            if p.get("admin_id") is not None:
+                self._category_sellers.setdefault(p["category"], set()).add(p["admin_id"])
+            if p.get("category__slug"):
+                self.category_slugs[p["category__slug"].lower()] = p["category"]
+            if p.get("subcategory__slug"):
+                self.subcategory_slugs[p["subcategory__slug"].lower()] = p["subcategory"]
+
+        # attribute -> value -> (rows, rows with that value in stock); values are lowercased
+        self.variants = []
+        self.attribute_labels = {attribute: {} for attribute in VARIANT_ATTRIBUTES}
+        postings = {attribute: {} for attribute in VARIANT_ATTRIBUTES}
+        for row, p in enumerate(products):
+            variants = []
+            for variant in product_variants(p):
+                values = tuple(value.lower() if value else None for value in variant[:3])
+                variants.append(values + (variant[3],))
+                for attribute, value, label in zip(VARIANT_ATTRIBUTES, values, variant):
+                    if value is None:
+                        continue
+                    self.attribute_labels[attribute].setdefault(value, label)
+                    rows, in_stock_rows = postings[attribute].setdefault(value, (set(), set()))
+                    rows.add(row)
+                    if variant[3]:
+                        in_stock_rows.add(row)
+            self.variants.append(variants)
+        self.attributes = {
+            attribute: {
+                value: (np.array(sorted(rows), dtype=np.int64), np.array(sorted(in_stock_rows), dtype=np.int64))
+                for value, (rows, in_stock_rows) in values.items()
+            }
+            for attribute, values in postings.items()
+        }
+
+        self._id_order = np.argsort(self.ids, kind="stable")
+        self._orders = {}
+        self._ranks = {}
+        self._featured = (None, None)  # (ranking computed_at, row order)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def category_sellers(self, category_id):
+        """Ids of the sellers with products in `category_id`, sorted."""
+        return sorted(self._category_sellers.get(category_id, ()), key=str)
+
+    def _featured_order(self):
+        """
+        Rows by stored featured score (see services.featured), recomputed only
+        when a new ranking has been published. Products the ranking does not
+        know yet are scored by the same formula without sales.
+        """
+        ranking = get_featured_ranking()
+        computed_at = ranking["computed_at"] if ranking else None
+        cached_at, order = self._featured
+        if order is not None and cached_at == computed_at:
+            return order
+
+        scores = featured_scores(
+            np.zeros(len(self.ids)), self.created_at.astype(np.int64), self.prices, self.original_prices,
+            self.stock)
+        if ranking:
+            rows, found = self._lookup(ranking["ids"])
+            scores[rows] = np.asarray(ranking["scores"], dtype=np.float64)[found]
+        order = np.lexsort((self.ids, -scores))
+        self._featured = (computed_at, order)
+        return order
+
+    def _sort_order(self, sort):
+        """Row permutation for `sort`, computed on first use."""
+        sort = sort if sort in SORT_OPTIONS else "featured"
+        if sort == "featured":
+            return self._featured_order()
+        order = self._orders.get(sort)
+        if order is None:
+            if sort == "price-low":
+                order = np.lexsort((self.ids, self.prices))
+            elif sort == "price-high":
+                order = np.lexsort((-self.ids, -self.prices))
+            else:  # newest
+                order = np.lexsort((-self.ids, -self.created_at))
+            self._orders[sort] = order
+        return order
+
+    def _sort_rank(self, sort):
+        """Inverse of `_sort_order`: row -> position in that order."""
+        order = self._sort_order(sort)
+        cached = self._ranks.get(sort)
+        if cached is None or cached[0] is not order:
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            cached = self._ranks[sort] = (order, rank)
+        return cached[1]
+
+    def _lookup(self, ids):
+        """(rows, found): row positions of the known `ids`, and which ids were known."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids) or not len(ids):
+            return np.empty(0, dtype=np.int64), np.zeros(len(ids), dtype=bool)
+        sorted_ids = self.ids[self._id_order]
+        positions = np.searchsorted(sorted_ids, ids)
+        positions[positions >= len(sorted_ids)] = 0
+        found = sorted_ids[positions] == ids
+        return self._id_order[positions[found]], found
+
+    def rows_for_ids(self, ids):
+        """Row positions of `ids` (in the given order), skipping unknown ids."""
+        return self._lookup(ids)[0]
+
+    def _variant_matches(self, row, selected, in_stock):
+        """Whether one variant of `row` has every selected attribute value (and stock)."""
+        return any(
+            all(variant[VARIANT_ATTRIBUTES.index(attribute)] == value for attribute, value in selected.items())
+            and (variant[3] or not in_stock)
+            for variant in self.variants[row]
+        )
+
+    def attribute_mask(self, selected, in_stock=False):
+        """
+        Rows with a variant matching every `selected` {attribute: value}. With
+        `in_stock` that variant must be in stock, not just the product.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for attribute, value in selected.items():
+            rows = self.attributes[attribute].get(value.lower())
+            attribute_mask = np.zeros(len(self.ids), dtype=bool)
+            if rows is not None:
+                attribute_mask[rows[1] if in_stock else rows[0]] = True
+            mask &= attribute_mask
+        if len(selected) > 1:
+            # Per-attribute postings only say *some* variant matches; check it is the same one
+            selected = {attribute: value.lower() for attribute, value in selected.items()}
+            for row in np.flatnonzero(mask):
+                if not self._variant_matches(row, selected, in_stock):
+                    mask[row] = False
+        return mask
+
+    def attribute_facets(self, ids=None, **filters):
+        """
+        attribute -> Counter(lowercased value -> matching products) for the
+        storefront `filters`, optionally within `ids` (search hits). Each
+        attribute is counted under every filter except its own.
+        """
+        selected = {attribute: filters.pop(attribute) for attribute in VARIANT_ATTRIBUTES if filters.get(attribute)}
+        for attribute in VARIANT_ATTRIBUTES:
+            filters.pop(attribute, None)
+        in_stock = filters.get("in_stock", False)
+        base_mask = self.mask(**filters)
+        if ids is not None:
+            hits = np.zeros(len(self.ids), dtype=bool)
+            hits[self.rows_for_ids(ids)] = True
+            base_mask &= hits
+
+        selected = {attribute: value.lower() for attribute, value in selected.items()}
+        counts = {}
+        for attribute in VARIANT_ATTRIBUTES:
+            others = {other: value for other, value in selected.items() if other != attribute}
+            counter = Counter()
+            if not others:
+                for value, (rows, in_stock_rows) in self.attributes[attribute].items():
+                    count = int(np.count_nonzero(base_mask[in_stock_rows if in_stock else rows]))
+                    if count:
+                        counter[value] = count
+            else:
+                # Other attributes must match on the same variant, so walk the candidates
+                index = VARIANT_ATTRIBUTES.index(attribute)
+                for row in np.flatnonzero(base_mask & self.attribute_mask(others, in_stock)):
+                    counter.update({
+                        variant[index] for variant in self.variants[row]
+                        if variant[index] is not None and (variant[3] or not in_stock)
+                        and all(variant[VARIANT_ATTRIBUTES.index(other)] == value for other, value in others.items())
+                    })
+            counts[attribute] = counter
+        return counts
+
+    def mask(self, category=None, subcategory=None, min_price=None, max_price=None, in_stock=False,
+             color=None, size=None, fit=None):
+        """Boolean row mask for the storefront filters."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if category:
+            mask &= self.category_ids == self.category_slugs.get(category.lower(), -2)
+        if subcategory:
+            mask &= self.subcategory_ids == self.subcategory_slugs.get(subcategory.lower(), -2)
+        if min_price is not None:
+            mask &= self.prices >= float(min_price)
+        if max_price is not None:
+            mask &= self.prices <= float(max_price)
+        if in_stock:
+            mask &= self.stock > 0
+        selected = {attribute: value for attribute, value in zip(VARIANT_ATTRIBUTES, (color, size, fit)) if value}
+        if selected:
+            mask &= self.attribute_mask(selected, in_stock)
+        return mask
+
+    def select(self, sort="featured", ids=None, **filters):
+        """
+        Return the ids of matching products in display order.
+        With `ids` (e.g. ranked search results) only those products are
+        considered and the "featured" sort keeps their given order.
+        """
+        mask = self.mask(**filters)
+        if ids is None:
+            order = self._sort_order(sort)
+            return self.ids[order[mask[order]]]
+
+        rows = self.rows_for_ids(ids)
+        rows = rows[mask[rows]]
+        if sort in SORT_OPTIONS and sort != "featured":
+            rows = rows[np.argsort(self._sort_rank(sort)[rows], kind="stable")]
+        return self.ids[rows]
+
+
+def get_catalog_columns():
+    """Return this worker's columnar catalog for the current catalog version."""
+    return get_derived("catalog_columns", "active_products", _build_active_products, CatalogColumns)
+
+
+def get_versioned_catalog_columns():
+    """(catalog version, columns): the columns and the snapshot version they were built from."""
+    return get_derived_entry("catalog_columns", "active_products", _build_active_products, CatalogColumns)
@@ -0,0 +1,109 @@
+"""
+"Frequently bought together" recommendations from order co-occurrence.
+
+ProductCoPurchase holds the sparse item-item matrix: for every pair of products
+that appeared in the same Order, the number of such orders. The
+`rebuild_co_purchases` command builds it in one pass over OrderItem. Each new
+order then upserts its own pairs. Reading a product's (or a cart's) top
+neighbours is a single indexed query, and the cards come from the catalog
+snapshot.
+"""
+import logging
+import time
+from collections import Counter
+from itertools import permutations
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from store.models import OrderItem, ProductCoPurchase
+from store.services.orm_queries import get_active_products_by_id
+
+logger = logging.getLogger(__name__)
+
+CO_PURCHASE_TOP_K = getattr(settings, "CO_PURCHASE_TOP_K", 8)
+# Bulk orders say little about what goes together and add n² pairs
+MAX_ITEMS_PER_ORDER = 50
+
+
+def _order_pairs(product_ids):
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) < 2 or len(product_ids) > MAX_ITEMS_PER_ORDER:
+        return []
+    return list(permutations(product_ids, 2))
+
+
+def rebuild_co_purchases(batch_size=1000):
+    """Recount the whole matrix from OrderItem; returns the number of stored pairs."""
+    started = time.perf_counter()
+    counts = Counter()
+    current_order, basket = None, []
+    for order_id, product_id in (OrderItem.objects.order_by("order_id")
+                                 .values_list("order_id", "product_id").iterator(chunk_size=5000)):
+        if order_id != current_order:
+            counts.update(_order_pairs(basket))
+            current_order, basket = order_id, []
+        basket.append(product_id)
+    counts.update(_order_pairs(basket))
+
+    with transaction.atomic():
+        ProductCoPurchase.objects.all().delete()
+        ProductCoPurchase.objects.bulk_create(
+            (ProductCoPurchase(product_id=a, other_id=b, orders=n) for (a, b), n in counts.items()),
+            batch_size=batch_size,
+        )
+    logger.info("Co-purchase matrix rebuilt: %d pairs in %.0f ms",
+                len(counts), (time.perf_counter() - started) * 1000)
+    return len(counts)
+
+
+def _upsert_sql(pair_count):
+    """INSERT of `pair_count` (product, other) pairs that adds one order to those already stored."""
+    meta = ProductCoPurchase._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    product, other, orders = (qn(meta.get_field(name).column) for name in ("product", "other", "orders"))
+    return (
+        f"INSERT INTO {table} ({product}, {other}, {orders}) "
+        f"VALUES {', '.join(['(%s, %s, 1)'] * pair_count)} "
+        f"ON CONFLICT ({product}, {other}) DO UPDATE SET {orders} = {table}.{orders} + 1"
+    )
+
+
+def record_co_purchases(product_ids):
+    """
+    Count one more order for every pair in `product_ids` (the products of a
+    new order). A single upsert, so concurrent orders sharing a new pair both
+    count. Failures are logged and swallowed so they never fail checkout.
+    """
+    pairs = _order_pairs(product_ids)
+    if not pairs:
+        return
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Pairs are sorted, so concurrent upserts lock rows in the same order
+            cursor.execute(_upsert_sql(len(pairs)), [value for pair in pairs for value in pair])
+    except Exception as e:
+        logger.error(f"Error recording co-purchases: {e}")
+
+
+def get_bought_together(product_ids, limit=CO_PURCHASE_TOP_K):
+    """
+    Storefront product dicts most often bought with `product_ids` (one product
+    page or a whole cart), excluding the products themselves and anything
+    no longer on sale.
+    """
+    product_ids = {int(product_id) for product_id in product_ids}
+    if not product_ids:
+        return []
+    neighbours = (
+        ProductCoPurchase.objects
+        .filter(product_id__in=product_ids, other__is_active=True, other__is_deleted=False)
+        .exclude(other_id__in=product_ids)
+        .values("other_id")
+        .annotate(score=Sum("orders"))
+        .order_by("-score", "other_id")[:limit]
+    )
+    products_by_id = get_active_products_by_id()
+    return [products_by_id[row["other_id"]] for row in neighbours if row["other_id"] in products_by_id]
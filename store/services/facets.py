@@ -0,0 +1,171 @@
+"""
+Facet counts for the storefront sidebar.
+
+Active products are counted into cells keyed by (category, subcategory, price
+bucket, in stock). The cell table is derived from the active-products snapshot
+and patched with only the changed products whenever the catalog version moves,
+so a request aggregates a few dozen cells instead of scanning the catalog.
+
+Counts follow the usual faceting rule: each facet is counted under every
+active filter except its own, so the sidebar shows what selecting another
+category or price range would return.
+"""
+import bisect
+import threading
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+
+from store.services.catalog_cache import get_derived
+from store.services.orm_queries import _build_active_products, get_active_products_by_id
+
+# Lower edges of the price buckets after the first: [0, 500), [500, 1000), ...
+PRICE_FACET_EDGES = tuple(Decimal(str(edge)) for edge in getattr(settings, "PRICE_FACET_EDGES", (500, 1000, 2000, 5000)))
+PRICE_STEP = Decimal("0.01")  # Product.price has two decimal places
+
+
+def price_bucket(price):
+    return bisect.bisect_right(PRICE_FACET_EDGES, Decimal(price or 0))
+
+
+def price_buckets():
+    """(min_price, max_price) per bucket; bounds are inclusive, None is open."""
+    lows = (None,) + PRICE_FACET_EDGES
+    highs = tuple(edge - PRICE_STEP for edge in PRICE_FACET_EDGES) + (None,)
+    return list(zip(lows, highs))
+
+
+def _cell(product):
+    return (
+        product["category"],
+        product["subcategory"],
+        price_bucket(product["price"]),
+        (product["stock"] or 0) > 0,
+    )
+
+
+class FacetCounts:
+    """Product counts per (category, subcategory, price bucket, in stock) cell."""
+
+    def __init__(self, products=()):
+        self.cells = Counter()
+        self.product_cells = {}  # product_id -> cell
+        # Readers share the table with the thread patching it
+        self._lock = threading.RLock()
+        for product in products:
+            self._add(product)
+
+    def _add(self, product):
+        cell = _cell(product)
+        self.product_cells[product["id"]] = cell
+        self.cells[cell] += 1
+
+    def _remove(self, product_id):
+        cell = self.product_cells.pop(product_id, None)
+        if cell is not None:
+            self.cells[cell] -= 1
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def apply_delta(self, upserts, removed_ids):
+        """Patch the counts with changed products; see catalog_cache.get_derived."""
+        with self._lock:
+            for product_id in removed_ids:
+                self._remove(product_id)
+            for product in upserts:
+                self._remove(product["id"])
+                self._add(product)
+
+    def counts(self, category_id=None, subcategory_id=None, buckets=None, in_stock=False):
+        """
+        Aggregate the cells for the given filter state. `buckets` is the range of
+        selected price bucket indexes, or None for no price filter.
+        """
+        categories = Counter()
+        subcategories = Counter()
+        prices = Counter()
+        in_stock_count = 0
+        total = 0
+        with self._lock:
+            cells = list(self.cells.items())
+        for (cell_category, cell_subcategory, bucket, cell_in_stock), count in cells:
+            price_ok = buckets is None or bucket in buckets
+            stock_ok = cell_in_stock or not in_stock
+            category_ok = category_id is None or cell_category == category_id
+            subcategory_ok = subcategory_id is None or cell_subcategory == subcategory_id
+
+            if price_ok and stock_ok:
+                categories[cell_category] += count
+                subcategories[cell_subcategory] += count
+            if category_ok and subcategory_ok and stock_ok:
+                prices[bucket] += count
+            if category_ok and subcategory_ok and price_ok:
+                if cell_in_stock:
+                    in_stock_count += count
+                if stock_ok:
+                    total += count
+        return {
+            "categories": categories,
+            "subcategories": subcategories,
+            "price_buckets": prices,
+            "in_stock": in_stock_count,
+            "total": total,
+        }
+
+
+def get_facet_counts():
+    """Return this worker's facet cell table for the current catalog version."""
+    return get_derived("facet_counts", "active_products", _build_active_products, FacetCounts)
+
+
+def _selected_buckets(min_price, max_price):
+    """Bucket index range for a price filter, or False if it is not bucket-aligned."""
+    if min_price is None and max_price is None:
+        return None
+    low = 0
+    high = len(PRICE_FACET_EDGES)
+    if min_price is not None:
+        if min_price not in PRICE_FACET_EDGES:
+            return False
+        low = PRICE_FACET_EDGES.index(min_price) + 1
+    if max_price is not None:
+        if max_price + PRICE_STEP not in PRICE_FACET_EDGES:
+            return False
+        high = PRICE_FACET_EDGES.index(max_price + PRICE_STEP)
+    return range(low, high + 1)
+
+
+def get_facets(category_id=None, subcategory_id=None, min_price=None, max_price=None,
+               in_stock=False, product_ids=None):
+    """
+    Facet counts for the storefront filter state.
+
+    `product_ids` restricts counting to a result set (e.g. search hits), which
+    is tallied on the fly. Price filters that do not line up with the bucket
+    edges are answered by filtering products directly.
+    """
+    buckets = _selected_buckets(min_price, max_price)
+    if product_ids is None and buckets is not False:
+        return get_facet_counts().counts(category_id, subcategory_id, buckets, in_stock)
+
+    products_by_id = get_active_products_by_id()
+    if product_ids is None:
+        products = products_by_id.values()
+    else:
+        products = [products_by_id[pid] for pid in product_ids if pid in products_by_id]
+
+    if buckets is not False:
+        return FacetCounts(products).counts(category_id, subcategory_id, buckets, in_stock)
+
+    # Price buckets are counted without the price filter, everything else within it.
+    unpriced = (get_facet_counts() if product_ids is None else FacetCounts(products)).counts(
+        category_id, subcategory_id, None, in_stock)
+    in_range = [
+        p for p in products
+        if (min_price is None or p["price"] >= min_price)
+        and (max_price is None or p["price"] <= max_price)
+    ]
+    facets = FacetCounts(in_range).counts(category_id, subcategory_id, None, in_stock)
+    facets["price_buckets"] = unpriced["price_buckets"]
+    return facets
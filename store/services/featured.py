@@ -0,0 +1,166 @@
+"""
+"Featured" ranking for the storefront.
+
+A product's featured score blends time-decayed units sold, recency, discount
+depth and stock availability. Scores are computed by a ranking job (the
+`rank_featured_products` command, or a background refresh once the stored
+ranking is older than FEATURED_RANKING_MAX_AGE) and stored in the cache;
+requests only read the stored ranking, at most every FEATURED_RANKING_POLL
+seconds per worker.
+
+Products created after the last run have not sold yet, so their score is the
+same formula with zero sales (see CatalogColumns).
+"""
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from store.models import OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+FEATURED_RANKING_KEY = "featured_ranking"
+FEATURED_RANKING_LOCK_KEY = "featured_ranking:lock"
+
+FEATURED_WEIGHTS = getattr(settings, "FEATURED_WEIGHTS", {
+    "sales": 1.0,
+    "recency": 0.6,
+    "discount": 0.3,
+    "stock": 0.4,
+})
+SALES_HALF_LIFE_DAYS = 14
+SALES_WINDOW_DAYS = 90
+RECENCY_HALF_LIFE_DAYS = 30
+FEATURED_RANKING_MAX_AGE = getattr(settings, "FEATURED_RANKING_MAX_AGE", 60 * 60)
+FEATURED_RANKING_POLL = 30
+
+# Orders that never turned into a sale
+EXCLUDED_ORDER_STATUSES = ("canceled", "rejected")
+
+
+def featured_scores(decayed_sales, created_at, prices, original_prices, stock, now=None):
+    """
+    Vectorized featured score. `created_at` is in epoch seconds; all arguments
+    are equal-length arrays.
+    """
+    now = time.time() if now is None else now
+    age_days = np.maximum(now - created_at, 0) / 86400.0
+    recency = np.exp2(-age_days / RECENCY_HALF_LIFE_DAYS)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discount = np.where(original_prices > 0, (original_prices - prices) / original_prices, 0.0)
+    discount = np.clip(discount, 0.0, 1.0)
+
+    # Diminishing returns past a handful of units in stock
+    availability = np.minimum(stock, 5) / 5.0
+
+    return (
+        FEATURED_WEIGHTS["sales"] * np.log1p(decayed_sales)
+        + FEATURED_WEIGHTS["recency"] * recency
+        + FEATURED_WEIGHTS["discount"] * discount
+        + FEATURED_WEIGHTS["stock"] * availability
+    )
+
+
+def _decayed_sales(now):
+    """product_id -> units sold in the window, each day weighted by its age."""
+    since = now - timedelta(days=SALES_WINDOW_DAYS)
+    daily = (
+        OrderItem.objects.filter(created_at__gte=since)
+        .exclude(order_id__status__in=EXCLUDED_ORDER_STATUSES)
+        .annotate(day=TruncDate("created_at"))
+        .values_list("product_id", "day")
+        .annotate(units=Sum("quantity"))
+    )
+    today = now.date()
+    sales = {}
+    for product_id, day, units in daily:
+        weight = math.exp2(-(today - day).days / SALES_HALF_LIFE_DAYS)
+        sales[product_id] = sales.get(product_id, 0.0) + (units or 0) * weight
+    return sales
+
+
+def compute_featured_ranking():
+    """Score every active product and store the ranking; returns it."""
+    started = time.perf_counter()
+    now = timezone.now()
+    rows = list(
+        Product.objects.filter(is_active=True, is_deleted=False)
+        .values_list("id", "created_at", "price", "original_price", "stock")
+    )
+    sales = _decayed_sales(now)
+
+    count = len(rows)
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    decayed_sales = np.fromiter((sales.get(row[0], 0.0) for row in rows), dtype=np.float64, count=count)
+    scores = featured_scores(
+        decayed_sales,
+        np.fromiter((row[1].timestamp() if row[1] else 0 for row in rows), dtype=np.float64, count=count),
+        np.fromiter((float(row[2] or 0) for row in rows), dtype=np.float64, count=count),
+        np.fromiter((float(row[3] or 0) for row in rows), dtype=np.float64, count=count),
+        np.fromiter((row[4] or 0 for row in rows), dtype=np.float64, count=count),
+        now=now.timestamp(),
+    )
+    order = np.lexsort((ids, -scores))
+
+    ranking = {
+        "computed_at": now.timestamp(),
+        "ids": ids[order].tolist(),
+        "scores": scores[order].tolist(),
+        # Also weighs type-ahead suggestions (services.suggest)
+        "sales": decayed_sales[order].tolist(),
+    }
+    cache.set(FEATURED_RANKING_KEY, ranking, timeout=None)
+    logger.info("Featured ranking computed for %d products (%d with sales) in %.0f ms",
+                count, len(sales), (time.perf_counter() - started) * 1000)
+    return ranking
+
+
+def _refresh_in_background():
+    # One refresh at a time across workers; the lock expires if a worker dies.
+    if not cache.add(FEATURED_RANKING_LOCK_KEY, 1, timeout=300):
+        return
+
+    def run():
+        try:
+            compute_featured_ranking()
+        except Exception as e:
+            logger.error(f"Error computing featured ranking: {e}")
+        finally:
+            cache.delete(FEATURED_RANKING_LOCK_KEY)
+            # Django only closes the connections of request threads
+            connection.close()
+
+    threading.Thread(target=run, name="featured-ranking", daemon=True).start()
+
+
+# (fetched_at, ranking) for this worker
+_local_ranking = (0.0, None)
+
+
+def get_featured_ranking():
+    """
+    Return the stored ranking ({"computed_at", "ids", "scores", "sales"}) or
+    None if none has been computed yet. Schedules a background refresh when it
+    is missing or older than FEATURED_RANKING_MAX_AGE.
+    """
+    global _local_ranking
+    fetched_at, ranking = _local_ranking
+    if time.monotonic() - fetched_at < FEATURED_RANKING_POLL:
+        return ranking
+
+    ranking = cache.get(FEATURED_RANKING_KEY)
+    if ranking is None or time.time() - ranking["computed_at"] > FEATURED_RANKING_MAX_AGE:
+        _refresh_in_background()
+    _local_ranking = (time.monotonic(), ranking)
+    return ranking
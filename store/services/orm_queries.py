@@ -1,6 +1,7 @@
 from store.models import Product, User, Cart, PromoCode, Order, OrderItem, AdminStore, Category, Subcategory, ProductVariant
 from django.core.files.storage import default_storage
-from datetime import datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
 import re
 import tempfile
 from dotenv import load_dotenv
@@ -19,6 +20,13 @@ import json
 import sys
 import logging
 from django.core.cache import cache
+from store.services.catalog_cache import get_derived, register_snapshot_refresher
+from store.services.storage_urls import public_url, public_urls
+from store.services.trending import record_trending
+from store.services.product_blobs import get_blobs, stamped
+from django.core.serializers.json import DjangoJSONEncoder
+from itertools import islice
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
 
 
 logger = logging.getLogger(__name__)
@@ -76,54 +84,161 @@ def get_user_by_uid(uid):
         return None
 
 
-def get_all_products():
-    """Fetch all products from database with all image URLs converted to public URLs"""
-    try:
-        # Fetch all products using Django ORM
-        products = list(Product.objects.filter(is_active=True, is_deleted=False).values(
-            'id',
-            'name',
-            'category',
-            'category__name',
-            'category__slug',
-            'subcategory',
-            'subcategory__name',
-            'subcategory__slug',
-            'price',
-            'original_price',
-            'description',
-            'sizes',
-            'fit',
-            'created_at',
-            'image_url',
-            'image_url2',
-            'image_url3',
-            'image_url4',
-            'stock',
-            'admin_id',
-            'admin_id__company_name'
-        ))
-
-        # Convert image URLs to public URLs
-        for product in products:
-            for i in range(1, 5):
-                key = f'image_url{i}' if i > 1 else 'image_url'
-                if product.get(key):
-                    product[key] = supabase.storage.from_(
-                        'product-image').get_public_url(product[key])
-
-        # Convert datetime objects to formatted strings
-        for product in products:
-            if product['created_at']:
-                product['created_at'] = product['created_at'].strftime(
-                    "%Y-%m-%d %H:%M:%S")
-
-        print(f"✅ Fetched Products with images: {products}")
-        return products
+# Fields needed to render a storefront product card.
+PRODUCT_CARD_FIELDS = (
+    'id',
+    'name',
+    'category',
+    'category__name',
+    'category__slug',
+    'subcategory',
+    'subcategory__name',
+    'subcategory__slug',
+    'price',
+    'original_price',
+    'description',
+    'sizes',
+    'fit',
+    'created_at',
+    'image_url',
+    'image_url2',
+    'image_url3',
+    'image_url4',
+    'stock',
+    'admin_id',
+    'admin_id__company_name',
+    'variant_min_price',
+    'variant_colors',
+)
+
+PRODUCTS_PAGE_SIZE = 24
+
+# Products per cache.get_many / build round trip
+PRODUCT_BLOB_CHUNK = 1000
+
+
+def _format_product_card(product):
+    """Convert image keys to public URLs and datetimes to strings, in place."""
+    for i in range(1, 5):
+        key = f'image_url{i}' if i > 1 else 'image_url'
+        if product.get(key):
+            product[key] = public_url(product[key])
+
+    if product['created_at']:
+        product['created_at'] = product['created_at'].strftime(
+            "%Y-%m-%d %H:%M:%S")
+    return product
+
+
+def _load_product_cards(product_ids):
+    """Storefront card dicts for `product_ids`, keyed by id."""
+    products = list(Product.objects.filter(id__in=product_ids).values(*PRODUCT_CARD_FIELDS))
+
+    # (color, size, fit, stock) per variant, for the attribute filters
+    variants = {}
+    for product_id, *attributes in (ProductVariant.objects.filter(product_id__in=product_ids)
+                                    .order_by("product_id", "id")
+                                    .values_list("product_id", "color", "size", "fit", "stock")):
+        variants.setdefault(product_id, []).append(tuple(attributes))
+    for product in products:
+        product["variant_attributes"] = variants.get(product["id"], [])
+
+    return {product["id"]: _format_product_card(product) for product in products}
+
+
+def _build_active_products():
+    """
+    Query the active catalog and shape it for the storefront templates.
+    Card dicts are reused from per-product blobs, so after a catalog change only
+    the products that changed are loaded and formatted again.
+    """
+    return _product_cards(Product.objects.filter(is_active=True, is_deleted=False))
+
+
+def _product_cards(queryset):
+    """Card dicts for the products in `queryset`, from their blobs."""
+    rows = list(stamped(queryset))
+    stamps = dict(rows)
+    products = []
+    for start in range(0, len(rows), PRODUCT_BLOB_CHUNK):
+        for product_id, card in get_blobs("card", rows[start:start + PRODUCT_BLOB_CHUNK], _load_product_cards):
+            # Keys the rendered card HTML (services.card_fragments)
+            card["card_stamp"] = stamps[product_id]
+            products.append(card)
+    return products
 
-    except Exception as e:
-        print(f"❌ Error fetching products: {str(e)}")
-        return []
+
+def _changed_product_ids(since):
+    """Ids of products whose row, category or subcategory changed at or after `since`."""
+    # Variant writes move the product's updated_at too (Product.refresh_variant_aggregates)
+    changed = set(Product.objects.filter(updated_at__gte=since).order_by().values_list("id", flat=True))
+    categories = list(Category.objects.filter(updated_at__gte=since).order_by().values_list("id", flat=True))
+    subcategories = list(Subcategory.objects.filter(updated_at__gte=since).order_by().values_list("id", flat=True))
+    if categories or subcategories:
+        changed.update(Product.objects.filter(Q(category_id__in=categories) | Q(subcategory_id__in=subcategories))
+                       .order_by().values_list("id", flat=True))
+    return changed
+
+
+def _patch_snapshot(products, changed_ids, fresh):
+    """
+    Copy of `products` with the `changed_ids` replaced by the `fresh` dicts,
+    or dropped when they have none, keeping the newest-first order.
+    """
+    fresh_by_id = {product["id"]: product for product in fresh}
+    patched = [fresh_by_id.pop(product["id"], product) for product in products
+               if product["id"] not in changed_ids or product["id"] in fresh_by_id]
+    if fresh_by_id:
+        patched.extend(fresh_by_id.values())
+        patched.sort(key=lambda product: product["created_at"] or "", reverse=True)
+    return patched
+
+
+def _refresh_active_products(products, since):
+    """Patch the storefront snapshot with the products changed since `since`; see catalog_cache."""
+    active = Product.objects.filter(is_active=True, is_deleted=False)
+    # Seller names are shown on cards but AdminStore rows carry no updated_at
+    seller_names = dict(AdminStore.objects.values_list("id", "company_name"))
+    changed_ids = _changed_product_ids(since) | {
+        product["id"] for product in products
+        if seller_names.get(product["admin_id"]) != product["admin_id__company_name"]
+    }
+    if changed_ids:
+        products = _patch_snapshot(products, changed_ids, _product_cards(active.filter(id__in=changed_ids)))
+    # Hard deletes leave no updated_at behind
+    if len(products) != active.count():
+        return None
+    logger.info(f"Refreshed {len(changed_ids)} changed products into the catalog snapshot")
+    return products
+
+
+register_snapshot_refresher("active_products", _refresh_active_products)
+
+
+def get_active_products_by_id():
+    """Map product id -> storefront product dict for the current catalog version."""
+    return get_derived(
+        "active_products_by_id", "active_products", _build_active_products,
+        lambda products: {product['id']: product for product in products})
+
+
+def search_products_postgres(query, limit=500):
+    """
+    Rank active products for `query` in PostgreSQL: full-text match on the
+    weighted search_vector, plus pg_trgm similarity on the name for typos.
+    Returns product ids, best first.
+    """
+    search_query = SearchQuery(query, search_type="websearch", config="english")
+    return list(
+        Product.objects.filter(is_active=True, is_deleted=False)
+        .filter(Q(search_vector=search_query) | Q(name__trigram_similar=query))
+        .annotate(
+            rank=SearchRank(F("search_vector"), search_query),
+            similarity=TrigramSimilarity("name", query),
+        )
+        .order_by("-rank", "-similarity", "id")
+        .values_list("id", flat=True)[:limit]
+    )
 
 
 def sanitize_filename(filename):
@@ -278,72 +393,200 @@ def orm_add_product(name, category_id, subcategory_id, price, original_price, de
     return product
 
 
-def fetch_all_products():
+# Keys of a product object in the JSON API, usable in `?fields=`.
+API_PRODUCT_FIELDS = (
+    "id", "name", "category", "subcategory", "price", "original_price", "description",
+    "created_at", "image_url", "image_url2", "image_url3", "image_url4", "is_active",
+    "stock", "sizes", "fit", "variant_min_price", "variant_max_price", "variant_stock",
+    "variant_colors", "variants",
+)
+
+# Nested collections that are only serialized when asked for with `?expand=`.
+API_EXPANDABLE = ("variants",)
+
+API_CHUNK_SIZE = 500
+
+
+def _serialize_product_with_variants(product, fields=None, expand=API_EXPANDABLE):
     """
-    Fetch all products using Django ORM and convert stored image keys into public URLs.
+    Convert a product to the JSON API shape. The variant list (prefetch it) is
+    only included when "variants" is in `expand`; the variant_* aggregates
+    always are.
     """
-    
-    try:
-        # Use prefetch_related to fetch variants in one go.
-        products_queryset = Product.objects.filter(is_deleted=False).order_by("-created_at")\
-            .select_related("category", "subcategory")\
-            .prefetch_related("variants")
-
-        products = []
-
-        # Iterate over each product and convert it into a dict
-        for product in products_queryset:
-            product_data = {
-                "id": product.id,
-                "name": product.name,
-                "category": product.category.name if product.category else None,
-                "subcategory": product.subcategory.name if product.subcategory else None,
-                "price": product.price,
-                "original_price": product.original_price,
-                "description": product.description,
-                "created_at": product.created_at.strftime("%Y-%m-%d %H:%M:%S") if product.created_at else "",
-                # Convert stored image keys to public URLs using Supabase's API
-                "image_url": supabase.storage.from_("product-image").get_public_url(product.image_url) if product.image_url else None,
-                "image_url2": supabase.storage.from_("product-image").get_public_url(product.image_url2) if product.image_url2 else None,
-                "image_url3": supabase.storage.from_("product-image").get_public_url(product.image_url3) if product.image_url3 else None,
-                "image_url4": supabase.storage.from_("product-image").get_public_url(product.image_url4) if product.image_url4 else None,
-                "is_active": product.is_active,
-                "stock": product.stock,
-                "sizes": product.sizes if product.sizes else "N/A",
-                "fit": product.fit if product.fit else "N/A",
+    product_data = {
+        "id": product.id,
+        "name": product.name,
+        "category": product.category.name if product.category else None,
+        "subcategory": product.subcategory.name if product.subcategory else None,
+        "price": product.price,
+        "original_price": product.original_price,
+        "description": product.description,
+        "created_at": product.created_at.strftime("%Y-%m-%d %H:%M:%S") if product.created_at else "",
+        # Convert stored image keys to public URLs
+        "image_url": public_url(product.image_url),
+        "image_url2": public_url(product.image_url2),
+        "image_url3": public_url(product.image_url3),
+        "image_url4": public_url(product.image_url4),
+        "is_active": product.is_active,
+        "stock": product.stock,
+        "sizes": product.sizes if product.sizes else "N/A",
+        "fit": product.fit if product.fit else "N/A",
+        "variant_min_price": product.variant_min_price,
+        "variant_max_price": product.variant_max_price,
+        "variant_stock": product.variant_stock,
+        "variant_colors": product.variant_colors,
+    }
+
+    if "variants" in expand and (fields is None or "variants" in fields):
+        # Process variants for this product
+        variants_list = []
+        for variant in product.variants.all():
+            variant_data = {
+                "color": variant.color,
+                "size": variant.size,
+                "fit": variant.fit,
+                "price": variant.price,
+                "stock": variant.stock,
+                # Convert the main variant image to its public URL
+                "image_url": public_url(variant.image_url),
+                # Process additional images stored as a JSON list of keys
+                "additional_image_urls": public_urls(variant.additional_image_urls)
             }
-            
-            # Process variants for this product
-            variants_list = []
-            for variant in product.variants.all():
-                variant_data = {
-                    "color": variant.color,
-                    "size": variant.size,
-                    "fit": variant.fit,
-                    "price": variant.price,
-                    "stock": variant.stock,
-                    # Convert the main variant image using Supabase's API
-                    "image_url": supabase.storage.from_("product-image").get_public_url(variant.image_url) if variant.image_url else None,
-                    # Process additional images stored as a JSON list of keys
-                    "additional_image_urls": (
-                        [supabase.storage.from_("product-image").get_public_url(url) for url in variant.additional_image_urls]
-                        if variant.additional_image_urls else []
-                    )
-                }
-                variants_list.append(variant_data)
-            
-            product_data["variants"] = variants_list
-            
-            products.append(product_data)
+            variants_list.append(variant_data)
 
-        logger.info(f"Fetched Products with images and variants: {products}")
-        return products
+        product_data["variants"] = variants_list
 
-    except Exception as e:
-        logger.error(f"Error fetching products: {str(e)}")
-        return []
+    if fields is not None:
+        # Sparse fieldset; the id is always included
+        product_data = {key: value for key, value in product_data.items() if key == "id" or key in fields}
+    return product_data
+
+
+def iter_products_with_variants(fields=None, limit=None, cursor=None, chunk_size=API_CHUNK_SIZE, expand=()):
+    """
+    Yield non-deleted products in the JSON API shape, newest first, as
+    (position, product) pairs, reading the table in chunks of `chunk_size` rows
+    so memory stays flat for any catalog size. `cursor` is the position of the
+    product to resume after (keyset pagination on created_at, id).
+    """
+    queryset = _api_products(cursor).select_related("category", "subcategory")
+    if "variants" in expand and (fields is None or "variants" in fields):
+        # Prefetched per chunk when combined with iterator()
+        queryset = queryset.prefetch_related("variants")
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield encode_position_token(product.created_at, product.id), \
+            _serialize_product_with_variants(product, fields, expand)
+
+
+def _api_products(cursor):
+    """Non-deleted products, newest first, after the position `cursor` (None for the start)."""
+    queryset = Product.objects.filter(is_deleted=False).order_by("-created_at", "-id")
+    if cursor is not None:
+        created_at, product_id = decode_position_token(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=product_id))
+    return queryset
+
+
+def _encode_products(product_ids, expand):
+    """JSON API bytes for `product_ids`, keyed by id."""
+    queryset = Product.objects.filter(id__in=product_ids).select_related("category", "subcategory")
+    if "variants" in expand:
+        queryset = queryset.prefetch_related("variants")
+    encoder = DjangoJSONEncoder()
+    return {product.id: encoder.encode(_serialize_product_with_variants(product, None, expand)).encode()
+            for product in queryset}
+
+
+def iter_product_json_blobs(limit=None, cursor=None, chunk_size=API_CHUNK_SIZE, expand=()):
+    """
+    Same products and order as iter_products_with_variants with every field,
+    as (position, JSON bytes) served from per-product blobs; only products
+    whose blob is missing are loaded and encoded.
+    """
+    queryset = _api_products(cursor)
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    kind = "json+variants" if "variants" in expand else "json"
+    rows = stamped(queryset, "created_at")
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        positions = {product_id: encode_position_token(created_at, product_id)
+                     for product_id, _stamp, created_at in chunk}
+        for product_id, blob in get_blobs(kind, chunk, lambda product_ids: _encode_products(product_ids, expand)):
+            yield positions[product_id], blob
 
 
+CHANGES_PAGE_SIZE = 500
+
+# Rows younger than this are left for the next sync, so a transaction that
+# commits late with an earlier updated_at is not skipped over by the token.
+CHANGES_SETTLE_SECONDS = getattr(settings, "CATALOG_CHANGES_SETTLE_SECONDS", 2)
+
+_TOKEN_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_position_token(moment, product_id):
+    """
+    Opaque keyset position: a product's (timestamp, id), such as the
+    (updated_at, id) of the last change sent or the (created_at, id) of the
+    last product listed.
+    """
+    micros = (moment - _TOKEN_EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{product_id}"
+
+
+def decode_position_token(token):
+    """Inverse of encode_position_token; raises ValueError or OverflowError for malformed tokens."""
+    micros, product_id = token.split(".")
+    return _TOKEN_EPOCH + timedelta(microseconds=int(micros)), int(product_id)
+
+
+def get_product_changes(since=None, limit=CHANGES_PAGE_SIZE, fields=None, expand=()):
+    """
+    Products created, updated, deactivated or soft-deleted after the sync token
+    `since` (all products when None), oldest change first. Ordered and
+    filtered on (updated_at, id) so the query is a range scan of
+    product_changes_idx. Soft-deleted products are reported by id only.
+    Deactivated products stay in `changed`, like in the full listing, so
+    `is_active` is always sent, even with a sparse `fields`.
+    """
+    if fields is not None:
+        fields = set(fields) | {"is_active"}
+    cutoff = timezone.now() - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    queryset = Product.objects.filter(updated_at__lte=cutoff)\
+        .select_related("category", "subcategory")\
+        .order_by("updated_at", "id")
+    if "variants" in expand and (fields is None or "variants" in fields):
+        queryset = queryset.prefetch_related("variants")
+    if since:
+        updated_at, product_id = decode_position_token(since)
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=product_id))
+
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changed, deleted = [], []
+    for product in rows:
+        if product.is_deleted:
+            deleted.append(product.id)
+        else:
+            changed.append(_serialize_product_with_variants(product, fields, expand))
+
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "next_token": encode_position_token(rows[-1].updated_at, rows[-1].id) if rows else since,
+        "has_more": has_more,
+    }
+
 
 def delete_product(request, product_id):
     """
@@ -402,20 +645,14 @@ def fetch_product_details_orm(product_id):
         return {"error": f"Product with ID {product_id} not found."}
 
     # Get the public URL for the main image if it exists
-    main_image_url = (
-        supabase.storage.from_(
-            "product-image").get_public_url(product.image_url)
-        if product.image_url else None
-    )
+    main_image_url = public_url(product.image_url)
 
     # Collect additional images with public URLs
     additional_images = []
     for image_field in ["image_url2", "image_url3", "image_url4"]:
         image_value = getattr(product, image_field, None)
         if image_value:
-            public_url = supabase.storage.from_(
-                "product-image").get_public_url(image_value)
-            additional_images.append(public_url)
+            additional_images.append(public_url(image_value))
 
     product_details = {
         "id": product.id,
@@ -551,7 +788,8 @@ def orm_update_product(product_id, name=None, category=None, subcategory=None, p
     if not updated_fields:
         return {"error": "No fields provided for update."}
 
-    # Save only the fields that were updated
+    # Save only the fields that were updated; updated_at drives the changes feed
+    updated_fields.append("updated_at")
     product.save(update_fields=updated_fields)
     logger.info("✅ Updated product successfully: %s", product)
     return {"success": "Product updated successfully."}
@@ -589,14 +827,17 @@ class CartService:
                 
                 existing_item.quantity = new_total
                 existing_item.save()
+                record_trending({product.id: requested_qty})
                 return existing_item
             
             # Otherwise, create a new cart item.
-            return Cart.objects.create(
+            cart_item = Cart.objects.create(
                 user_id=user,
                 product_id=product,
                 **{k: v for k, v in product_data.items() if k != 'product_id'}
             )
+            record_trending({product.id: requested_qty})
+            return cart_item
 
         except User.DoesNotExist:
             raise ValueError("User does not exist")
@@ -723,11 +964,7 @@ def get_products_by_ids(product_ids):
             # If you have additional fields, include them here as needed.
         }
         # Convert the main image URL to a public URL if it exists
-        if product.image_url:
-            product_data["image_url"] = supabase.storage.from_(
-                "product-image").get_public_url(product.image_url)
-        else:
-            product_data["image_url"] = None
+        product_data["image_url"] = public_url(product.image_url)
 
         products.append(product_data)
 
@@ -771,6 +1008,7 @@ def create_order_items(order_id, cart):
     try:
         # Retrieve the order instance.
         order = Order.objects.get(id=order_id)
+        units_sold = {}
 
         # Loop over the cart and create an OrderItem for each product.
         for product_id, item in cart.items():
@@ -799,6 +1037,8 @@ def create_order_items(order_id, cart):
                 admin=product.admin_id
             )
 
+            units_sold[product_id] = units_sold.get(product_id, 0) + requested_qty
+
             # Deduct stock
             product.stock -= requested_qty
 
@@ -806,7 +1046,11 @@ def create_order_items(order_id, cart):
             if product.stock <= 0:
                 product.is_active = False
 
-            product.save()
+            # A stock-only save leaves the storefront snapshot alone unless the
+            # product sold out; see Product.save
+            product.save(update_fields=["stock", "is_active", "updated_at"])
+
+        record_trending(units_sold)
 
         print("✅ Order Items created successfully.")
         return None
@@ -855,7 +1099,7 @@ def delete_purchased_products(product_ids):
         updated_count = Product.objects.filter(
             id__in=product_ids,
             stock=0
-        ).update(is_active=False)
+        ).update(is_active=False, updated_at=timezone.now())
         print(f"✅ Marked {updated_count} products as inactive (stock 0)")
 
         # Delete corresponding entries from the Cart.
@@ -949,17 +1193,11 @@ def get_order_items_with_details(order_id):
             product = item.product_id
 
             if product and not product.is_deleted:
-                main_image_url = (
-                    supabase.storage.from_(
-                        "product-image").get_public_url(product.image_url)
-                    if product.image_url else None
-                )
-                additional_images = [
-                    supabase.storage.from_(
-                        "product-image").get_public_url(getattr(product, field))
+                main_image_url = public_url(product.image_url)
+                additional_images = public_urls(
+                    getattr(product, field, None)
                     for field in ["image_url2", "image_url3", "image_url4"]
-                    if getattr(product, field, None)
-                ]
+                )
                 product_name = product.name
             else:
                 # If the product is soft-deleted, show fallback details.
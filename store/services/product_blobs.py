@@ -0,0 +1,56 @@
+"""
+Per-product pre-serialized blobs in the shared cache.
+
+A blob (the product's JSON bytes for the API, or its card dict for templates)
+is keyed by the product id and a digest of everything its content depends on:
+the product's updated_at, its category/subcategory updated_at and the seller
+name. Every write that changes a product moves updated_at (see
+Product.refresh_variant_aggregates), so a save invalidates exactly that
+product's blobs by changing its key. Stale blobs age out after
+PRODUCT_BLOB_TIMEOUT.
+
+Readers fetch the stamps with one narrow query, look the blobs up with
+`cache.get_many`, and build only the missing ones.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the serialized shape of a blob kind changes
+PRODUCT_BLOB_FORMAT = 1
+PRODUCT_BLOB_TIMEOUT = getattr(settings, "PRODUCT_BLOB_TIMEOUT", 60 * 60 * 24 * 7)
+PRODUCT_BLOB_KEY = "product_blob:{format}:{kind}:{product_id}:{stamp}"
+
+# Values that invalidate a product's blobs when they change
+STAMP_FIELDS = ("updated_at", "category__updated_at", "subcategory__updated_at", "admin_id__company_name")
+
+
+def stamped(queryset, *fields):
+    """`queryset` of products as (id, stamp, *fields) rows, in its own order."""
+    for product_id, *values in queryset.values_list("id", *fields, *STAMP_FIELDS).iterator(chunk_size=2000):
+        stamp = hashlib.sha1(repr(values[len(fields):]).encode()).hexdigest()[:16]
+        yield (product_id, stamp, *values[:len(fields)])
+
+
+def get_blobs(kind, rows, build):
+    """
+    (id, blob) for `rows` of (id, stamp, ...), in order. `build(ids)` returns
+    {id: blob} for the ids missing from the cache; ids it leaves out (e.g.
+    deleted meanwhile) are skipped.
+    """
+    keys = {
+        product_id: PRODUCT_BLOB_KEY.format(format=PRODUCT_BLOB_FORMAT, kind=kind, product_id=product_id, stamp=stamp)
+        for product_id, stamp, *_ in rows
+    }
+    found = cache.get_many(list(keys.values()))
+    missing = [product_id for product_id, key in keys.items() if key not in found]
+    if missing:
+        built = build(missing)
+        cache.set_many({keys[product_id]: blob for product_id, blob in built.items()}, PRODUCT_BLOB_TIMEOUT)
+        found.update((keys[product_id], blob) for product_id, blob in built.items())
+        logger.debug("Built %d %s blobs (%d cached)", len(built), kind, len(keys) - len(missing))
+    return [(product_id, found[key]) for product_id, key in keys.items() if key in found]
@@ -0,0 +1,152 @@
+"""
+Per-worker cache of storefront search results.
+
+Popular queries repeat constantly, so the ordered product ids for a
+(normalized query, sort, filters) combination are kept in a bounded LRU. Each
+entry remembers the generation it was computed for: the catalog version, or,
+for results filtered to one category, the partition generations of that
+category and of the sellers with products in it (seller names are searched),
+so edits elsewhere leave them valid. Only ids are stored; the page's
+products are hydrated from the catalog snapshot as usual.
+
+Hits, misses and evictions are counted per worker and added to counters in
+the shared cache every SEARCH_STATS_FLUSH_INTERVAL seconds (`shared_stats`,
+shown by the `cache_stats` management command).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from store.services.catalog_cache import (get_catalog_version, get_partition_generations, category_partition,
+                                          seller_partition)
+from store.services.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_CACHE_SIZE = getattr(settings, "SEARCH_RESULT_CACHE_SIZE", 1024)
+SEARCH_STATS_FLUSH_INTERVAL = getattr(settings, "CACHE_STATS_FLUSH_INTERVAL", 10)
+STATS_KEY = "search_result_cache_stats:{metric}"
+METRICS = ("hits", "misses", "evictions")
+
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and repeated words, and sort the tokens."""
+    return " ".join(sorted(set(tokenize(query))))
+
+
+class SearchResultCache:
+    """Bounded LRU of result ids tagged with their generation, with hit/miss counters."""
+
+    def __init__(self, max_entries=SEARCH_RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Counters as of the last flush_stats()
+        self._flushed = dict.fromkeys(METRICS, 0)
+        self._flushed_at = time.monotonic()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                # Stale entries are overwritten by the set() that follows
+                self.misses += 1
+                ids = None
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                ids = entry[1]
+            flush = time.monotonic() - self._flushed_at >= SEARCH_STATS_FLUSH_INTERVAL
+            if flush:
+                self._flushed_at = time.monotonic()
+        if flush:
+            self.flush_stats()
+        return ids
+
+    def set(self, key, ids, version):
+        with self._lock:
+            self._entries[key] = (version, ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """This worker's entry count and counters."""
+        return {"entries": len(self._entries), **_with_hit_rate(self._counters())}
+
+    def _counters(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def flush_stats(self):
+        """Add the counts since the last flush to the shared counters."""
+        with self._lock:
+            counters = self._counters()
+            pending = {metric: counters[metric] - self._flushed[metric] for metric in METRICS}
+            self._flushed = counters
+        try:
+            for metric, amount in pending.items():
+                if not amount:
+                    continue
+                key = STATS_KEY.format(metric=metric)
+                try:
+                    cache.incr(key, amount)
+                except ValueError:
+                    if not cache.add(key, amount, timeout=None):
+                        cache.incr(key, amount)
+        except Exception as e:
+            logger.warning("Failed to flush search cache stats: %s", e)
+
+
+def _with_hit_rate(counters):
+    lookups = counters["hits"] + counters["misses"]
+    return {**counters, "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None}
+
+
+def shared_stats():
+    """Counters summed over every worker since they were last reset, with the hit rate."""
+    values = cache.get_many([STATS_KEY.format(metric=metric) for metric in METRICS])
+    return _with_hit_rate({metric: values.get(STATS_KEY.format(metric=metric), 0) for metric in METRICS})
+
+
+def reset_shared_stats():
+    cache.delete_many([STATS_KEY.format(metric=metric) for metric in METRICS])
+
+
+search_result_cache = SearchResultCache()
+
+
+def cached_search_ids(query, sort, filters, compute, version, category_id=None, seller_ids=()):
+    """
+    Ordered product ids for `query` under `sort` and `filters` (a dict of the
+    storefront filters), from the cache or from `compute(normalized_query)`.
+    `version` is the catalog version of the structures `compute` reads (see
+    catalog_columns.get_versioned_catalog_columns). Pass the filtered
+    `category_id` and the `seller_ids` with products in it to scope the entry
+    to those partitions.
+    """
+    normalized = normalize_query(query)
+    key = (normalized, sort, tuple(sorted(filters.items())))
+    cacheable = True
+    if category_id is not None:
+        generation = get_partition_generations(
+            [category_partition(category_id)] + [seller_partition(seller_id) for seller_id in seller_ids])
+        # Partitions are bumped after the catalog version (invalidate_catalog), so
+        # if the version read after them is still `version`, the structures
+        # `compute` reads include every change these generations count
+        cacheable = get_catalog_version() == version
+        version = generation
+
+    ids = search_result_cache.get(key, version)
+    if ids is None:
+        ids = compute(normalized)
+        if cacheable:
+            search_result_cache.set(key, ids, version)
+    return ids
@@ -0,0 +1,201 @@
+"""
+In-memory product search.
+
+The default backend keeps a token -> product-id inverted index over the searchable product fields
+plus a character-trigram index over the vocabulary, so typo-tolerant lookups
+only compare the query against vocabulary tokens that share trigrams with it
+instead of every word of every product. The index is derived from the active
+catalog snapshot and patched incrementally when products change.
+
+Setting PRODUCT_SEARCH_BACKEND = "postgres" answers the same queries with
+PostgreSQL full-text search instead (see orm_queries.search_products_postgres).
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from store.services.catalog_cache import get_derived
+from store.services.orm_queries import _build_active_products, search_products_postgres
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Field -> weight; a hit in the name counts more than one in the description.
+SEARCH_FIELDS = {
+    "name": 3.0,
+    "category__name": 2.0,
+    "subcategory__name": 2.0,
+    "admin_id__company_name": 1.5,
+    "description": 1.0,
+    "price": 1.0,
+    "original_price": 0.5,
+}
+
+# Minimum trigram similarity for a vocabulary token to count as an approximate
+# match (roughly what difflib's 0.5 ratio accepted before).
+FUZZY_THRESHOLD = 0.5
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+FUZZY_SCORE = 0.8
+
+
+def tokenize(text):
+    """Lowercase `text` and split it into word tokens."""
+    if text is None:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def trigrams(token):
+    """Character trigrams of `token`, padded so short tokens and prefixes match."""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """Inverted index with trigram typo tolerance over product dicts."""
+
+    def __init__(self, products=()):
+        self._lock = threading.RLock()
+        self.postings = defaultdict(dict)    # token -> {product_id: field weight}
+        self.trigram_index = defaultdict(set)  # trigram -> {token}
+        self.doc_tokens = {}                  # product_id -> {token}
+        self.products = {}                    # product_id -> product dict
+        self._vocabulary = None               # sorted tokens, built lazily
+        for product in products:
+            self._add(product)
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        return self.products.get(product_id)
+
+    # ------------------------------------------------------------------ updates
+
+    def _add(self, product):
+        product_id = product["id"]
+        weights = {}
+        for field, weight in SEARCH_FIELDS.items():
+            for token in tokenize(product.get(field)):
+                if weights.get(token, 0) < weight:
+                    weights[token] = weight
+
+        for token, weight in weights.items():
+            if token not in self.postings:
+                for gram in trigrams(token):
+                    self.trigram_index[gram].add(token)
+                self._vocabulary = None
+            self.postings[token][product_id] = weight
+
+        self.doc_tokens[product_id] = set(weights)
+        self.products[product_id] = product
+
+    def _remove(self, product_id):
+        for token in self.doc_tokens.pop(product_id, ()):
+            docs = self.postings.get(token)
+            if docs is None:
+                continue
+            docs.pop(product_id, None)
+            if not docs:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    self.trigram_index[gram].discard(token)
+                self._vocabulary = None
+        self.products.pop(product_id, None)
+
+    def add(self, product):
+        with self._lock:
+            self._remove(product["id"])
+            self._add(product)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def apply_delta(self, upserts, removed_ids):
+        """Patch the index with changed products; see catalog_cache.get_derived."""
+        with self._lock:
+            for product_id in removed_ids:
+                self._remove(product_id)
+            for product in upserts:
+                self._remove(product["id"])
+                self._add(product)
+
+    # ------------------------------------------------------------------ queries
+
+    def _prefix_matches(self, token):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + "\uffff")
+        return self._vocabulary[start:end]
+
+    def _fuzzy_matches(self, token):
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                shared[candidate] += 1
+        matches = []
+        for candidate, count in shared.items():
+            # Dice coefficient over trigram sets
+            similarity = 2.0 * count / (len(grams) + len(trigrams(candidate)))
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((candidate, similarity))
+        return matches
+
+    def _expand(self, token):
+        """Vocabulary tokens matching `token`, with their match strength."""
+        expansions = {}
+        if token in self.postings:
+            expansions[token] = EXACT_SCORE
+        for candidate in self._prefix_matches(token):
+            expansions.setdefault(candidate, PREFIX_SCORE)
+        for candidate, similarity in self._fuzzy_matches(token):
+            if candidate not in expansions:
+                expansions[candidate] = FUZZY_SCORE * similarity
+        return expansions
+
+    def search(self, query):
+        """
+        Return product ids matching `query`, best first.
+        Every query token contributes the best-scoring approximate match per
+        product; products matching more query tokens rank higher.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for token in query_tokens:
+                best = {}
+                for candidate, strength in self._expand(token).items():
+                    for product_id, weight in self.postings.get(candidate, {}).items():
+                        score = strength * weight
+                        if score > best.get(product_id, 0):
+                            best[product_id] = score
+                for product_id, score in best.items():
+                    scores[product_id] += score
+                    matched[product_id] += 1
+
+        return sorted(scores, key=lambda pid: (-matched[pid], -scores[pid], pid))
+
+
+def get_search_index():
+    """Return this worker's search index for the current catalog version."""
+    return get_derived("search_index", "active_products", _build_active_products, ProductSearchIndex)
+
+
+def search_products(query):
+    """
+    Return ranked ids of active products approximately matching `query`, using
+    the backend named by settings.PRODUCT_SEARCH_BACKEND ("index" or "postgres").
+    """
+    if getattr(settings, "PRODUCT_SEARCH_BACKEND", "index") == "postgres":
+        return search_products_postgres(query)
+    return get_search_index().search(query)
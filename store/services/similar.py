@@ -0,0 +1,226 @@
+"""
+Content-based "similar products" for products without sales history.
+
+Every active product gets an L2-normalised TF-IDF vector over its name,
+description, category and subcategory. The vectors form a CSR matrix, and a
+column-major copy (postings) makes one cosine query a weighted bincount over
+the postings of the query's terms. `rebuild_similar_products` precomputes
+every product's top-k neighbours in batches and stores them in the cache. The
+product page then reads one key.
+
+Neighbour lists are keyed by the catalog version they were computed for, so
+a catalog change retires all of them: a new or re-described product shows up
+in other products' lists, computed again lazily on the next product page.
+
+The matrix is derived from the catalog snapshot. When products change, only
+those whose text changed are re-vectorised and appended; old rows are masked.
+IDF weights stay fixed until appended rows exceed SIMILAR_REBUILD_RATIO of the
+matrix, which is then rebuilt with fresh document frequencies.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from store.services.catalog_cache import get_catalog_version, get_derived_entry
+from store.services.orm_queries import _build_active_products, get_active_products_by_id
+from store.services.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Field -> term-frequency weight
+SIMILAR_FIELDS = {
+    "name": 2.0,
+    "category__name": 1.0,
+    "subcategory__name": 1.0,
+    "description": 1.0,
+}
+SIMILAR_TOP_K = getattr(settings, "SIMILAR_TOP_K", 8)
+# Rows scored per pass when precomputing; each pass allocates batch x products floats
+SIMILAR_BATCH_SIZE = 64
+SIMILAR_KEY = "similar_products:v{version}:{product_id}"
+# Lists of older catalog versions are never read again; this only bounds their lifetime
+SIMILAR_TIMEOUT = getattr(settings, "SIMILAR_PRODUCTS_TTL", 60 * 60 * 24)
+# Rebuild (refreshing IDF) once rows re-vectorised since the last build exceed this share
+SIMILAR_REBUILD_RATIO = 0.2
+
+
+def _term_counts(product):
+    counts = Counter()
+    for field, weight in SIMILAR_FIELDS.items():
+        for token in tokenize(product.get(field)):
+            if not token.isdigit():
+                counts[token] += weight
+    return counts
+
+
+class TfidfVectors:
+    """TF-IDF vectors of the active products as CSR rows plus column postings."""
+
+    def __init__(self, products=()):
+        products = list(products)
+        # Readers share the matrix with the thread patching it
+        self._lock = threading.RLock()
+        self._build([product["id"] for product in products], [_term_counts(product) for product in products])
+
+    def _build(self, ids, counts):
+        """Build the matrix for products `ids` with the term Counters `counts`."""
+        document_frequency = Counter()
+        for terms in counts:
+            document_frequency.update(terms.keys())
+        self.vocabulary = {term: col for col, term in enumerate(sorted(document_frequency))}
+        self.documents = len(ids)
+        self.idf = np.array(
+            [self._idf(document_frequency[term]) for term in sorted(document_frequency)], dtype=np.float64)
+
+        indptr = [0]
+        indices, data = [], []
+        for terms in counts:
+            cols, vals = self._vectorize(terms)
+            indices.append(cols)
+            data.append(vals)
+            indptr.append(indptr[-1] + len(cols))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+        self.data = np.concatenate(data) if data else np.empty(0, dtype=np.float64)
+
+        # Column-major copy of the matrix: for each term, the rows containing it
+        rows = np.repeat(np.arange(len(ids), dtype=np.int64), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        self.post_rows = rows[order]
+        self.post_vals = self.data[order]
+        self.post_ptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(self.vocabulary)), out=self.post_ptr[1:])
+
+        self.base_rows = len(ids)
+        self.ids = list(ids)
+        self.row_of = {product_id: row for row, product_id in enumerate(self.ids)}
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.term_counts = dict(zip(self.ids, counts))
+        # Rows appended by apply_delta: row -> (cols, vals)
+        self.extra = {}
+
+    def _idf(self, df):
+        return math.log((1 + self.documents) / (1 + df)) + 1
+
+    def _vectorize(self, terms):
+        """(cols, vals) of the normalised vector for a term Counter; grows the vocabulary."""
+        for term in terms:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+                self.idf = np.append(self.idf, self._idf(1))
+        cols = np.array(sorted(self.vocabulary[term] for term in terms), dtype=np.int64)
+        weights = {self.vocabulary[term]: tf for term, tf in terms.items()}
+        vals = np.array([weights[col] for col in cols], dtype=np.float64) * self.idf[cols]
+        norm = np.linalg.norm(vals)
+        return cols, (vals / norm if norm else vals)
+
+    def row_vector(self, row):
+        if row < self.base_rows:
+            start, end = self.indptr[row], self.indptr[row + 1]
+            return self.indices[start:end], self.data[start:end]
+        return self.extra[row]
+
+    def apply_delta(self, upserts, removed_ids):
+        """Re-vectorise products whose text changed; see catalog_cache.get_derived."""
+        with self._lock:
+            for product_id in removed_ids:
+                self._retire(product_id)
+            for product in upserts:
+                terms = _term_counts(product)
+                if self.term_counts.get(product["id"]) == terms and product["id"] in self.row_of:
+                    continue  # price/stock-only change
+                self._retire(product["id"])
+                row = len(self.ids)
+                self.ids.append(product["id"])
+                self.row_of[product["id"]] = row
+                self.term_counts[product["id"]] = terms
+                self.extra[row] = self._vectorize(terms)
+                self.alive = np.append(self.alive, True)
+            if len(self.ids) - self.base_rows > SIMILAR_REBUILD_RATIO * max(self.base_rows, 1):
+                self._build(list(self.term_counts), list(self.term_counts.values()))
+
+    def _retire(self, product_id):
+        row = self.row_of.pop(product_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.extra.pop(row, None)
+            self.term_counts.pop(product_id, None)
+
+    def _scores(self, rows):
+        """Cosine similarity of each of `rows` against every row: (len(rows), total rows)."""
+        total = len(self.ids)
+        scores = np.zeros((len(rows), total), dtype=np.float64)
+        for i, row in enumerate(rows):
+            cols, vals = self.row_vector(row)
+            cols_in_base = cols[cols < len(self.post_ptr) - 1]
+            vals_in_base = vals[cols < len(self.post_ptr) - 1]
+            starts = self.post_ptr[cols_in_base]
+            lengths = self.post_ptr[cols_in_base + 1] - starts
+            if lengths.sum():
+                # Gather the postings of every query term in one shot
+                offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+                scores[i, :self.base_rows] = np.bincount(
+                    self.post_rows[offsets], weights=self.post_vals[offsets] * np.repeat(vals_in_base, lengths),
+                    minlength=self.base_rows)
+            query = dict(zip(cols.tolist(), vals.tolist()))
+            for other, (other_cols, other_vals) in self.extra.items():
+                scores[i, other] = sum(query.get(col, 0.0) * val
+                                       for col, val in zip(other_cols.tolist(), other_vals.tolist()))
+        scores[:, ~self.alive] = 0.0
+        scores[np.arange(len(rows)), rows] = 0.0
+        return scores
+
+    def neighbours(self, product_ids, limit=SIMILAR_TOP_K):
+        """product_id -> most similar product ids, best first, for the known `product_ids`."""
+        with self._lock:
+            rows = [self.row_of[product_id] for product_id in product_ids if product_id in self.row_of]
+            if not rows:
+                return {}
+            scores = self._scores(rows)
+            ids = list(self.ids)
+        limit = min(limit, scores.shape[1])
+        result = {}
+        for i, row in enumerate(rows):
+            top = np.argpartition(-scores[i], limit - 1)[:limit] if limit else []
+            top = sorted((row_ for row_ in top if scores[i, row_] > 0), key=lambda row_: -scores[i, row_])
+            result[ids[row]] = [ids[row_] for row_ in top]
+        return result
+
+
+def get_similarity_vectors():
+    """(version, vectors): this worker's TF-IDF vectors and the catalog version they match."""
+    return get_derived_entry("similarity_vectors", "active_products", _build_active_products, TfidfVectors)
+
+
+def rebuild_similar_products(batch_size=SIMILAR_BATCH_SIZE, limit=SIMILAR_TOP_K):
+    """Precompute and cache the neighbours of every active product; returns the count."""
+    started = time.perf_counter()
+    # Read first: the products loaded below are at least this new
+    version = get_catalog_version()
+    vectors = TfidfVectors(_build_active_products())
+    product_ids = list(vectors.row_of)
+    for start in range(0, len(product_ids), batch_size):
+        neighbours = vectors.neighbours(product_ids[start:start + batch_size], limit)
+        cache.set_many({SIMILAR_KEY.format(version=version, product_id=product_id): similar
+                        for product_id, similar in neighbours.items()}, timeout=SIMILAR_TIMEOUT)
+    logger.info("Similar products computed for %d products (%d terms) in %.0f ms",
+                len(product_ids), len(vectors.vocabulary), (time.perf_counter() - started) * 1000)
+    return len(product_ids)
+
+
+def get_similar_products(product_id, limit=SIMILAR_TOP_K):
+    """Storefront product dicts most similar to `product_id`, skipping anything no longer on sale."""
+    similar = cache.get(SIMILAR_KEY.format(version=get_catalog_version(), product_id=product_id))
+    if similar is None:
+        # Stored under the vectors' version, which lags while the new snapshot is built
+        version, vectors = get_similarity_vectors()
+        similar = vectors.neighbours([product_id], SIMILAR_TOP_K).get(product_id, [])
+        cache.set(SIMILAR_KEY.format(version=version, product_id=product_id), similar, timeout=SIMILAR_TIMEOUT)
+    products_by_id = get_active_products_by_id()
+    return [products_by_id[other] for other in similar if other in products_by_id][:limit]
@@ -0,0 +1,51 @@
+"""
+Public URLs for objects in Supabase storage.
+
+Product and seller images are stored as object keys (e.g. "uploads/20240101_shirt.png")
+and turned into public URLs on every read. Going through
+`supabase.storage.from_(bucket).get_public_url(key)` builds a bucket proxy and
+parses the URL for each image, which adds up on catalog pages that render
+hundreds of them. The public URL is a pure function of the project URL, the
+bucket and the key, so it is formatted here directly and memoised.
+"""
+import os
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+
+PRODUCT_IMAGE_BUCKET = "product-image"
+
+PUBLIC_URL_CACHE_SIZE = getattr(settings, "PUBLIC_URL_CACHE_SIZE", 8192)
+
+
+def _supabase_url():
+    return (getattr(settings, "SUPABASE_URL", None) or os.getenv("SUPABASE_URL") or "").rstrip("/")
+
+
+@lru_cache(maxsize=PUBLIC_URL_CACHE_SIZE)
+def _format_public_url(key, bucket):
+    if key.startswith(("http://", "https://")):
+        return key  # already a full URL
+    path = quote(key.lstrip("/"), safe="/")
+    return f"{_supabase_url()}/storage/v1/object/public/{bucket}/{path}"
+
+
+def public_url(key, bucket=PRODUCT_IMAGE_BUCKET):
+    """Return the public URL for storage object `key`, or None if there is no key."""
+    if not key:
+        return None
+    return _format_public_url(key, bucket)
+
+
+def public_urls(keys, bucket=PRODUCT_IMAGE_BUCKET):
+    """Public URLs for a list of keys, skipping empty ones."""
+    return [_format_public_url(key, bucket) for key in keys or () if key]
+
+
+def clear_public_url_cache():
+    _format_public_url.cache_clear()
+
+
+def public_url_cache_info():
+    return _format_public_url.cache_info()
@@ -0,0 +1,273 @@
+"""
+Type-ahead suggestions for the header search box.
+
+Completions cover product names, active categories/subcategories and approved
+sellers, each with a popularity weight (recent units sold for products, taken
+from the featured ranking job's time-decayed sales; number of active products
+for categories and sellers). Every completion is reachable from the start of
+its name and from the start of each later word, so "jack" completes
+"Denim Jacket".
+
+Prefixes up to TRIE_DEPTH characters are answered from a trie whose nodes keep
+their precomputed top-k completions; longer prefixes select a narrow range of
+the sorted key array with bisect. On a catalog version bump the index is
+patched with the changed products (see catalog_cache.get_derived), and when a
+new featured ranking is published with the weights that moved; only the trie
+nodes on the changed keys' paths are recomputed.
+"""
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+
+from store.models import AdminStore, Category, Subcategory
+from store.services.catalog_cache import get_derived
+from store.services.featured import get_featured_ranking
+from store.services.orm_queries import _build_active_products
+from store.services.search_index import tokenize
+
+SUGGEST_TOP_K = getattr(settings, "SUGGEST_TOP_K", 10)
+# Trie nodes (and their top-k lists) only exist for the first TRIE_DEPTH characters.
+TRIE_DEPTH = 6
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+def _suggestion_keys(suggestion):
+    """The searchable keys of a suggestion: its label from each word on."""
+    words = normalize(suggestion["label"]).split(" ")
+    return {key for key in (" ".join(words[start:]) for start in range(len(words))) if key}
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = ()
+
+
+class SuggestionIndex:
+    """Weighted prefix completion over suggestions keyed by a stable id."""
+
+    def __init__(self, suggestions, top_k=SUGGEST_TOP_K):
+        # suggestions: id -> dict with "label", "kind", "url", "weight" and
+        # optionally "context" (shown next to the label, not searched)
+        self.suggestions = dict(suggestions)
+        self.top_k = top_k
+        self._keys = {sid: _suggestion_keys(suggestion) for sid, suggestion in self.suggestions.items()}
+        # Sorted (key, id) pairs; a prefix selects a contiguous range
+        self.entries = sorted((key, sid) for sid, keys in self._keys.items() for key in keys)
+        self.root = _Node()
+        self._build(self.root, 0, len(self.entries), 0)
+
+    def _rank(self, sid):
+        suggestion = self.suggestions[sid]
+        return (-suggestion["weight"], suggestion["label"], sid)
+
+    def _best(self, start, end, limit):
+        """Ids of the best `limit` distinct suggestions among entries[start:end]."""
+        return heapq.nsmallest(limit, {sid for _, sid in self.entries[start:end]}, key=self._rank)
+
+    def _range(self, prefix):
+        return (bisect.bisect_left(self.entries, (prefix,)),
+                bisect.bisect_left(self.entries, (prefix + "\uffff",)))
+
+    def _build(self, node, start, end, depth):
+        # entries[start:end] are exactly the keys that share this node's prefix
+        node.top = tuple(self._best(start, end, self.top_k))
+        if depth == TRIE_DEPTH:
+            return
+        i = start
+        while i < end:
+            key = self.entries[i][0]
+            if len(key) <= depth:
+                i += 1
+                continue
+            group_end = bisect.bisect_left(self.entries, (key[:depth] + chr(ord(key[depth]) + 1),), i, end)
+            child = node.children[key[depth]] = _Node()
+            self._build(child, i, group_end, depth + 1)
+            i = group_end
+
+    def update(self, changes):
+        """
+        Apply `changes` ({id: suggestion, or None to remove it}) in place. Only
+        the trie nodes on the paths of the added and removed keys are revisited.
+        """
+        changed = {sid for sid, suggestion in changes.items() if self.suggestions.get(sid) != suggestion}
+        prefixes = set()
+        for sid in changed:
+            for key in self._keys.pop(sid, ()):
+                del self.entries[bisect.bisect_left(self.entries, (key, sid))]
+                prefixes.update(key[:depth] for depth in range(min(len(key), TRIE_DEPTH) + 1))
+            suggestion = changes[sid]
+            if suggestion is None:
+                del self.suggestions[sid]
+                continue
+            self.suggestions[sid] = suggestion
+            self._keys[sid] = _suggestion_keys(suggestion)
+            for key in self._keys[sid]:
+                bisect.insort(self.entries, (key, sid))
+                prefixes.update(key[:depth] for depth in range(min(len(key), TRIE_DEPTH) + 1))
+
+        # Parents first, so a new node's path exists when it is reached
+        for prefix in sorted(prefixes, key=len):
+            self._refresh_node(prefix, changed)
+
+    def _refresh_node(self, prefix, changed):
+        start, end = self._range(prefix)
+        parent, node = None, self.root
+        for char in prefix:
+            parent, node = node, node.children.get(char)
+            if node is None:
+                if start == end:
+                    return
+                node = parent.children[char] = _Node()
+        if start == end:
+            if parent is not None:
+                del parent.children[prefix[-1]]
+            return
+        if not node.top or changed.intersection(node.top):
+            # A suggestion in the old top-k moved or left: rescan the node's range
+            node.top = tuple(self._best(start, end, self.top_k))
+        else:
+            # The old top-k are all unchanged, so they are still the best of the
+            # unchanged suggestions; only the changed ones under this prefix compete
+            candidates = {sid for sid in changed
+                          if sid in self._keys and any(key.startswith(prefix) for key in self._keys[sid])}
+            node.top = tuple(heapq.nsmallest(self.top_k, set(node.top) | candidates, key=self._rank))
+
+    def suggest(self, prefix, limit=SUGGEST_TOP_K):
+        """Return up to `limit` suggestion dicts whose words start with `prefix`, best first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        if len(prefix) <= TRIE_DEPTH and limit <= self.top_k:
+            node = self.root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            ids = node.top[:limit]
+        else:
+            ids = self._best(*self._range(prefix), limit)
+        return [self.suggestions[sid] for sid in ids]
+
+
+def _catalog_labels():
+    """Active categories and subcategories and approved sellers, as suggestion stubs by id."""
+    labels = {}
+    for category in Category.objects.filter(is_active=True):
+        labels[f"category:{category.id}"] = {
+            "label": category.name,
+            "kind": "category",
+            "url": f"{reverse('home')}?category={category.slug}",
+        }
+    for subcategory in Subcategory.objects.filter(is_active=True, category__is_active=True).select_related("category"):
+        labels[f"subcategory:{subcategory.id}"] = {
+            "label": subcategory.name,
+            "kind": "subcategory",
+            "context": subcategory.category.name,
+            "url": f"{reverse('home')}?category={subcategory.category.slug}&subcategory={subcategory.slug}",
+        }
+    for seller in AdminStore.objects.filter(is_approved=True).only("id", "company_name"):
+        labels[f"seller:{seller.id}"] = {
+            "label": seller.company_name,
+            "kind": "seller",
+            "url": reverse("seller_details", args=[seller.id]),
+        }
+    return labels
+
+
+class CatalogSuggestions:
+    """
+    Suggestions for the active catalog. `apply_delta` patches the index with
+    changed products on a catalog version bump; a newly published featured
+    ranking re-weights it. Neither aggregates orders. Both hold the lock that
+    lookups take, since other threads keep using the index meanwhile.
+    """
+
+    def __init__(self, products):
+        self.products = {product["id"]: product for product in products}
+        self.labels = _catalog_labels()
+        self._lock = threading.Lock()
+        self._use_ranking(get_featured_ranking())
+        self.index = SuggestionIndex(self._suggestions())
+
+    def _use_ranking(self, ranking):
+        self._ranking_at = ranking["computed_at"] if ranking else None
+        self._sales = dict(zip(ranking["ids"], ranking.get("sales") or ())) if ranking else {}
+
+    def _suggestions(self):
+        """id -> suggestion for the current products, labels and sales."""
+        # Products with the same name collapse into one completion that searches for it
+        by_name = {}
+        counts = defaultdict(int)
+        for product_id in sorted(self.products):
+            product = self.products[product_id]
+            weight = 1 + self._sales.get(product_id, 0)
+            key = normalize(product["name"])
+            if key in by_name:
+                entry = by_name[key]
+                entry["weight"] += weight
+                entry["url"] = f"{reverse('home')}?{urlencode({'q': key})}"
+            else:
+                by_name[key] = {
+                    "label": product["name"],
+                    "kind": "product",
+                    "url": reverse("seller_product_details", args=[product_id]),
+                    "weight": weight,
+                }
+            counts[f"category:{product['category']}"] += 1
+            counts[f"subcategory:{product['subcategory']}"] += 1
+            counts[f"seller:{product['admin_id']}"] += 1
+
+        suggestions = {f"product:{key}": entry for key, entry in by_name.items() if key}
+        for sid, stub in self.labels.items():
+            suggestions[sid] = {**stub, "weight": counts.get(sid, 0)}
+        return suggestions
+
+    def _refresh(self):
+        """Move the index to the current suggestions, touching only the ones that differ."""
+        suggestions = self._suggestions()
+        changes = {sid: suggestion for sid, suggestion in suggestions.items()
+                   if self.index.suggestions.get(sid) != suggestion}
+        changes.update((sid, None) for sid in self.index.suggestions if sid not in suggestions)
+        self.index.update(changes)
+
+    def apply_delta(self, upserts, removed_ids):
+        """Patch the suggestions with changed products; see catalog_cache.get_derived."""
+        # Category, subcategory and seller renames also bump the catalog version
+        labels = _catalog_labels()
+        with self._lock:
+            for product in upserts:
+                self.products[product["id"]] = product
+            for product_id in removed_ids:
+                self.products.pop(product_id, None)
+            self.labels = labels
+            self._refresh()
+
+    def suggest(self, prefix, limit=SUGGEST_TOP_K):
+        ranking = get_featured_ranking()
+        # The index is updated in place, so lookups wait for a patch in progress
+        with self._lock:
+            if (ranking["computed_at"] if ranking else None) != self._ranking_at:
+                self._use_ranking(ranking)
+                self._refresh()
+            return self.index.suggest(prefix, limit)
+
+
+def get_suggestion_index():
+    """Return this worker's suggestion index for the current catalog version."""
+    return get_derived("suggestions", "active_products", _build_active_products, CatalogSuggestions)
+
+
+def suggest(prefix, limit=SUGGEST_TOP_K):
+    return get_suggestion_index().suggest(prefix, limit)
@@ -13,6 +13,7 @@ import logging
 import re
 from django.http import JsonResponse
 import traceback
+from store.services.storage_urls import public_url
 
 logger = logging.getLogger(__name__)
 
@@ -76,22 +77,6 @@ def fetch_user_by_uid(uid):
         return ""
 
 
-def search_products(query: str):
-    """
-    Function to search products by name or description.
-    It performs a case-insensitive search using the `ilike` operator.
-    """
-    # Query Supabase for products that match the search term in name or description
-    response = supabase.table('products').select('*') \
-        .ilike('name', f'%{query}%') \
-        .or_('description.ilike', f'%{query}%') \
-        .execute()
-
-    if response.get('status_code') == 200:
-        return response['data']  # Return product data from the response
-    return []
-
-
 def sanitize_filename(filename):
     """Removes invalid characters and replaces spaces with underscores."""
     filename = filename.replace(" ", "_")  # Replace spaces
@@ -189,16 +174,13 @@ def fetch_product_details(product_id):
 
         # Get the public URL for the main image
         if product.get("image_url"):
-            product["image_url"] = supabase.storage.from_(
-                "product-image").get_public_url(product["image_url"])
+            product["image_url"] = public_url(product["image_url"])
 
         # Collect additional images with public URLs
         additional_images = []
         for key in ["image_url2", "image_url3", "image_url4"]:
             if product.get(key):
-                public_url = supabase.storage.from_(
-                    "product-image").get_public_url(product[key])
-                additional_images.append(public_url)
+                additional_images.append(public_url(product[key]))
 
         product["additional_images"] = additional_images
 
@@ -326,8 +308,7 @@ def fetch_all_products():
             for i in range(1, 5):
                 key = f"image_url{i}" if i > 1 else "image_url"
                 if product.get(key):
-                    product[key] = supabase.storage.from_(
-                        "product-image").get_public_url(product[key])
+                    product[key] = public_url(product[key])
         
         # Convert timestamps to formatted string
         for product in products:
@@ -514,7 +495,7 @@ def get_products_by_ids(product_ids):
     # Convert all image URLs to public URLs
     for product in products:
         if product.get("image_url"):  # Ensure key exists
-            product["image_url"] = supabase.storage.from_("product-image").get_public_url(product["image_url"])
+            product["image_url"] = public_url(product["image_url"])
 
     return products
 
@@ -808,8 +789,3 @@ def get_all_orders_for_admin():
     except Exception as e:
         print(f"Error fetching orders for admin: {str(e)}")
         return []
-    
-def search_products_in_supabase(query):
-    """Search for products in the Supabase database."""
-    response = supabase.table("products").select("*").ilike("name", f"%{query}%").execute()
-    return response.data if response.data else []
\ No newline at end of file
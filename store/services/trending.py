@@ -0,0 +1,132 @@
+"""
+"Trending now": products with the most units sold or added to cart recently.
+
+Sales and add-to-cart events add to one counter per product and
+TRENDING_BUCKET_SECONDS time bucket in the shared cache with `cache.incr`, so
+concurrent workers never wait on each other or lose counts. A product's first
+units in a bucket also give it a numbered slot, which is how readers find the
+bucket's counters.
+
+Reading merges the buckets inside the window, at most once every
+TRENDING_POLL seconds per worker, so a page view only slices an already ranked
+id list. A closed bucket no longer changes: its top TRENDING_CAPACITY counts are
+summarised once and shared, and only the current bucket is read in full.
+Long-tail products outside a closed bucket's summary lose that bucket's units.
+"""
+import heapq
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TRENDING_WINDOW_HOURS = getattr(settings, "TRENDING_WINDOW_HOURS", 24)
+TRENDING_BUCKET_SECONDS = 60 * 60
+TRENDING_CAPACITY = getattr(settings, "TRENDING_CAPACITY", 200)
+TRENDING_SIZE = getattr(settings, "TRENDING_SIZE", 12)
+TRENDING_POLL = 60
+
+TRENDING_TIMEOUT = TRENDING_WINDOW_HOURS * 60 * 60 + TRENDING_BUCKET_SECONDS
+
+# Units of one product in one bucket
+TRENDING_KEY = "trending:{bucket}:{product_id}"
+# Number of products with units in the bucket; slot n holds the n-th one's id
+TRENDING_SLOTS_KEY = "trending:{bucket}:slots"
+TRENDING_SLOT_KEY = "trending:{bucket}:slot:{slot}"
+# [(product_id, units)] of a closed bucket, largest first
+TRENDING_SUMMARY_KEY = "trending:{bucket}:summary"
+
+
+def _current_bucket():
+    return int(time.time() // TRENDING_BUCKET_SECONDS)
+
+
+def _window_buckets():
+    current = _current_bucket()
+    buckets = -(-TRENDING_WINDOW_HOURS * 60 * 60 // TRENDING_BUCKET_SECONDS)
+    return range(current - buckets + 1, current + 1)
+
+
+def record_trending(units_by_product):
+    """
+    Add {product_id: units} to the current bucket. Failures are logged and
+    swallowed; trending must never break checkout or the cart.
+    """
+    units_by_product = {int(pid): units for pid, units in units_by_product.items() if units > 0}
+    if not units_by_product:
+        return
+    bucket = _current_bucket()
+    try:
+        for product_id, units in units_by_product.items():
+            key = TRENDING_KEY.format(bucket=bucket, product_id=product_id)
+            try:
+                cache.incr(key, units)
+            except ValueError:
+                # First units in this bucket, unless another worker just added them
+                if cache.add(key, units, timeout=TRENDING_TIMEOUT):
+                    _take_slot(bucket, product_id)
+                else:
+                    cache.incr(key, units)
+    except Exception as e:
+        logger.error(f"Error recording trending products: {e}")
+
+
+def _take_slot(bucket, product_id):
+    """List `product_id` among the products with units in `bucket`."""
+    slots_key = TRENDING_SLOTS_KEY.format(bucket=bucket)
+    cache.add(slots_key, 0, timeout=TRENDING_TIMEOUT)
+    slot = cache.incr(slots_key)
+    cache.set(TRENDING_SLOT_KEY.format(bucket=bucket, slot=slot), product_id, timeout=TRENDING_TIMEOUT)
+
+
+def _bucket_units(bucket):
+    """product_id -> units recorded in `bucket`."""
+    slots = cache.get(TRENDING_SLOTS_KEY.format(bucket=bucket)) or 0
+    slot_keys = [TRENDING_SLOT_KEY.format(bucket=bucket, slot=slot) for slot in range(1, slots + 1)]
+    keys = {TRENDING_KEY.format(bucket=bucket, product_id=product_id): product_id
+            for product_id in cache.get_many(slot_keys).values()}
+    return {keys[key]: units for key, units in cache.get_many(list(keys)).items()}
+
+
+def _summarize(bucket):
+    """Top TRENDING_CAPACITY (product_id, units) of closed `bucket`, stored for the other workers."""
+    summary = heapq.nlargest(TRENDING_CAPACITY, _bucket_units(bucket).items(), key=lambda pair: pair[1])
+    cache.set(TRENDING_SUMMARY_KEY.format(bucket=bucket), summary, timeout=TRENDING_TIMEOUT)
+    return summary
+
+
+def compute_trending(limit=TRENDING_CAPACITY):
+    """Merge the buckets in the window; returns product ids, most units first."""
+    *closed, current = _window_buckets()
+    summary_keys = {TRENDING_SUMMARY_KEY.format(bucket=bucket): bucket for bucket in closed}
+    summaries = cache.get_many(list(summary_keys))
+    totals = Counter(_bucket_units(current))
+    for key, bucket in summary_keys.items():
+        summary = summaries[key] if key in summaries else _summarize(bucket)
+        for product_id, units in summary:
+            totals[product_id] += units
+    return [product_id for product_id, _units in totals.most_common(limit)]
+
+
+# (fetched_at, ids) for this worker
+_local_trending = (0.0, [])
+
+
+def get_trending_ids():
+    """
+    Trending product ids, most units first, refreshed at most every
+    TRENDING_POLL seconds per worker. May include products that have since
+    sold out; callers skip ids missing from the active catalog.
+    """
+    global _local_trending
+    fetched_at, ids = _local_trending
+    if time.monotonic() - fetched_at >= TRENDING_POLL:
+        try:
+            ids = compute_trending()
+        except Exception as e:
+            logger.error(f"Error reading trending products: {e}")
+        _local_trending = (time.monotonic(), ids)
+    return ids
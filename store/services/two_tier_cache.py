@@ -0,0 +1,365 @@
+"""
+Two-tier cache backend: a per-process LRU in front of a shared cache (Redis).
+
+Hot keys such as the catalog version, partition generations, snapshots and
+the seller caches are read on nearly every request. Fetching them from Redis
+costs a round trip and an unpickle each time, so `TwoTierCache` keeps the
+values of keys matching LOCAL_KEYS in a bounded, TTL-limited dict per process
+and only goes to the remote cache on a local miss. Values are kept pickled and
+every read unpickles its own copy, as with the remote cache, so a caller that
+mutates what it got (a seller's product list) cannot change it for the rest of
+the process. Every other key, and every
+atomic operation (add, incr, decr), goes straight to the remote cache.
+
+Writes go to the remote cache first and then publish the key on an
+invalidation channel; every process drops its local copy when it hears about
+it. The local TTL bounds staleness if a message is lost, and a process drops
+its whole local tier whenever it (re)subscribes. A fetch that overlaps an
+invalidation is not stored locally, so a process never keeps a value older
+than one it has been told about.
+
+Transports: "pubsub" uses Redis pub/sub on the remote cache's connection
+(django_redis); "local" is an in-process bus for a locmem stand-in, where
+several TwoTierCache aliases sharing one remote behave like separate nodes.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "store.services.two_tier_cache.TwoTierCache",
+            "OPTIONS": {"REMOTE": "redis", "LOCAL_KEYS": r"catalog_version|seller_products:"},
+        },
+        "redis": {"BACKEND": "django_redis.cache.RedisCache", ...},
+    }
+"""
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ALL = "*"
+_MISSING = object()
+
+
+class LocalTier:
+    """Bounded LRU of (pickled value, expires_at) with an epoch that moves on every invalidation."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self.listening = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(entry[0])
+
+    def set(self, key, value, timeout, epoch=None):
+        """
+        Store `value` for at most `timeout` seconds (None: the local TTL). With
+        `epoch`, skip it if anything was invalidated since that epoch was read.
+        """
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if not self.listening or (epoch is not None and epoch != self.epoch) or ttl <= 0:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.epoch += 1
+            self.invalidations += 1
+            if FLUSH_ALL in keys:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+            return self.epoch
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+class LocalBus:
+    """In-process stand-in for Redis pub/sub."""
+
+    _subscribers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, remote_alias, channel):
+        self.channel = channel
+
+    def publish(self, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(self.channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(callback)
+        callback(None)
+
+
+class RedisBus:
+    """Redis pub/sub on the remote cache's connection, listened to by a daemon thread."""
+
+    def __init__(self, remote_alias, channel):
+        from django_redis import get_redis_connection
+
+        self.channel = channel
+        self.client = get_redis_connection(remote_alias)
+
+    def publish(self, message):
+        self.client.publish(self.channel, message)
+
+    def subscribe(self, callback):
+        threading.Thread(target=self._listen, args=(callback,), name=f"cache-bus:{self.channel}", daemon=True).start()
+
+    def _listen(self, callback):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we were not listening is lost
+                callback(None)
+                for message in pubsub.listen():
+                    callback(message["data"].decode())
+            except Exception as e:
+                logger.warning("Cache invalidation channel %s lost (%s); resubscribing", self.channel, e)
+            callback(False)
+            time.sleep(1)
+
+
+BUSES = {"pubsub": RedisBus, "local": LocalBus}
+
+# Process-wide state per alias; Django creates one backend instance per thread
+_nodes = {}
+_nodes_lock = threading.Lock()
+
+
+class _Node:
+    def __init__(self, tier, bus):
+        self.tier = tier
+        self.bus = bus
+        self.id = uuid.uuid4().hex
+        self.pid = os.getpid()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Cache backend with a per-process LRU in front of the cache alias REMOTE.
+
+    OPTIONS: REMOTE (alias of the shared cache), LOCAL_KEYS (regex matched
+    against the start of a key as callers pass it; only those keys are kept
+    locally), MAX_ENTRIES, LOCAL_TIMEOUT (seconds a local copy may live),
+    INVALIDATION ("pubsub" or "local") and CHANNEL. LOCATION names the local
+    tier; aliases with different LOCATIONs act as separate nodes.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.remote_alias = options["REMOTE"]
+        self.local_keys = re.compile(options.get("LOCAL_KEYS", ".*"))
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 60)
+        self.invalidation = options.get("INVALIDATION", "pubsub")
+        self.channel = options.get("CHANNEL", f"cache_invalidation:{self.remote_alias}")
+        self.node_name = location or self.remote_alias
+
+    @property
+    def _remote(self):
+        return caches[self.remote_alias]
+
+    @property
+    def remote(self):
+        """The shared cache, for atomic operations the cache API lacks (see cache_flight)."""
+        return self._remote
+
+    @property
+    def _node(self):
+        node = _nodes.get(self.node_name)
+        if node is not None and node.pid == os.getpid():
+            return node
+        with _nodes_lock:
+            node = _nodes.get(self.node_name)
+            # A forked worker starts with a fresh tier and its own subscription
+            if node is None or node.pid != os.getpid():
+                node = _Node(LocalTier(self._max_entries, self.local_timeout),
+                             BUSES[self.invalidation](self.remote_alias, self.channel))
+                _nodes[self.node_name] = node
+                node.bus.subscribe(lambda message, node=node: self._receive(node, message))
+            return node
+
+    @staticmethod
+    def _receive(node, message):
+        if message is None:
+            # (Re)subscribed: drop whatever may have been missed
+            node.tier.invalidate([FLUSH_ALL])
+            node.tier.listening = True
+        elif message is False:
+            node.tier.listening = False
+            node.tier.invalidate([FLUSH_ALL])
+        else:
+            sender, _, keys = message.partition("\n")
+            if sender != node.id:
+                node.tier.invalidate(keys.split("\n"))
+
+    def _local_key(self, key, version):
+        """The local tier's key for `key`, or None if `key` is not kept locally."""
+        made_key = self.make_and_validate_key(key, version)
+        return made_key if self.local_keys.match(key) else None
+
+    def _invalidate(self, local_keys):
+        """
+        Drop `local_keys` here and tell every other process to. Returns the
+        local epoch to store fresh values under.
+        """
+        node = self._node
+        local_keys = [key for key in local_keys if key]
+        if not local_keys:
+            return node.tier.epoch
+        epoch = node.tier.invalidate(local_keys)
+        try:
+            node.bus.publish(f"{node.id}\n" + "\n".join(local_keys))
+        except Exception as e:
+            logger.error("Failed to publish cache invalidation for %s: %s", local_keys, e)
+        return epoch
+
+    def _local_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        return None if timeout is None else timeout - time.time()
+
+    def stats(self):
+        """This process's local tier counters."""
+        return self._node.tier.stats()
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return self._remote.get(key, default, version)
+        tier = self._node.tier
+        value = tier.get(local_key)
+        if value is not _MISSING:
+            return value
+        epoch = tier.epoch
+        value = self._remote.get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        tier.set(local_key, value, None, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remote_keys = {}, []
+        tier = self._node.tier
+        local_keys = {key: self._local_key(key, version) for key in keys}
+        for key, local_key in local_keys.items():
+            value = tier.get(local_key) if local_key else _MISSING
+            if value is _MISSING:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+        if remote_keys:
+            epoch = tier.epoch
+            fetched = self._remote.get_many(remote_keys, version)
+            for key, value in fetched.items():
+                if local_keys[key]:
+                    tier.set(local_keys[key], value, None, epoch)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self._remote.set(key, value, timeout, version)
+        epoch = self._invalidate([local_key])
+        if local_key:
+            # Skipped if a newer write landed meanwhile
+            self._node.tier.set(local_key, value, self._local_timeout(timeout), epoch)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        local_keys = {key: self._local_key(key, version) for key in data}
+        failed = self._remote.set_many(data, timeout, version)
+        epoch = self._invalidate(local_keys.values())
+        tier, local_timeout = self._node.tier, self._local_timeout(timeout)
+        for key, value in data.items():
+            if local_keys[key] and key not in failed:
+                tier.set(local_keys[key], value, local_timeout, epoch)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        added = self._remote.add(key, value, timeout, version)
+        if added:
+            self._invalidate([local_key])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._remote.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        deleted = self._remote.delete(key, version)
+        self._invalidate([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self._local_key(key, version) for key in keys]
+        self._remote.delete_many(keys, version)
+        self._invalidate(local_keys)
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if local_key and self._node.tier.get(local_key) is not _MISSING:
+            return True
+        return self._remote.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        value = self._remote.incr(key, delta, version)
+        self._invalidate([local_key])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        value = self._remote.decr(key, delta, version)
+        self._invalidate([local_key])
+        return value
+
+    def clear(self):
+        self._remote.clear()
+        self._invalidate([FLUSH_ALL])
+
+    def close(self, **kwargs):
+        self._remote.close(**kwargs)
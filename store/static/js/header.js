@@ -8,9 +8,7 @@ document.addEventListener("DOMContentLoaded", function () {
     const overlay = document.getElementById('overlay');
     const cartCount = document.querySelector('.cart-count');  // Cart count element
     const searchInput = document.getElementById('searchInput');  // Declare the search input element
-    const searchResults = document.getElementById("searchResults");
     const authLinks = document.querySelectorAll('.auth-links-mobile a'); // Select all auth links
-    const productList = document.getElementById("productList");
 
     // Search functionality
     searchToggle.addEventListener('click', () => {
@@ -70,29 +68,72 @@ document.addEventListener("DOMContentLoaded", function () {
     //     }
     // });
 
-    // 🔹 **Fetch All Products (Reusable)**
-    function fetchAllProducts() {
-        fetch(`/products/`)
+    // 🔹 **Type-ahead suggestions**
+    const searchSuggestions = document.getElementById("searchSuggestions");
+    const suggestionKinds = { product: "Product", category: "Category", subcategory: "Category", seller: "Seller" };
+    let suggestTimer = null;
+    let suggestController = null;
+    let activeSuggestion = -1;
+
+    function renderSuggestions(suggestions) {
+        activeSuggestion = -1;
+        searchSuggestions.innerHTML = "";
+        suggestions.forEach((suggestion) => {
+            const item = document.createElement("li");
+            const link = document.createElement("a");
+            const label = document.createElement("span");
+            const kind = document.createElement("span");
+            link.href = suggestion.url;
+            label.textContent = suggestion.label;
+            kind.className = "suggestion-kind";
+            kind.textContent = suggestion.context
+                ? `${suggestionKinds[suggestion.kind]} · ${suggestion.context}`
+                : suggestionKinds[suggestion.kind];
+            link.append(label, kind);
+            item.appendChild(link);
+            searchSuggestions.appendChild(item);
+        });
+    }
+
+    function fetchSuggestions(query) {
+        if (suggestController) suggestController.abort();
+        suggestController = new AbortController();
+        fetch(`/api/suggest/?q=${encodeURIComponent(query)}`, { signal: suggestController.signal })
             .then((response) => response.json())
             .then((data) => {
-                productList.innerHTML = "";
-                data.products.forEach((product) => {
-                    const imageUrl = product.image_url || "/static/images/default-product.jpg";
-                    const item = document.createElement("div");
-                    item.classList.add("product-item");
-                    item.innerHTML = `
-                        <a href="/product/${product.id}" class="product-link">
-                            <img src="${imageUrl}" alt="${product.name}" class="product-image">
-                            <h3>${product.name}</h3>
-                            <p>₹${product.price}</p>
-                        </a>
-                    `;
-                    productList.appendChild(item);
-                });
+                // Ignore answers for text the user has already changed
+                if (searchInput.value.trim() === query) renderSuggestions(data.suggestions);
             })
-            .catch((error) => console.error("Error loading products:", error));
+            .catch((error) => {
+                if (error.name !== "AbortError") console.error("Error loading suggestions:", error);
+            });
     }
 
+    searchInput.addEventListener("input", () => {
+        clearTimeout(suggestTimer);
+        const query = searchInput.value.trim();
+        if (!query) {
+            renderSuggestions([]);
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(query), 120);
+    });
+
+    // Arrow keys move through the suggestions; Enter opens the highlighted one
+    // (the inline handler in header.html submits a plain search otherwise).
+    searchInput.addEventListener("keydown", (e) => {
+        const items = searchSuggestions.querySelectorAll("li");
+        if (!items.length) return;
+        if (e.key === "ArrowDown" || e.key === "ArrowUp") {
+            e.preventDefault();
+            activeSuggestion = (activeSuggestion + (e.key === "ArrowDown" ? 1 : -1) + items.length) % items.length;
+            items.forEach((item, i) => item.classList.toggle("active", i === activeSuggestion));
+        } else if (e.key === "Enter" && activeSuggestion >= 0) {
+            e.preventDefault();
+            window.location.href = items[activeSuggestion].querySelector("a").href;
+        }
+    });
+
 
     function updateCartCount() {
         fetch('/cart_count/', {
@@ -12,15 +12,18 @@ class ProductOverlay {
 
     // Initialize event listeners
     initEventListeners() {
-        // Open overlay when "View Details" is clicked
-        document.querySelectorAll('.view-details').forEach(button => {
-            button.addEventListener('click', (e) => {
-                e.preventDefault();
-                e.stopPropagation();
-                const card = button.closest('.product-card');
-                this.openProductOverlay(card);
-            });
-        });
+        // Open overlay when "View Details" is clicked. Delegated (in the capture
+        // phase, so per-card handlers still run) so that cards appended by
+        // infinite scroll work too.
+        document.addEventListener('click', (e) => {
+            const button = e.target.closest('.view-details');
+            if (!button) {
+                return;
+            }
+            e.preventDefault();
+            const card = button.closest('.product-card');
+            this.openProductOverlay(card);
+        }, true);
 
         // Close overlay when close button is clicked
         const closeButton = this.overlay.querySelector('.close-overlay');
@@ -0,0 +1,54 @@
+// Infinite scroll for the storefront product grid
+class ProductGridPaginator {
+    constructor(grid, sentinel) {
+        this.grid = grid;
+        this.sentinel = sentinel;
+        this.nextUrl = sentinel.dataset.nextUrl;
+        this.loading = false;
+        this.observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                this.loadNextPage();
+            }
+        }, { rootMargin: '400px' });
+        this.observer.observe(this.sentinel);
+    }
+
+    // Fetch the next page of rendered cards and append them to the grid
+    loadNextPage() {
+        if (this.loading || !this.nextUrl) {
+            return;
+        }
+        this.loading = true;
+
+        fetch(this.nextUrl, {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            credentials: 'same-origin'
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                this.grid.insertAdjacentHTML('beforeend', data.html);
+                this.nextUrl = data.has_next ? data.next_page_url : null;
+                if (!this.nextUrl) {
+                    this.observer.disconnect();
+                    this.sentinel.remove();
+                }
+            })
+            .catch(error => console.error('Error loading more products:', error))
+            .finally(() => {
+                this.loading = false;
+            });
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const grid = document.querySelector('.product-grid');
+    const sentinel = document.getElementById('product-grid-sentinel');
+    if (grid && sentinel) {
+        new ProductGridPaginator(grid, sentinel);
+    }
+});
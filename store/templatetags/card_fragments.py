@@ -0,0 +1,11 @@
+from django import template
+
+from store.services.card_fragments import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_cards(products, template_name):
+    """Render one `template_name` card per product, reusing cached HTML; see services.card_fragments."""
+    return render_cards(template_name, list(products))
@@ -1,3 +1,1467 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from store.models import (AdminStore, Category, Order, OrderItem, Product, ProductCoPurchase,
+                          ProductVariant, Subcategory, User)
+from store.services import (cache_flight, catalog_cache, featured, orm_queries, search_cache, trending,
+                            two_tier_cache)
+from store.services.card_fragments import render_cards
+from store.services.catalog_cache import (bump_partitions, category_partition, get_catalog_revision,
+                                          get_catalog_version, get_partition_generation,
+                                          get_partition_generations, seller_partition)
+from store.services.catalog_columns import CatalogColumns, product_variants
+from store.services.co_purchase import get_bought_together, rebuild_co_purchases, record_co_purchases
+from store.services.facets import FacetCounts, get_facets, price_bucket
+from store.services.featured import (FEATURED_RANKING_KEY, FEATURED_RANKING_LOCK_KEY, compute_featured_ranking,
+                                     featured_scores, get_featured_ranking)
+from store.services.orm_queries import create_order_items, get_active_products_by_id, search_products_postgres
+from store.services.product_blobs import get_blobs, stamped
+from store.services.search_index import ProductSearchIndex
+from store.services.similar import TfidfVectors, get_similar_products, rebuild_similar_products
+from store.services.storage_urls import clear_public_url_cache, public_url, public_urls
+from store.services.suggest import SuggestionIndex, get_suggestion_index, suggest
+from store.views import SELLER_PRODUCTS_KEY
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"},
+}
+
+TWO_TIER_OPTIONS = {
+    "REMOTE": "remote",
+    "INVALIDATION": "local",
+    "CHANNEL": "tests",
+    "MAX_ENTRIES": 3,
+    "LOCAL_KEYS": r"hot:",
+}
+
+TWO_TIER_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-default"},
+    "node_a": {"BACKEND": "store.services.two_tier_cache.TwoTierCache", "LOCATION": "node-a",
+               "OPTIONS": TWO_TIER_OPTIONS},
+    "node_b": {"BACKEND": "store.services.two_tier_cache.TwoTierCache", "LOCATION": "node-b",
+               "OPTIONS": TWO_TIER_OPTIONS},
+    "remote": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-remote"},
+}
+
+
+class CatalogStateMixin:
+    """Start each test with an empty local-memory cache and no per-process catalog copies."""
+
+    def setUp(self):
+        super().setUp()
+        caches_override = override_settings(CACHES=LOCMEM_CACHES)
+        caches_override.enable()
+        self.addCleanup(caches_override.disable)
+        cache.clear()
+        catalog_cache._local_snapshots.clear()
+        catalog_cache._local_derived.clear()
+        featured._local_ranking = (0.0, None)
+
+
+@override_settings(CACHES=TWO_TIER_CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self._reset_nodes()
+        self.addCleanup(self._reset_nodes)
+        self.node_a = caches["node_a"]
+        self.node_b = caches["node_b"]
+        self.remote = caches["remote"]
+
+    @staticmethod
+    def _reset_nodes():
+        two_tier_cache._nodes.clear()
+        two_tier_cache.LocalBus._subscribers.clear()
+        caches["remote"].clear()
+
+    def test_local_hit_skips_remote(self):
+        self.node_a.set("hot:version", 1)
+        self.remote.set("hot:version", 2)  # behind the local tier's back
+        self.assertEqual(self.node_a.get("hot:version"), 1)
+        self.assertEqual(self.node_a.stats()["hits"], 1)
+
+    def test_miss_is_filled_from_remote(self):
+        self.remote.set("hot:version", 7)
+        self.assertEqual(self.node_a.get("hot:version"), 7)
+        self.assertEqual(self.node_a.get("hot:version"), 7)
+        stats = self.node_a.stats()
+        self.assertEqual((stats["misses"], stats["hits"]), (1, 1))
+
+    def test_other_keys_are_not_kept_locally(self):
+        self.node_a.set("cold:key", 1)
+        self.remote.set("cold:key", 2)
+        self.assertEqual(self.node_a.get("cold:key"), 2)
+        self.assertEqual(self.node_a.stats()["entries"], 0)
+
+    def test_set_invalidates_other_nodes(self):
+        self.node_a.set("hot:version", 1)
+        self.assertEqual(self.node_b.get("hot:version"), 1)
+        self.node_a.set("hot:version", 2)
+        self.assertEqual(self.node_b.get("hot:version"), 2)
+
+    def test_incr_invalidates_every_node(self):
+        self.node_a.set("hot:counter", 1)
+        self.assertEqual(self.node_b.get("hot:counter"), 1)
+        self.assertEqual(self.node_b.incr("hot:counter"), 2)
+        self.assertEqual(self.node_a.get("hot:counter"), 2)
+        self.assertEqual(self.node_b.get("hot:counter"), 2)
+
+    def test_delete_invalidates_other_nodes(self):
+        self.node_a.set("hot:version", 1)
+        self.assertEqual(self.node_b.get("hot:version"), 1)
+        self.node_a.delete("hot:version")
+        self.assertIsNone(self.node_b.get("hot:version"))
+
+    def test_sender_keeps_its_fresh_copy(self):
+        self.node_a.set("hot:version", 1)
+        self.node_a.get("hot:version")
+        self.assertEqual(self.node_a.stats()["hits"], 1)
+        self.assertEqual(self.node_a.stats()["entries"], 1)
+
+    def test_local_reads_are_copies(self):
+        self.node_a.set("hot:products", [1, 2])
+        self.node_a.get("hot:products").append(3)
+        self.assertEqual(self.node_a.get("hot:products"), [1, 2])
+        self.assertEqual(self.node_a.stats()["hits"], 2)
+
+    def test_stored_value_is_a_copy(self):
+        products = [1, 2]
+        self.node_a.set("hot:products", products)
+        products.append(3)
+        self.assertEqual(self.node_a.get("hot:products"), [1, 2])
+
+    def test_lru_eviction(self):
+        for i in range(3):
+            self.node_a.set(f"hot:{i}", i)
+        self.node_a.get("hot:0")  # hot:1 is now the least recently used
+        self.node_a.set("hot:3", 3)
+
+        stats = self.node_a.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (3, 1))
+        hits = stats["hits"]
+        for i in (0, 2, 3):
+            self.node_a.get(f"hot:{i}")
+        self.assertEqual(self.node_a.stats()["hits"], hits + 3)
+        self.assertEqual(self.node_a.get("hot:1"), 1)  # refetched from the remote
+        self.assertEqual(self.node_a.stats()["hits"], hits + 3)
+
+
+class CatalogInvalidationTests(CatalogStateMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = AdminStore.objects.create(
+            firebase_uid="seller", company_name="Seller", email="seller@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        self.category = Category.objects.create(name="Clothing")
+        self.other_category = Category.objects.create(name="Shoes")
+        self.subcategory = Subcategory.objects.create(category=self.category, name="Shirts")
+        self.product = Product.objects.create(
+            name="Linen Shirt", category=self.category, subcategory=self.subcategory, price=Decimal("10.00"),
+            admin_id=self.seller, stock=5)
+        self.version = get_catalog_version()
+
+    def generation(self, partition):
+        return get_partition_generation(partition)
+
+    def test_save_bumps_version_on_commit(self):
+        with transaction.atomic():
+            self.product.price = Decimal("12.00")
+            self.product.save()
+            self.assertEqual(get_catalog_version(), self.version)
+        self.assertGreater(get_catalog_version(), self.version)
+
+    def test_rolled_back_save_keeps_version(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.product.save()
+            raise RuntimeError
+        self.assertEqual(get_catalog_version(), self.version)
+
+    def test_stock_only_save_keeps_version(self):
+        seller_generation = self.generation(seller_partition(self.seller.pk))
+        revision = get_catalog_revision()
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock -= 1
+        product.save(update_fields=["stock", "is_active", "updated_at"])
+
+        self.assertEqual(get_catalog_version(), self.version)
+        self.assertNotEqual(self.generation(seller_partition(self.seller.pk)), seller_generation)
+        self.assertNotEqual(get_catalog_revision(), revision)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 4)
+
+    def test_selling_out_bumps_version(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 0
+        product.is_active = False
+        product.save(update_fields=["stock", "is_active", "updated_at"])
+        self.assertGreater(get_catalog_version(), self.version)
+
+    def test_checkout_keeps_version_until_sold_out(self):
+        user = User.objects.create(id="buyer", email="buyer@example.com")
+        order = Order.objects.create(user_id=user, admin=self.seller)
+        item = {"name": "Linen Shirt", "price": Decimal("10.00"), "quantity": 2}
+
+        self.assertIsNone(create_order_items(order.id, {str(self.product.pk): item}))
+        self.assertEqual(get_catalog_version(), self.version)
+
+        item["quantity"] = 3
+        self.assertIsNone(create_order_items(order.id, {str(self.product.pk): item}))
+        self.assertGreater(get_catalog_version(), self.version)
+        self.assertFalse(Product.objects.get(pk=self.product.pk).is_active)
+
+    def test_move_bumps_old_and_new_partitions(self):
+        old = self.generation(category_partition(self.category.pk))
+        new = self.generation(category_partition(self.other_category.pk))
+        Product.objects.filter(pk=self.product.pk).update(category=self.other_category)
+        self.assertNotEqual(self.generation(category_partition(self.category.pk)), old)
+        self.assertNotEqual(self.generation(category_partition(self.other_category.pk)), new)
+        self.assertGreater(get_catalog_version(), self.version)
+
+    def test_seller_save_leaves_other_partitions(self):
+        category = self.generation(category_partition(self.other_category.pk))
+        seller = self.generation(seller_partition(self.seller.pk))
+        self.seller.company_name = "Renamed"
+        self.seller.save()
+        self.assertNotEqual(self.generation(seller_partition(self.seller.pk)), seller)
+        self.assertEqual(self.generation(category_partition(self.other_category.pk)), category)
+        self.assertGreater(get_catalog_version(), self.version)
+
+    def test_bulk_writes_bump_version(self):
+        for write in (
+            lambda: Category.objects.filter(pk=self.category.pk).update(name="Apparel"),
+            lambda: Product.objects.bulk_update([self.product], ["price"]),
+            lambda: Product.objects.filter(pk=self.product.pk).delete(),
+        ):
+            version = get_catalog_version()
+            write()
+            self.assertGreater(get_catalog_version(), version)
+
+
+class SearchVectorTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="vector-seller", company_name="Vectors", email="vectors@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.category = Category.objects.create(name="Kitchen")
+        cls.subcategory = Subcategory.objects.create(category=cls.category, name="Kettles")
+        cls.product = Product.objects.create(
+            name="Steel Kettle", description="Boils water", category=cls.category, subcategory=cls.subcategory,
+            price=Decimal("30.00"), admin_id=cls.seller, stock=3)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(Product, "update_search_vectors")
+        self.update_search_vectors = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product = Product.objects.get(pk=self.product.pk)
+
+    def test_stock_save_skips_vector(self):
+        self.product.stock -= 1
+        self.product.save(update_fields=["stock", "is_active", "updated_at"])
+        self.product.stock -= 1
+        self.product.save()
+        self.update_search_vectors.assert_not_called()
+
+    def test_changed_source_refreshes_vector(self):
+        self.product.description = "Boils water fast"
+        self.product.save()
+        self.update_search_vectors.assert_called_once_with(pk=self.product.pk)
+
+        self.update_search_vectors.reset_mock()
+        self.product.save()  # nothing changed since that save
+        self.update_search_vectors.assert_not_called()
+
+    def test_new_product_gets_vector(self):
+        product = Product.objects.create(
+            name="Glass Kettle", category=self.category, subcategory=self.subcategory, price=Decimal("20.00"),
+            admin_id=self.seller)
+        self.update_search_vectors.assert_called_once_with(pk=product.pk)
+
+    def test_category_rename_refreshes_its_products(self):
+        self.category.save()
+        self.update_search_vectors.assert_not_called()
+        self.category.name = "Cookware"
+        self.category.save()
+        self.update_search_vectors.assert_called_once_with(category=self.category.pk)
+
+    def test_queryset_update_of_sources_refreshes_vectors(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+        self.update_search_vectors.assert_not_called()
+        Subcategory.objects.filter(pk=self.subcategory.pk).update(name="Teapots")
+        self.update_search_vectors.assert_called_once_with(subcategory__in=[self.subcategory.pk])
+
+
+@skipUnless(connection.vendor == "postgresql", "search_vector is PostgreSQL only")
+class PostgresSearchTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="pg-seller", company_name="Postgres", email="pg@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.category = Category.objects.create(name="Garden")
+        subcategory = Subcategory.objects.create(category=cls.category, name="Tools")
+        cls.spade = Product.objects.create(
+            name="Spade", description="Digs soil", category=cls.category, subcategory=subcategory,
+            price=Decimal("15.00"), admin_id=seller)
+        cls.rake = Product.objects.create(
+            name="Rake", description="Gathers leaves", category=cls.category, subcategory=subcategory,
+            price=Decimal("12.00"), admin_id=seller)
+
+    def test_matches_name_description_and_category(self):
+        self.assertEqual(search_products_postgres("spade"), [self.spade.pk])
+        self.assertEqual(search_products_postgres("leaves"), [self.rake.pk])
+        self.assertEqual(sorted(search_products_postgres("garden")), sorted([self.spade.pk, self.rake.pk]))
+
+    def test_typo_matches_name(self):
+        self.assertIn(self.spade.pk, search_products_postgres("spaed"))
+
+    def test_category_rename_is_searchable(self):
+        self.category.name = "Outdoors"
+        self.category.save()
+        self.assertEqual(len(search_products_postgres("outdoors")), 2)
+        self.assertEqual(search_products_postgres("garden"), [])
+
+
+class FeaturedRankingTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="featured-seller", company_name="Featured", email="featured@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Lamps")
+        subcategory = Subcategory.objects.create(category=category, name="Desk lamps")
+        cls.unsold, cls.sold, cls.returned = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("20.00"),
+                                   admin_id=seller, stock=5)
+            for name in ("Unsold", "Sold", "Returned")
+        )
+        user = User.objects.create(id="featured-buyer", email="featured-buyer@example.com")
+        for product, units, status in ((cls.sold, 3, "confirmed"), (cls.returned, 10, "canceled")):
+            order = Order.objects.create(user_id=user, admin=seller, status=status)
+            OrderItem.objects.create(order_id=order, product_id=product, quantity=units, price=product.price,
+                                     total_price=product.price * units)
+
+    def test_scores_reward_sales_recency_discount_and_stock(self):
+        now = time.time()
+
+        def score(sales=0.0, age_days=0, price=100.0, original_price=0.0, stock=5):
+            return featured_scores(np.array([sales]), np.array([now - age_days * 86400]), np.array([price]),
+                                   np.array([original_price]), np.array([stock]), now=now)[0]
+
+        self.assertGreater(score(sales=5), score())
+        self.assertGreater(score(), score(age_days=60))
+        self.assertGreater(score(original_price=200.0), score())
+        self.assertGreater(score(), score(stock=0))
+        self.assertEqual(score(stock=50), score(stock=5))
+
+    def test_ranking_counts_completed_sales(self):
+        ranking = compute_featured_ranking()
+        self.assertEqual(ranking["ids"][0], self.sold.pk)
+        self.assertEqual(cache.get(FEATURED_RANKING_KEY), ranking)
+        sales = dict(zip(ranking["ids"], ranking["sales"]))
+        self.assertAlmostEqual(sales[self.sold.pk], 3.0)
+        self.assertEqual(sales[self.returned.pk], 0.0)
+        self.assertEqual(ranking["scores"], sorted(ranking["scores"], reverse=True))
+
+    def test_fresh_ranking_is_read_without_refresh(self):
+        ranking = compute_featured_ranking()
+        with mock.patch("store.services.featured.threading.Thread") as thread:
+            self.assertEqual(get_featured_ranking(), ranking)
+        thread.assert_not_called()
+
+    def test_stale_ranking_refreshes_in_background(self):
+        stale = dict(compute_featured_ranking(), computed_at=time.time() - 2 * featured.FEATURED_RANKING_MAX_AGE)
+        cache.set(FEATURED_RANKING_KEY, stale)
+        with mock.patch("store.services.featured.threading.Thread") as thread:
+            self.assertEqual(get_featured_ranking(), stale)
+            get_featured_ranking()  # polled again later: served from this worker
+        thread.assert_called_once()
+        self.assertIsNotNone(cache.get(FEATURED_RANKING_LOCK_KEY))
+
+        with mock.patch("store.services.featured.connection") as thread_connection:
+            thread.call_args.kwargs["target"]()
+        thread_connection.close.assert_called_once_with()
+        self.assertIsNone(cache.get(FEATURED_RANKING_LOCK_KEY))
+        self.assertGreater(cache.get(FEATURED_RANKING_KEY)["computed_at"], stale["computed_at"])
+
+
+def run_in_thread(target):
+    """Start `target` in a thread; returns (thread, result list it appends to)."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()))
+    thread.start()
+    return thread, result
+
+
+class SuggestionIndexTests(SimpleTestCase):
+    def suggestion(self, label, weight, kind="product"):
+        return {"label": label, "kind": kind, "url": f"/{label}", "weight": weight}
+
+    def setUp(self):
+        self.index = SuggestionIndex({
+            "product:blue shirt": self.suggestion("Blue Shirt", 5),
+            "product:black shoes": self.suggestion("Black Shoes", 9),
+            "product:shirt dress": self.suggestion("Shirt Dress", 1),
+            "category:1": self.suggestion("Shoes", 3, kind="category"),
+        }, top_k=3)
+
+    def labels(self, prefix, limit=3):
+        return [suggestion["label"] for suggestion in self.index.suggest(prefix, limit)]
+
+    def test_prefix_matches_any_word_by_weight(self):
+        self.assertEqual(self.labels("sh"), ["Black Shoes", "Blue Shirt", "Shoes"])
+        self.assertEqual(self.labels("sh", limit=10), ["Black Shoes", "Blue Shirt", "Shoes", "Shirt Dress"])
+        self.assertEqual(self.labels("shirt"), ["Blue Shirt", "Shirt Dress"])
+        self.assertEqual(self.labels("black shoe"), ["Black Shoes"])  # deeper than the trie
+        self.assertEqual(self.labels("  BLUE   sh"), ["Blue Shirt"])
+        self.assertEqual(self.labels("zzz"), [])
+
+    def test_update_matches_rebuild(self):
+        self.index.update({
+            "product:blue shirt": None,
+            "product:bag": self.suggestion("Bag", 2),
+            "category:1": self.suggestion("Shoes", 30, kind="category"),
+        })
+        rebuilt = SuggestionIndex(self.index.suggestions, top_k=3)
+        for prefix in ("b", "ba", "bl", "s", "sh", "sho", "shi", "d"):
+            self.assertEqual(self.index.suggest(prefix, 3), rebuilt.suggest(prefix, 3), prefix)
+
+
+class CatalogSuggestionsTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="suggest-seller", company_name="Harbour Goods", email="suggest@example.com", phone="1",
+            shop_address="Street", pincode="1", is_approved=True)
+        cls.category = Category.objects.create(name="Outerwear")
+        cls.subcategory = Subcategory.objects.create(category=cls.category, name="Coats")
+        cls.jacket = Product.objects.create(
+            name="Denim Jacket", category=cls.category, subcategory=cls.subcategory, price=Decimal("40.00"),
+            admin_id=cls.seller, stock=3)
+
+    def setUp(self):
+        super().setUp()
+        compute_featured_ranking()
+
+    def labels(self, prefix):
+        return [suggestion["label"] for suggestion in suggest(prefix)]
+
+    def test_suggests_products_categories_and_sellers(self):
+        self.assertEqual(self.labels("jack"), ["Denim Jacket"])
+        self.assertEqual(self.labels("outer"), ["Outerwear"])
+        self.assertEqual(self.labels("harb"), ["Harbour Goods"])
+
+    def test_api_suggest(self):
+        response = self.client.get(reverse("api_suggest"), {"q": "Denim J", "limit": "x"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["query"], "Denim J")
+        self.assertEqual(response.json()["suggestions"], [{
+            "label": "Denim Jacket", "kind": "product",
+            "url": reverse("seller_product_details", args=[self.jacket.id]), "weight": 1.0,
+        }])
+        self.assertEqual(self.client.get(reverse("api_suggest")).json()["suggestions"], [])
+
+    def test_catalog_change_patches_the_index(self):
+        index = get_suggestion_index()
+        self.jacket.name = "Denim Parka"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jacket.save()
+        self.assertIs(get_suggestion_index(), index)
+        self.assertEqual(self.labels("jack"), [])
+        self.assertEqual(self.labels("parka"), ["Denim Parka"])
+
+    def test_lookup_waits_for_a_patch_in_progress(self):
+        index = get_suggestion_index()
+        with index._lock:
+            thread, result = run_in_thread(lambda: index.suggest("jack"))
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+        thread.join()
+        self.assertEqual([suggestion["label"] for suggestion in result[0]], ["Denim Jacket"])
+
+
+class FacetCountsTests(SimpleTestCase):
+    def product(self, product_id, price, stock=5, category=1, subcategory=10):
+        return {"id": product_id, "price": Decimal(price), "stock": stock,
+                "category": category, "subcategory": subcategory}
+
+    def setUp(self):
+        self.facets = FacetCounts([
+            self.product(1, "100.00"),
+            self.product(2, "700.00", stock=0),
+            self.product(3, "100.00", category=2, subcategory=20),
+            self.product(4, "100.00"),
+        ])
+
+    def test_cells_group_products(self):
+        self.assertEqual(self.facets.cells[(1, 10, price_bucket(100), True)], 2)
+        self.assertEqual(len(self.facets.cells), 3)
+
+    def test_counts_exclude_own_filter(self):
+        counts = self.facets.counts(category_id=1, buckets=range(0, 1), in_stock=True)
+        # Categories ignore the category filter but apply price and stock
+        self.assertEqual(counts["categories"], {1: 2, 2: 1})
+        # Price buckets ignore the price filter
+        self.assertEqual(counts["price_buckets"], {0: 2})
+        # The in-stock count ignores the stock filter
+        self.assertEqual(counts["in_stock"], 2)
+        self.assertEqual(counts["total"], 2)
+
+    def test_apply_delta_moves_and_removes_products(self):
+        self.facets.apply_delta([self.product(1, "700.00", stock=0)], [3])
+        self.assertEqual(self.facets.cells, {(1, 10, 1, False): 2, (1, 10, 0, True): 1})
+        self.assertEqual(self.facets.counts()["total"], 3)
+
+    def test_counts_wait_for_a_patch_in_progress(self):
+        with self.facets._lock:
+            thread, result = run_in_thread(self.facets.counts)
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            self.facets.apply_delta([], [1, 2, 3])
+        thread.join()
+        self.assertEqual(result[0]["total"], 1)
+
+
+class TfidfVectorsTests(SimpleTestCase):
+    def product(self, product_id, name, description="", category="Clothing", subcategory="Tops"):
+        return {"id": product_id, "name": name, "description": description,
+                "category__name": category, "subcategory__name": subcategory}
+
+    def setUp(self):
+        self.vectors = TfidfVectors([
+            self.product(1, "Linen Shirt", "Light summer linen"),
+            self.product(2, "Linen Trousers", "Summer linen"),
+            self.product(3, "Wool Coat", "Warm winter wool", subcategory="Coats"),
+            self.product(4, "Wool Scarf", "Warm winter", subcategory="Coats"),
+            self.product(5, "Desk Lamp", category="Home", subcategory="Lighting"),
+        ])
+
+    def test_neighbours_share_terms(self):
+        neighbours = self.vectors.neighbours([1, 3, 99])
+        self.assertEqual(neighbours[1][0], 2)
+        self.assertEqual(neighbours[3][0], 4)
+        self.assertNotIn(5, neighbours[1])
+        self.assertNotIn(99, neighbours)
+
+    def test_apply_delta_revectorises_changed_text(self):
+        self.vectors.apply_delta([self.product(5, "Wool Blanket", "Warm winter wool")], [2])
+        self.assertEqual(self.vectors.neighbours([3])[3][:2], [5, 4])
+        self.assertNotIn(2, self.vectors.neighbours([1])[1])
+        self.assertEqual(self.vectors.neighbours([2]), {})
+
+    def test_drift_rebuilds_with_fresh_idf(self):
+        self.vectors.apply_delta([self.product(6, "Linen Dress", "Summer linen")], [])
+        self.assertEqual(len(self.vectors.extra), 1)
+        self.vectors.apply_delta([self.product(7, "Linen Shorts", "Summer linen")], [3])
+        self.assertEqual(self.vectors.extra, {})
+        self.assertEqual(self.vectors.base_rows, 6)
+        self.assertEqual(self.vectors.documents, 6)
+        self.assertEqual(sorted(self.vectors.row_of), [1, 2, 4, 5, 6, 7])
+        self.assertEqual(set(self.vectors.neighbours([6])[6][:3]), {1, 2, 7})
+
+
+class SimilarProductsTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="similar-seller", company_name="Similar", email="similar@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.category = Category.objects.create(name="Kitchen")
+        cls.subcategory = Subcategory.objects.create(category=cls.category, name="Cookware")
+        cls.pan, cls.skillet, cls.kettle = (
+            Product.objects.create(name=name, description=description, category=cls.category,
+                                   subcategory=cls.subcategory, price=Decimal("30.00"), admin_id=cls.seller, stock=4)
+            for name, description in (("Iron Pan", "Cast iron frying pan"), ("Iron Skillet", "Cast iron skillet"),
+                                      ("Tea Kettle", "Steel kettle"))
+        )
+
+    def ids(self, product):
+        return [similar["id"] for similar in get_similar_products(product.id)]
+
+    def test_lists_are_computed_and_cached(self):
+        self.assertEqual(self.ids(self.pan)[0], self.skillet.id)
+        with mock.patch("store.services.similar.get_similarity_vectors") as vectors:
+            self.assertEqual(self.ids(self.pan)[0], self.skillet.id)
+        vectors.assert_not_called()
+
+    def test_catalog_change_updates_other_products_lists(self):
+        self.assertNotIn(self.kettle.id, self.ids(self.pan)[:1])
+        with self.captureOnCommitCallbacks(execute=True):
+            griddle = Product.objects.create(
+                name="Iron Griddle Pan", description="Cast iron frying pan", category=self.category,
+                subcategory=self.subcategory, price=Decimal("35.00"), admin_id=self.seller, stock=2)
+        self.assertEqual(self.ids(self.pan)[0], griddle.id)
+
+    def test_rebuild_precomputes_current_version(self):
+        self.assertEqual(rebuild_similar_products(), 3)
+        with mock.patch("store.services.similar.get_similarity_vectors") as vectors:
+            self.assertEqual(self.ids(self.skillet)[0], self.pan.id)
+        vectors.assert_not_called()
+
+
+class TrendingTests(CatalogStateMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 1_000_000 * trending.TRENDING_BUCKET_SECONDS + 10
+        clock = mock.patch("store.services.trending.time.time", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_counts_units_per_product(self):
+        trending.record_trending({1: 2, 2: 5})
+        trending.record_trending({1: 1, "3": 1, 4: 0})
+        self.assertEqual(trending.compute_trending(), [2, 1, 3])
+
+    def test_concurrent_records_keep_every_unit(self):
+        threads = [threading.Thread(target=trending.record_trending, args=({1: 1, 2: 2},)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(trending._bucket_units(trending._current_bucket()), {1: 8, 2: 16})
+
+    def test_closed_buckets_are_summarised_once(self):
+        trending.record_trending({1: 3, 2: 1})
+        self.now += trending.TRENDING_BUCKET_SECONDS
+        trending.record_trending({2: 4})
+        self.assertEqual(trending.compute_trending(), [2, 1])
+
+        with mock.patch("store.services.trending._summarize") as summarize:
+            self.assertEqual(trending.compute_trending(), [2, 1])
+        summarize.assert_not_called()
+
+    def test_buckets_leave_the_window(self):
+        trending.record_trending({1: 3})
+        self.now += trending.TRENDING_WINDOW_HOURS * 60 * 60
+        trending.record_trending({2: 1})
+        self.assertEqual(trending.compute_trending(), [2])
+
+    def test_errors_are_swallowed(self):
+        with mock.patch("store.services.trending.cache.incr", side_effect=ConnectionError), \
+                self.assertLogs("store.services.trending", "ERROR"):
+            trending.record_trending({1: 1})
+        self.assertEqual(trending.compute_trending(), [])
+
+
+class CacheFlightTests(CatalogStateMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        # Start from no unflushed counts and no recent flush
+        unflushed = mock.patch.dict(cache_flight._unflushed, dict.fromkeys(cache_flight.METRICS, 0))
+        unflushed.start()
+        self.addCleanup(unflushed.stop)
+        flushed_at = mock.patch.object(cache_flight, "_flushed_at", time.monotonic())
+        flushed_at.start()
+        self.addCleanup(flushed_at.stop)
+        self.stale_serves_before = cache_flight.local_stats()["stale_serves"]
+
+    def test_builds_once(self):
+        build = mock.Mock(return_value="value")
+        self.assertEqual(cache_flight.get_or_build("flight:v1", build, 60), ("value", False))
+        self.assertEqual(cache_flight.get_or_build("flight:v1", build, 60), ("value", False))
+        build.assert_called_once_with()
+        self.assertIsNone(cache.get("flight:v1:lock"))
+
+    def test_serves_previous_version_while_another_process_builds(self):
+        cache_flight.get_or_build("flight:v1", lambda: "old", 60, latest_key="flight:latest")
+        cache.add("flight:v2:lock", "other", 30)
+        build = mock.Mock(return_value="new")
+        self.assertEqual(cache_flight.get_or_build("flight:v2", build, 60, latest_key="flight:latest"), ("old", True))
+        build.assert_not_called()
+        self.assertEqual(cache_flight.local_stats()["stale_serves"] - self.stale_serves_before, 1)
+
+    def test_waits_for_another_process_without_a_previous_value(self):
+        cache.add("flight:v1:lock", "other", 30)
+
+        def rebuilt_elsewhere(delay):
+            cache.set("flight:v1", ("theirs", 0.1, None))
+
+        build = mock.Mock(return_value="ours")
+        with mock.patch("store.services.cache_flight.time.sleep", side_effect=rebuilt_elsewhere):
+            self.assertEqual(cache_flight.get_or_build("flight:v1", build, 60), ("theirs", False))
+        build.assert_not_called()
+
+    def test_lock_taken_over_after_expiry_is_kept(self):
+        def slow_build():
+            # Our lock expires and another process takes it
+            cache.set("flight:v1:lock", "other", 30)
+            return "value"
+
+        cache_flight.get_or_build("flight:v1", slow_build, 60)
+        self.assertEqual(cache.get("flight:v1:lock"), "other")
+
+    def test_redis_release_compares_and_deletes_in_one_script(self):
+        redis_cache = mock.Mock()
+        with mock.patch("store.services.cache_flight.cache", mock.Mock(remote=redis_cache)):
+            cache_flight._release("flight:v1:lock", "token")
+        client = redis_cache.client
+        client.get_client.return_value.eval.assert_called_once_with(
+            cache_flight.RELEASE_SCRIPT, 1, client.make_key.return_value, client.encode.return_value)
+        client.make_key.assert_called_once_with("flight:v1:lock")
+        client.encode.assert_called_once_with("token")
+
+    def test_counters_are_flushed_periodically(self):
+        cache.add("flight:v2:lock", "other", 30)
+        cache_flight.get_or_build("flight:v2", mock.Mock(), 60, stale="old")
+        self.assertEqual(cache_flight.shared_stats()["stale_serves"], 0)
+
+        with mock.patch.object(cache_flight, "CACHE_STATS_FLUSH_INTERVAL", 0):
+            cache_flight.get_or_build("flight:v2", mock.Mock(), 60, stale="old")
+        self.assertEqual(cache_flight.shared_stats()["stale_serves"], 2)
+        self.assertEqual(cache_flight._unflushed["stale_serves"], 0)
+
+
+class SearchResultCacheTests(CatalogStateMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.results = search_cache.SearchResultCache(max_entries=2)
+
+    def test_entries_are_tagged_with_their_version(self):
+        self.results.set("shirt", [1, 2], version=7)
+        self.assertEqual(self.results.get("shirt", 7), [1, 2])
+        self.assertIsNone(self.results.get("shirt", 8))
+        self.results.set("coat", [3], version=7)
+        self.results.set("lamp", [4], version=7)
+        self.assertIsNone(self.results.get("shirt", 7))
+        self.assertEqual(self.results.stats(),
+                         {"entries": 2, "hits": 1, "misses": 2, "evictions": 1, "hit_rate": 0.333})
+
+    def test_counts_are_flushed_to_shared_stats(self):
+        self.results.set("shirt", [1], version=1)
+        self.results.get("shirt", 1)
+        self.assertEqual(search_cache.shared_stats()["hits"], 0)
+        with mock.patch.object(search_cache, "SEARCH_STATS_FLUSH_INTERVAL", 0):
+            self.results.get("coat", 1)
+        self.assertEqual(search_cache.shared_stats(), {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5})
+        self.results.flush_stats()  # nothing new since
+        self.assertEqual(search_cache.shared_stats()["hits"], 1)
+
+    def test_cache_stats_command_shows_search_counters(self):
+        self.results.get("shirt", 1)
+        self.results.flush_stats()
+        out = StringIO()
+        call_command("cache_stats", "--reset", stdout=out)
+        self.assertIn("search result cache", out.getvalue())
+        self.assertRegex(out.getvalue(), r"misses\s+1\n")
+        self.assertEqual(search_cache.shared_stats()["misses"], 0)
+
+
+class ApiProductsTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="api-seller", company_name="Api", email="api@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Garden")
+        subcategory = Subcategory.objects.create(category=category, name="Tools")
+        cls.rake, cls.hoe, cls.spade, cls.trowel = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("12.00"),
+                                   admin_id=seller, stock=2)
+            for name in ("Rake", "Hoe", "Spade", "Trowel")
+        )
+        # The rake is the newest although its id is the lowest; the spade and trowel tie
+        for product, day in ((cls.rake, 4), (cls.hoe, 3), (cls.spade, 2), (cls.trowel, 2)):
+            Product.objects.filter(id=product.id).update(created_at=datetime(2026, 5, day, tzinfo=timezone.utc))
+        Product.objects.create(name="Old Shears", category=category, subcategory=subcategory, price=Decimal("9.00"),
+                               admin_id=seller, stock=1, is_deleted=True)
+
+    def get(self, **params):
+        response = self.client.get(reverse("api_products"), params)
+        if response.status_code != 200:
+            return response.status_code, response.json()
+        return 200, json.loads(b"".join(response.streaming_content))
+
+    def test_lists_newest_first(self):
+        status, products = self.get()
+        self.assertEqual(status, 200)
+        self.assertEqual([product["id"] for product in products],
+                         [self.rake.id, self.hoe.id, self.trowel.id, self.spade.id])
+
+    def test_cursor_pages_follow_created_at_then_id(self):
+        for params in ({}, {"fields": "name"}):
+            with self.subTest(**params):
+                names, cursor = [], ""
+                while True:
+                    status, page = self.get(limit=1, cursor=cursor, **params)
+                    self.assertEqual(status, 200)
+                    names += [product["name"] for product in page["results"]]
+                    cursor = page["next_cursor"]
+                    if cursor is None:
+                        break
+                self.assertEqual(names, ["Rake", "Hoe", "Trowel", "Spade"])
+
+    def test_last_page_has_no_next_cursor(self):
+        status, page = self.get(limit=10, fields="name")
+        self.assertEqual(len(page["results"]), 4)
+        self.assertIsNone(page["next_cursor"])
+
+    def test_rejects_malformed_cursors(self):
+        for cursor in (str(self.hoe.id), "abc", "1.2.3", "99999999999999999999.1"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.get(limit=1, cursor=cursor), (400, {"error": "Invalid cursor"}))
+        self.assertEqual(self.get(limit=0)[0], 400)
+
+
+class CatalogSnapshotTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="snapshot-seller", company_name="Snapshot", email="snapshot@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Books")
+        subcategory = Subcategory.objects.create(category=category, name="Novels")
+        cls.novel, cls.hidden = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("8.00"),
+                                   admin_id=seller, stock=3, is_active=is_active)
+            for name, is_active in (("Novel", True), ("Hidden", False))
+        )
+
+    def test_built_once_per_version(self):
+        self.assertEqual(set(get_active_products_by_id()), {self.novel.id})
+        with self.assertNumQueries(0):
+            get_active_products_by_id()
+
+    def test_other_workers_read_the_shared_snapshot(self):
+        get_active_products_by_id()
+        catalog_cache._local_snapshots.clear()
+        catalog_cache._local_derived.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_products_by_id()[self.novel.id]["name"], "Novel")
+
+    def test_catalog_change_moves_to_a_new_snapshot(self):
+        before = get_active_products_by_id()
+        self.novel.name = "Novel, Second Edition"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.novel.save()
+        self.assertEqual(get_active_products_by_id()[self.novel.id]["name"], "Novel, Second Edition")
+        self.assertEqual(before[self.novel.id]["name"], "Novel")
+
+
+class StorefrontListingTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="listing-seller", company_name="Listing", email="listing@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.shoes = Category.objects.create(name="Shoes")
+        bags = Category.objects.create(name="Bags")
+        sneakers = Subcategory.objects.create(category=cls.shoes, name="Sneakers")
+        totes = Subcategory.objects.create(category=bags, name="Totes")
+        for name, category, subcategory, price, stock in (
+                ("Runner", cls.shoes, sneakers, "80.00", 4),
+                ("Court", cls.shoes, sneakers, "60.00", 0),
+                ("Trail", cls.shoes, sneakers, "120.00", 2),
+                ("Canvas Tote", bags, totes, "30.00", 5)):
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal(price),
+                                   admin_id=seller, stock=stock)
+
+    def setUp(self):
+        super().setUp()
+        compute_featured_ranking()
+
+    def names(self, **params):
+        response = self.client.get(reverse("home"), params)
+        self.assertEqual(response.status_code, 200)
+        return [product["name"] for product in response.context["products"]]
+
+    def test_filters_by_category_and_stock(self):
+        self.assertCountEqual(self.names(category=self.shoes.slug), ["Runner", "Court", "Trail"])
+        self.assertCountEqual(self.names(category=self.shoes.slug, in_stock="1"), ["Runner", "Trail"])
+        self.assertCountEqual(self.names(min_price="50", max_price="100"), ["Runner", "Court"])
+
+    def test_sorts_by_price(self):
+        self.assertEqual(self.names(sort="price-low"), ["Canvas Tote", "Court", "Runner", "Trail"])
+        self.assertEqual(self.names(sort="price-high"), ["Trail", "Runner", "Court", "Canvas Tote"])
+
+    def test_paginates(self):
+        with mock.patch("store.views.PRODUCTS_PAGE_SIZE", 3):
+            first = self.client.get(reverse("home"), {"sort": "price-low"}).context
+            self.assertEqual(len(first["products"]), 3)
+            self.assertTrue(first["has_next"])
+            self.assertEqual(first["result_count"], 4)
+            self.assertEqual(self.names(sort="price-low", page="2"), ["Trail"])
+            self.assertEqual(self.names(sort="price-low", page="x"), ["Canvas Tote", "Court", "Runner"])
+
+
+class ProductSearchIndexTests(SimpleTestCase):
+    def product(self, product_id, name, description="", category="Clothing", subcategory="Tops"):
+        return {"id": product_id, "name": name, "description": description, "category__name": category,
+                "subcategory__name": subcategory, "admin_id__company_name": "Seller"}
+
+    def setUp(self):
+        self.index = ProductSearchIndex([
+            self.product(1, "Linen Shirt", "Light summer shirt"),
+            self.product(2, "Denim Jacket", "Pairs with a shirt", subcategory="Outerwear"),
+            self.product(3, "Running Shoes", category="Footwear", subcategory="Sneakers"),
+        ])
+
+    def test_name_matches_rank_above_description(self):
+        self.assertEqual(self.index.search("shirt"), [1, 2])
+        self.assertEqual(self.index.search("denim shirt")[0], 2)
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual(self.index.search("jack"), [2])
+        self.assertEqual(self.index.search("sneekers"), [3])
+        self.assertEqual(self.index.search(""), [])
+        self.assertEqual(self.index.search("umbrella"), [])
+
+    def test_apply_delta(self):
+        self.index.apply_delta([self.product(1, "Wool Sweater", subcategory="Knitwear")], [3])
+        self.assertEqual(self.index.search("shirt"), [2])
+        self.assertEqual(self.index.search("sweater"), [1])
+        self.assertEqual(self.index.search("running"), [])
+        self.assertNotIn("running", self.index.postings)
+        self.assertEqual(len(self.index), 2)
+
+
+@override_settings(SUPABASE_URL="https://project.supabase.co/")
+class StorageUrlTests(SimpleTestCase):
+    def setUp(self):
+        clear_public_url_cache()
+        self.addCleanup(clear_public_url_cache)
+
+    def test_formats_public_object_urls(self):
+        self.assertEqual(public_url("uploads/summer shirt.png"),
+                         "https://project.supabase.co/storage/v1/object/public/product-image/uploads/summer%20shirt.png")
+        self.assertEqual(public_url("/logo.png", bucket="company-logos"),
+                         "https://project.supabase.co/storage/v1/object/public/company-logos/logo.png")
+
+    def test_keeps_full_urls_and_skips_empty_keys(self):
+        self.assertEqual(public_url("https://cdn.example.com/a.png"), "https://cdn.example.com/a.png")
+        self.assertIsNone(public_url(""))
+        self.assertEqual(public_urls(["a.png", None, ""]),
+                         ["https://project.supabase.co/storage/v1/object/public/product-image/a.png"])
+        self.assertEqual(public_urls(None), [])
+
+
+class CatalogColumnsTests(SimpleTestCase):
+    def product(self, product_id, price, created_at, stock=5, category=(1, "clothing"), subcategory=(10, "shirts"),
+                **fields):
+        return {"id": product_id, "price": Decimal(price), "original_price": None, "stock": stock,
+                "category": category[0], "category__slug": category[1],
+                "subcategory": subcategory[0], "subcategory__slug": subcategory[1],
+                "admin_id": None, "created_at": created_at, **fields}
+
+    def setUp(self):
+        self.columns = CatalogColumns([
+            self.product(1, "50.00", "2024-03-01 00:00:00"),
+            self.product(2, "20.00", "2024-01-01 00:00:00", stock=0),
+            self.product(3, "80.00", "2024-02-01 00:00:00", category=(2, "shoes"), subcategory=(20, "sneakers")),
+            self.product(4, "20.00", "2024-02-01 00:00:00"),
+        ])
+
+    def ids(self, values):
+        return [int(value) for value in values]
+
+    def test_mask_filters(self):
+        self.assertEqual(self.ids(self.columns.ids[self.columns.mask(category="Clothing")]), [1, 2, 4])
+        self.assertEqual(self.ids(self.columns.ids[self.columns.mask(subcategory="sneakers")]), [3])
+        self.assertEqual(self.ids(self.columns.ids[self.columns.mask(category="unknown")]), [])
+        self.assertEqual(self.ids(self.columns.ids[self.columns.mask(min_price=20, max_price=50)]), [1, 2, 4])
+        self.assertEqual(self.ids(self.columns.ids[self.columns.mask(in_stock=True)]), [1, 3, 4])
+
+    def test_select_sorts_with_id_tie_break(self):
+        self.assertEqual(self.ids(self.columns.select("price-low")), [2, 4, 1, 3])
+        self.assertEqual(self.ids(self.columns.select("price-high")), [3, 1, 4, 2])
+        self.assertEqual(self.ids(self.columns.select("newest")), [1, 4, 3, 2])
+        self.assertEqual(self.ids(self.columns.select("price-low", category="clothing", in_stock=True)), [4, 1])
+
+    def test_select_within_ids(self):
+        # "featured" keeps the given (search) order; unknown ids are skipped
+        self.assertEqual(self.ids(self.columns.select("featured", ids=[3, 99, 1, 2])), [3, 1, 2])
+        self.assertEqual(self.ids(self.columns.select("price-low", ids=[3, 1, 2])), [2, 1, 3])
+        self.assertEqual(self.ids(self.columns.select("featured", ids=[3, 1, 2], in_stock=True)), [3, 1])
+
+
+class GetFacetsTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="facet-seller", company_name="Facets", email="facets@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.toys = Category.objects.create(name="Toys")
+        puzzles = Subcategory.objects.create(category=cls.toys, name="Puzzles")
+        cls.cheap, cls.mid, cls.sold_out = (
+            Product.objects.create(name=name, category=cls.toys, subcategory=puzzles, price=Decimal(price),
+                                   admin_id=seller, stock=stock)
+            for name, price, stock in (("Small Puzzle", "200.00", 3), ("Big Puzzle", "700.00", 1),
+                                       ("Rare Puzzle", "250.00", 0))
+        )
+
+    def test_bucket_aligned_filters_use_the_cell_table(self):
+        facets = get_facets(max_price=Decimal("499.99"))
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["in_stock"], 1)
+        self.assertEqual(facets["price_buckets"], {0: 2, 1: 1})
+        self.assertEqual(facets["categories"], {self.toys.id: 2})
+
+    def test_unaligned_price_filter_counts_products(self):
+        facets = get_facets(min_price=Decimal("220"), in_stock=True)
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(facets["price_buckets"], {0: 1, 1: 1})
+
+    def test_counts_within_search_hits(self):
+        facets = get_facets(product_ids=[self.mid.id, self.sold_out.id])
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["in_stock"], 1)
+
+
+class CatalogConditionalTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="etag-seller", company_name="Etag", email="etag@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.category = Category.objects.create(name="Music")
+        subcategory = Subcategory.objects.create(category=cls.category, name="Vinyl")
+        cls.record = Product.objects.create(
+            name="Record", category=cls.category, subcategory=subcategory, price=Decimal("25.00"), admin_id=seller,
+            stock=5)
+
+    def test_unchanged_catalog_answers_304(self):
+        url = reverse("api_categories")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Last-Modified"])
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_etag_depends_on_the_url(self):
+        first = self.client.get(reverse("api_products"), {"fields": "name"})
+        second = self.client.get(reverse("api_products"), {"fields": "price"})
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(self.client.get(reverse("api_products"), {"fields": "price"},
+                                         HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_stock_change_moves_the_etag(self):
+        url = reverse("api_products")
+        etag = self.client.get(url)["ETag"]
+        self.record.stock = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            self.record.save(update_fields=["stock", "is_active", "updated_at"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ProductChangesFeedTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="changes-seller", company_name="Changes", email="changes@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Tea")
+        subcategory = Subcategory.objects.create(category=category, name="Green")
+        cls.sencha, cls.matcha, cls.gyokuro, cls.bancha, cls.hojicha = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("6.00"),
+                                   admin_id=seller, stock=9)
+            for name in ("Sencha", "Matcha", "Gyokuro", "Bancha", "Hojicha")
+        )
+        for product, changes in ((cls.sencha, {"updated_at": datetime(2026, 1, 1, tzinfo=timezone.utc)}),
+                                 (cls.matcha, {"updated_at": datetime(2026, 1, 1, tzinfo=timezone.utc)}),
+                                 (cls.gyokuro, {"updated_at": datetime(2026, 1, 2, tzinfo=timezone.utc),
+                                                "is_active": False}),
+                                 (cls.bancha, {"updated_at": datetime(2026, 1, 3, tzinfo=timezone.utc),
+                                               "is_deleted": True})):
+            Product.objects.filter(id=product.id).update(**changes)
+        # The hojicha was saved just now: left for the next sync until it settles
+
+    def changes(self, **params):
+        response = self.client.get(reverse("api_product_changes"), params)
+        return response.status_code, response.json()
+
+    def test_pages_through_changes_oldest_first(self):
+        status, page = self.changes(limit=2, fields="name")
+        self.assertEqual(status, 200)
+        self.assertEqual([product["name"] for product in page["changed"]], ["Sencha", "Matcha"])
+        self.assertEqual(page["deleted"], [])
+        self.assertTrue(page["has_more"])
+
+        status, page = self.changes(limit=2, fields="name", since=page["next_token"])
+        self.assertEqual(page["changed"], [{"id": self.gyokuro.id, "name": "Gyokuro", "is_active": False}])
+        self.assertEqual(page["deleted"], [self.bancha.id])
+        self.assertFalse(page["has_more"])
+
+        token = page["next_token"]
+        self.assertEqual(self.changes(since=token)[1],
+                         {"changed": [], "deleted": [], "next_token": token, "has_more": False})
+
+    def test_rejects_malformed_tokens(self):
+        for token in ("abc", str(self.sencha.id), "1.2.3", "99999999999999999999.1"):
+            with self.subTest(token=token):
+                self.assertEqual(self.changes(since=token), (400, {"error": "Invalid since token"}))
+        self.assertEqual(self.changes(limit=0)[0], 400)
+
+
+class CoPurchaseTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="co-seller", company_name="Co", email="co@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Coffee")
+        subcategory = Subcategory.objects.create(category=category, name="Brewing")
+        cls.grinder, cls.beans, cls.filters, cls.kettle = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("15.00"),
+                                   admin_id=cls.seller, stock=5)
+            for name in ("Grinder", "Beans", "Filters", "Kettle")
+        )
+
+    def pairs(self):
+        return {(row.product_id, row.other_id): row.orders for row in ProductCoPurchase.objects.all()}
+
+    def test_record_upserts_both_directions(self):
+        record_co_purchases([self.grinder.id, self.beans.id])
+        record_co_purchases([self.beans.id, self.grinder.id, self.filters.id, self.beans.id])
+        pairs = self.pairs()
+        self.assertEqual(pairs[(self.grinder.id, self.beans.id)], 2)
+        self.assertEqual(pairs[(self.beans.id, self.grinder.id)], 2)
+        self.assertEqual(pairs[(self.filters.id, self.beans.id)], 1)
+        self.assertEqual(len(pairs), 6)
+
+    def test_single_item_orders_are_ignored(self):
+        with self.assertNumQueries(0):
+            record_co_purchases([self.grinder.id])
+
+    def test_rebuild_matches_recorded_orders(self):
+        user = User.objects.create(id="co-buyer", email="co-buyer@example.com")
+        for basket in ([self.grinder, self.beans], [self.grinder, self.beans, self.filters]):
+            order = Order.objects.create(user_id=user, admin=self.seller, status="confirmed")
+            for product in basket:
+                OrderItem.objects.create(order_id=order, product_id=product, quantity=1, price=product.price,
+                                         total_price=product.price)
+            record_co_purchases([product.id for product in basket])
+        recorded = self.pairs()
+        self.assertEqual(rebuild_co_purchases(), 6)
+        self.assertEqual(self.pairs(), recorded)
+
+    def test_bought_together_ranks_by_shared_orders(self):
+        record_co_purchases([self.grinder.id, self.beans.id, self.filters.id])
+        record_co_purchases([self.grinder.id, self.beans.id, self.kettle.id])
+        Product.objects.filter(id=self.kettle.id).update(is_active=False)
+        self.assertEqual([product["id"] for product in get_bought_together([self.grinder.id])],
+                         [self.beans.id, self.filters.id])
+        self.assertEqual([product["id"] for product in get_bought_together([self.grinder.id, self.beans.id])],
+                         [self.filters.id])
+
+
+class VariantAttributeTests(SimpleTestCase):
+    def product(self, product_id, category=(1, "clothing"), stock=5, variant_attributes=(), sizes="", fit=""):
+        return {"id": product_id, "price": Decimal("10.00"), "original_price": None, "stock": stock,
+                "category": category[0], "category__slug": category[1], "subcategory": 10,
+                "subcategory__slug": "tops", "admin_id": None, "created_at": "2024-01-01 00:00:00",
+                "variant_attributes": list(variant_attributes), "sizes": sizes, "fit": fit}
+
+    def setUp(self):
+        self.columns = CatalogColumns([
+            self.product(1, variant_attributes=[("Red", "M", "Slim", 2), ("Blue", "L", "Slim", 0)]),
+            self.product(2, stock=0, sizes="S, M", fit="Regular"),
+            self.product(3, category=(2, "shoes"), variant_attributes=[("Red", "L", None, 1)]),
+        ])
+
+    def ids(self, **filters):
+        return [int(value) for value in self.columns.ids[self.columns.mask(**filters)]]
+
+    def test_products_without_variants_use_sizes_and_fit(self):
+        self.assertEqual(product_variants(self.product(9, sizes="S, ,M", fit=" Loose ")),
+                         [(None, "S", "Loose", True), (None, "M", "Loose", True)])
+        self.assertEqual(product_variants(self.product(9)), [])
+
+    def test_filters_match_a_single_variant(self):
+        self.assertEqual(self.ids(color="red"), [1, 3])
+        # Product 1 is red and size L, but not on the same variant
+        self.assertEqual(self.ids(color="Red", size="L"), [3])
+        # The blue variant is sold out
+        self.assertEqual(self.ids(color="blue", in_stock=True), [])
+        self.assertEqual(self.ids(size="m", fit="regular"), [2])
+
+    def test_facets_exclude_their_own_filter(self):
+        facets = self.columns.attribute_facets()
+        self.assertEqual(facets["color"], {"red": 2, "blue": 1})
+        self.assertEqual(facets["size"], {"m": 2, "l": 2, "s": 1})
+        facets = self.columns.attribute_facets(color="Red", in_stock=True)
+        # Colors are counted as if no color were selected
+        self.assertEqual(facets["color"], {"red": 2})
+        # Sizes of in-stock red variants only
+        self.assertEqual(facets["size"], {"m": 1, "l": 1})
+        self.assertEqual(self.columns.attribute_labels["color"]["red"], "Red")
+
+    def test_facets_within_ids(self):
+        facets = self.columns.attribute_facets(ids=[2, 3], category="clothing")
+        self.assertEqual(facets["size"], {"s": 1, "m": 1})
+        self.assertEqual(facets["color"], {})
+
+
+class VariantAggregateTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="variant-seller", company_name="Variants", email="variants@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Outerwear")
+        subcategory = Subcategory.objects.create(category=category, name="Jackets")
+        cls.jacket = Product.objects.create(name="Rain jacket", category=category, subcategory=subcategory,
+                                            price=Decimal("80.00"), admin_id=seller)
+
+    def variant(self, color, price, stock=1, size="M"):
+        return ProductVariant(product=self.jacket, color=color, size=size, price=Decimal(price), stock=stock)
+
+    def aggregates(self):
+        return Product.objects.filter(id=self.jacket.id).values(
+            "variant_min_price", "variant_max_price", "variant_stock", "variant_colors").get()
+
+    def test_aggregate_values(self):
+        self.assertEqual(Product.variant_aggregates([("Navy", Decimal("5"), 2), ("Olive", None, None),
+                                                      ("Navy", Decimal("9"), 1), ("", Decimal("7"), 0)]),
+                         {"variant_min_price": Decimal("5"), "variant_max_price": Decimal("9"),
+                          "variant_stock": 3, "variant_colors": ["Navy", "Olive"]})
+        self.assertEqual(Product.variant_aggregates([]), {"variant_min_price": None, "variant_max_price": None,
+                                                          "variant_stock": 0, "variant_colors": []})
+
+    def test_variant_save_and_delete_refresh_the_product(self):
+        navy = self.variant("Navy", "75.00", stock=3)
+        navy.save()
+        self.variant("Olive", "85.00", stock=2).save()
+        self.assertEqual(self.aggregates(), {"variant_min_price": Decimal("75.00"),
+                                             "variant_max_price": Decimal("85.00"),
+                                             "variant_stock": 5, "variant_colors": ["Navy", "Olive"]})
+        navy.delete()
+        self.assertEqual(self.aggregates(), {"variant_min_price": Decimal("85.00"),
+                                             "variant_max_price": Decimal("85.00"),
+                                             "variant_stock": 2, "variant_colors": ["Olive"]})
+
+    def test_bulk_writes_refresh_the_product(self):
+        ProductVariant.objects.bulk_create([self.variant("Navy", "70.00", size="S"),
+                                            self.variant("Navy", "72.00", size="L")])
+        self.assertEqual(self.aggregates()["variant_stock"], 2)
+        ProductVariant.objects.filter(product=self.jacket).update(stock=4)
+        self.assertEqual(self.aggregates()["variant_stock"], 8)
+        ProductVariant.objects.filter(size="S").delete()
+        self.assertEqual(self.aggregates(), {"variant_min_price": Decimal("72.00"),
+                                             "variant_max_price": Decimal("72.00"),
+                                             "variant_stock": 4, "variant_colors": ["Navy"]})
+
+    def test_refresh_moves_updated_at_and_the_catalog_version(self):
+        Product.objects.filter(id=self.jacket.id).update(updated_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant("Navy", "75.00").save()
+        self.assertGreater(Product.objects.get(id=self.jacket.id).updated_at,
+                           datetime(2026, 1, 1, tzinfo=timezone.utc))
+        self.assertGreater(get_catalog_version(), version)
+
+
+class ProductBlobTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="blob-seller", company_name="Blobs", email="blobs@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Stationery")
+        subcategory = Subcategory.objects.create(category=category, name="Pens")
+        cls.pen, cls.ink = (
+            Product.objects.create(name=name, category=category, subcategory=subcategory, price=Decimal("3.00"),
+                                   admin_id=cls.seller)
+            for name in ("Pen", "Ink")
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.built = []
+
+    def build(self, ids):
+        self.built.append(sorted(ids))
+        return {product_id: {"id": product_id, "build": len(self.built)} for product_id in ids}
+
+    def blobs(self):
+        rows = list(stamped(Product.objects.order_by("id")))
+        return [blob["build"] for _, blob in get_blobs("test", rows, self.build)]
+
+    def test_stamped_rows_keep_the_queryset_order(self):
+        rows = list(stamped(Product.objects.order_by("-id"), "name"))
+        self.assertEqual([(product_id, name) for product_id, _, name in rows],
+                         [(self.ink.id, "Ink"), (self.pen.id, "Pen")])
+
+    def test_cached_blobs_are_not_rebuilt(self):
+        self.assertEqual(self.blobs(), [1, 1])
+        self.assertEqual(self.blobs(), [1, 1])
+        self.assertEqual(self.built, [[self.pen.id, self.ink.id]])
+
+    def test_stamp_change_rebuilds_only_that_product(self):
+        self.blobs()
+        Product.objects.filter(id=self.ink.id).update(updated_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(self.blobs(), [1, 2])
+        # A seller rename changes the stamp of all their products
+        AdminStore.objects.filter(pk=self.seller.pk).update(company_name="Renamed")
+        self.assertEqual(self.blobs(), [3, 3])
+        self.assertEqual(self.built[-1], [self.pen.id, self.ink.id])
+
+    def test_ids_left_out_by_the_builder_are_skipped(self):
+        rows = list(stamped(Product.objects.order_by("id")))
+        self.assertEqual(get_blobs("test", rows, lambda ids: {self.ink.id: "ink"}), [(self.ink.id, "ink")])
+
+
+class CardFragmentTests(CatalogStateMixin, TestCase):
+    template_name = "store/partials/product_card.html"
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdminStore.objects.create(
+            firebase_uid="card-seller", company_name="Cards", email="cards@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        category = Category.objects.create(name="Games")
+        subcategory = Subcategory.objects.create(category=category, name="Board")
+        for index, name in enumerate(("Chess", "Go", "Backgammon")):
+            Product.objects.create(name=name, category=category, subcategory=subcategory,
+                                   price=Decimal(10 + index), admin_id=seller, stock=3)
+
+    def card(self, product_id, name, stamp="s1"):
+        return {"id": product_id, "name": name, "price": Decimal("5.00"), "card_stamp": stamp}
+
+    def cards(self, html):
+        return html.count('class="product-card')
+
+    def test_cached_cards_are_reused_until_the_stamp_moves(self):
+        self.assertIn("<h3>Kite</h3>", render_cards(self.template_name, [self.card(1, "Kite")]))
+        # The cached HTML is served even though the name changed...
+        html = render_cards(self.template_name, [self.card(1, "Renamed"), self.card(2, "Yo-yo")])
+        self.assertIn("<h3>Kite</h3>", html)
+        self.assertLess(html.index("Kite"), html.index("Yo-yo"))
+        # ...until the stamp moves
+        self.assertIn("<h3>Renamed</h3>", render_cards(self.template_name, [self.card(1, "Renamed", "s2")]))
+
+    def test_cards_without_a_stamp_are_not_cached(self):
+        render_cards(self.template_name, [self.card(3, "Top", stamp=None)])
+        self.assertIn("<h3>Spinning top</h3>",
+                      render_cards(self.template_name, [self.card(3, "Spinning top", stamp=None)]))
+
+    def test_grid_page_returns_the_next_cards(self):
+        compute_featured_ranking()
+        with mock.patch("store.views.PRODUCTS_PAGE_SIZE", 2):
+            first = self.client.get(reverse("product_grid_page"), {"sort": "price-low"}).json()
+            self.assertEqual(self.cards(first["html"]), 2)
+            self.assertTrue(first["has_next"])
+            self.assertIn("page=2", first["next_page_url"])
+
+            last = self.client.get(reverse("product_grid_page"), {"sort": "price-low", "page": "2"}).json()
+            self.assertEqual(self.cards(last["html"]), 1)
+            self.assertIn("<h3>Backgammon</h3>", last["html"])
+            self.assertFalse(last["has_next"])
+
+
+class SnapshotRefreshTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdminStore.objects.create(
+            firebase_uid="refresh-seller", company_name="Refresh", email="refresh@example.com", phone="1",
+            shop_address="Street", pincode="1")
+        cls.category = Category.objects.create(name="Plants")
+        cls.subcategory = Subcategory.objects.create(category=cls.category, name="Succulents")
+        cls.aloe, cls.agave = (
+            Product.objects.create(name=name, category=cls.category, subcategory=cls.subcategory,
+                                   price=Decimal("12.00"), admin_id=cls.seller, stock=6)
+            for name in ("Aloe", "Agave")
+        )
+
+    def setUp(self):
+        super().setUp()
+        get_active_products_by_id()
+        self.refresh = mock.Mock(wraps=orm_queries._refresh_active_products)
+        refreshers = mock.patch.dict(catalog_cache._refreshers, {"active_products": self.refresh})
+        refreshers.start()
+        self.addCleanup(refreshers.stop)
+
+    def change(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+
+    def names(self):
+        return [product["name"] for product in get_active_products_by_id().values()]
+
+    def test_catalog_change_patches_the_previous_snapshot(self):
+        self.change(lambda: Product.objects.filter(id=self.aloe.id).update(name="Aloe vera"))
+        self.change(lambda: Product.objects.create(
+            name="Jade", category=self.category, subcategory=self.subcategory, price=Decimal("9.00"),
+            admin_id=self.seller, stock=2))
+        with mock.patch.object(orm_queries, "_build_active_products", side_effect=AssertionError("full build")):
+            self.assertCountEqual(self.names(), ["Aloe vera", "Agave", "Jade"])
+        self.refresh.assert_called_once()
+
+    def test_worker_without_a_copy_patches_the_shared_snapshot(self):
+        catalog_cache._local_snapshots.clear()
+        catalog_cache._local_derived.clear()
+        self.change(lambda: AdminStore.objects.filter(pk=self.seller.pk).update(company_name="Renamed"))
+        with mock.patch.object(orm_queries, "_build_active_products", side_effect=AssertionError("full build")):
+            self.assertEqual({product["admin_id__company_name"] for product in get_active_products_by_id().values()},
+                             {"Renamed"})
+
+    def test_hard_delete_falls_back_to_a_full_build(self):
+        self.change(lambda: Product.objects.filter(id=self.agave.id).delete())
+        with mock.patch.object(orm_queries, "_build_active_products",
+                               wraps=orm_queries._build_active_products) as build:
+            self.assertEqual(self.names(), ["Aloe"])
+        self.refresh.assert_called_once()
+        build.assert_called_once()
+
+
+class CatalogPartitionTests(CatalogStateMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kitchen")
+        subcategory = Subcategory.objects.create(category=category, name="Knives")
+        cls.sellers, cls.products = [], []
+        for name in ("North", "South"):
+            seller = AdminStore.objects.create(
+                firebase_uid=f"{name}-seller", company_name=name, email=f"{name}@example.com", phone="1",
+                shop_address="Street", pincode="1")
+            cls.sellers.append(seller)
+            cls.products.append(Product.objects.create(
+                name=f"{name} knife", category=category, subcategory=subcategory, price=Decimal("25.00"),
+                admin_id=seller, stock=4))
+
+    def seller_page_cached(self, seller):
+        key = SELLER_PRODUCTS_KEY.format(
+            seller_id=seller.id, generation=get_partition_generation(seller_partition(seller.id)))
+        return cache.get(key) is not None
+
+    def test_generations_move_per_partition(self):
+        north, south = (seller_partition(seller.id) for seller in self.sellers)
+        combined = get_partition_generations([north, south])
+        self.assertEqual(combined, get_partition_generations([north, south]))
+        bump_partitions([south])
+        self.assertNotEqual(get_partition_generations([north, south]), combined)
+        self.assertEqual(combined.split(".")[1], get_partition_generations([north]).split(".")[1])
+
+        # Bumping every partition moves the shared component
+        north_generation = get_partition_generation(north)
+        bump_partitions()
+        self.assertNotEqual(get_partition_generation(north), north_generation)
+
+    def test_seller_page_stays_cached_when_another_seller_changes(self):
+        north, south = self.sellers
+        response = self.client.get(reverse("seller_details", args=[north.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.seller_page_cached(north))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=self.products[1].id).update(price=Decimal("20.00"))
+        self.assertTrue(self.seller_page_cached(north))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=self.products[0].id).update(price=Decimal("22.00"))
+        self.assertFalse(self.seller_page_cached(north))
+        response = self.client.get(reverse("seller_details", args=[north.id]))
+        self.assertEqual([product.price for product in response.context["products"]], [Decimal("22.00")])
@@ -4,16 +4,18 @@ from django.conf.urls.static import static
 from store.views import (
     home, cart_view, add_to_cart, login_view, signup_view, firebase_auth, logout_view, check_email, cart_count,
     update_cart, admin_dashboard, admin_login, add_product_view, delete_product_view, remove_from_cart,
-    update_product_view, check_login_status, api_products, update_verification, about_us, apply_promo, checkout, admin_approve_order,
+    update_product_view, check_login_status, api_products, api_product_changes, api_suggest, update_verification, about_us, apply_promo, checkout, admin_approve_order,
     place_order, order_success, admin_orders, order_details, admin_analysis, orders_view, cancel_order, help_support,
     update_stock, admin_signup, get_subcategories, get_categories, seller_page, seller_details, seller_product_details,
-    seller_order_analytics, admin_products, restock_product, toggle_product_status, admin_logout  # Import the new place_order view
+    seller_order_analytics, admin_products, restock_product, toggle_product_status, admin_logout,  # Import the new place_order view
+    product_grid_page,
 )
 # from django.contrib import admin
 
 urlpatterns = [
     path("check-login-status/", check_login_status, name="check_login_status"),
     path("", home, name="home"),
+    path("products/page/", product_grid_page, name="product_grid_page"),
     path('about_us/', about_us, name='about_us'),
     path("login/", login_view, name="login"),
     path("signup/", signup_view, name="signup"),
@@ -36,6 +38,8 @@ urlpatterns = [
     path("store-admin/admin_update/<int:product_id>/", update_product_view,
          name="admin_update"),  # ✅ Added update product URL
     path('api/products/', api_products, name='api_products'),
+    path('api/products/changes/', api_product_changes, name='api_product_changes'),
+    path('api/suggest/', api_suggest, name='api_suggest'),
     path('update_verification/', update_verification, name='update_verification'),
     path('checkout/', checkout, name='checkout'),
     path("place-order/", place_order, name="place_order"),
@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods, condition
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 import json
+import hashlib
 from firebase_admin import auth, credentials
 import firebase_admin
 from pymongo import MongoClient
@@ -27,7 +29,18 @@ from supabase import create_client
 from django.core.mail import send_mail
 from django.conf import settings
 from .services.orm_queries import CartService
-import difflib
+from .services.search_index import search_products
+from .services.storage_urls import public_url
+from .services.catalog_columns import get_versioned_catalog_columns, VARIANT_ATTRIBUTES
+from .services.facets import get_facets, price_buckets, PRICE_STEP
+from .services.catalog_cache import (get_catalog_revision, get_catalog_last_modified, get_partition_generation,
+                                     seller_partition)
+from .services.suggest import suggest, SUGGEST_TOP_K
+from .services.search_cache import cached_search_ids
+from .services.cache_flight import get_or_build
+from .services.trending import get_trending_ids, TRENDING_SIZE
+from .services.co_purchase import get_bought_together, record_co_purchases
+from .services.similar import get_similar_products
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Prefetch
@@ -38,17 +51,20 @@ from django.db.models import Sum, Count, Avg
 import traceback
 # Ensure your Order model is correctly imported
 from store.models import Order, Product, User, Cart, OrderItem, AdminStore, Category, Subcategory
-from store.services.orm_queries import (create_user, get_user_by_uid, get_all_products, orm_add_product, fetch_all_products,
+from store.services.orm_queries import (create_user, get_user_by_uid, orm_add_product,
                                         delete_product, orm_update_product, fetch_product_details_orm, get_promo_code_details,
                                         get_products_by_ids, create_order, create_order_items,
                                         delete_purchased_products, delete_order, get_user_email, get_order_by_id,
                                         update_order_status, get_order_items, get_all_orders, get_order_items_with_details, extract_customer_name,
-                                        get_all_orders_for_admin, get_user_orders, create_admin_store_record, get_public_logo_url)
+                                        get_all_orders_for_admin, get_user_orders, create_admin_store_record, get_public_logo_url,
+                                        PRODUCTS_PAGE_SIZE, iter_products_with_variants, iter_product_json_blobs,
+                                        API_PRODUCT_FIELDS, API_EXPANDABLE,
+                                        get_product_changes, CHANGES_PAGE_SIZE, decode_position_token,
+                                        get_active_products_by_id)
 from django.db.models import Q
 from django.template.loader import render_to_string
 from django.contrib.auth import authenticate
 from django.contrib.auth import authenticate, login
-from django.core.cache import cache
 
 # Load environment variables from .env file
 # load_dotenv()
@@ -74,10 +90,6 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 ADMIN_UID = os.getenv("ADMIN_UID")
 
 
-def clear_products_cache():
-    cache.delete("all_products_with_variants")
-
-
 def seller_approved_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
@@ -234,18 +246,125 @@ def firebase_auth(request):
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 
-def fuzzy_search(query, text, threshold=0.5):
+def _parse_price(value):
+    """Parse an optional price filter from the query string; NaN and Infinity are ignored."""
+    try:
+        price = Decimal(value) if value not in (None, "") else None
+    except (ArithmeticError, ValueError):
+        return None
+    return price if price is not None and price.is_finite() else None
+
+
+def _parse_page(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+# Options shown per attribute in the sidebar
+ATTRIBUTE_FILTER_LIMIT = 12
+
+NO_STOREFRONT_FILTERS = {"category": None, "subcategory": None, "min_price": None, "max_price": None, "in_stock": False,
+                         "color": None, "size": None, "fit": None}
+
+
+def _storefront_listing(request, with_facets=False):
     """
-    Returns True if the query approximately matches any word in text.
-    First, it checks for an exact substring match. Otherwise, it splits the text
-    into words and returns True if any word has a similarity ratio above the threshold.
+    Resolve the product page for the storefront filters in `request.GET`.
+    Filtering and sorting run over the columnar catalog; free-text search first
+    narrows it to the configured search backend's ranked results. Only the
+    products on the requested page are materialised. With `with_facets` the
+    sidebar facet counts for the same filter state are included.
     """
-    if query in text:
-        return True
-    for word in text.split():
-        if difflib.SequenceMatcher(None, query, word).ratio() >= threshold:
-            return True
-    return False
+    selected_category = request.GET.get('category')
+    selected_subcategory = request.GET.get('subcategory')
+    sort_option = request.GET.get("sort", "featured")
+    min_price = _parse_price(request.GET.get("min_price"))
+    max_price = _parse_price(request.GET.get("max_price"))
+    in_stock = request.GET.get("in_stock") in ("1", "true", "on")
+    page = _parse_page(request.GET.get("page"))
+    query = request.GET.get("q", "").strip().lower()
+    # Variant attributes, e.g. ?size=m&color=black (with in_stock: that variant is in stock)
+    attributes = {attribute: request.GET.get(attribute, "").strip().lower() or None
+                  for attribute in VARIANT_ATTRIBUTES}
+
+    # Search results are cached under the version these columns were built from
+    columns_version, columns = get_versioned_catalog_columns()
+    filters = {
+        "category": (selected_category or "").lower() or None,
+        "subcategory": (selected_subcategory or "").lower() or None,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock,
+        **attributes,
+    }
+
+    def search_ids(sort, filters):
+        # Ordered ids per (normalized query, sort, filters) are cached under the
+        # version of `columns` (select() keeps only their products, whatever the
+        # search backend returns), or under the category's and its sellers'
+        # generations when filtered to one category
+        category_id = columns.category_slugs.get(filters["category"] or "")
+        return cached_search_ids(
+            query, sort, filters,
+            lambda normalized: columns.select(sort=sort, ids=search_products(normalized), **filters),
+            columns_version, category_id=category_id,
+            seller_ids=columns.category_sellers(category_id) if category_id is not None else ())
+
+    if query:
+        product_ids = search_ids(sort_option, filters)
+    else:
+        product_ids = columns.select(sort=sort_option, **filters)
+
+    offset = (page - 1) * PRODUCTS_PAGE_SIZE
+    # Read separately from the columns, so it can be a catalog version ahead or
+    # behind them; skip ids it no longer (or does not yet) have, like the trending rail
+    products_by_id = get_active_products_by_id()
+    listing = {
+        "products": [products_by_id[product_id]
+                     for product_id in product_ids[offset:offset + PRODUCTS_PAGE_SIZE].tolist()
+                     if product_id in products_by_id],
+        "page": page,
+        "has_next": len(product_ids) > offset + PRODUCTS_PAGE_SIZE,
+        "result_count": len(product_ids),
+    }
+
+    if with_facets:
+        hits = search_ids("featured", NO_STOREFRONT_FILTERS) if query else None
+        # Category/price/stock counts only cover products matching the attribute filters
+        facet_ids = hits
+        if any(attributes.values()):
+            facet_ids = columns.select(ids=hits, in_stock=in_stock, **attributes)
+        listing["facets"] = get_facets(
+            category_id=columns.category_slugs.get((selected_category or "").lower()),
+            subcategory_id=columns.subcategory_slugs.get((selected_subcategory or "").lower()),
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=in_stock,
+            product_ids=facet_ids,
+        )
+        listing["facets"]["attributes"] = columns.attribute_facets(ids=hits, **filters)
+        listing["attribute_labels"] = columns.attribute_labels
+
+    next_page_url = None
+    if listing["has_next"]:
+        params = request.GET.copy()
+        params["page"] = listing["page"] + 1
+        next_page_url = f"{reverse('product_grid_page')}?{params.urlencode()}"
+
+    listing.update({
+        "query": query,
+        "sort_option": sort_option,
+        "selected_category": selected_category,
+        "selected_subcategory": selected_subcategory,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock,
+        "selected_attributes": attributes,
+        "next_page_url": next_page_url,
+    })
+    return listing
 
 
 def home(request):
@@ -258,55 +377,83 @@ def home(request):
     user_name = user.name if user else None
     user_email = user.email if user else None
 
-    # Fetch all products (assumed to include keys like category__slug, etc.)
-    products = get_all_products()
-
-    # Get selected filters from query parameters (using slugs)
-    selected_category = request.GET.get('category')
-    selected_subcategory = request.GET.get('subcategory')
+    # Filtered, sorted and paginated products for the current query string
+    listing = _storefront_listing(request, with_facets=True)
+    facets = listing.pop("facets")
+    attribute_labels = listing.pop("attribute_labels")
 
     # Fetch active categories with their subcategories
-    categories = Category.objects.filter(is_active=True).prefetch_related(
+    categories = list(Category.objects.filter(is_active=True).prefetch_related(
         Prefetch('subcategories',
                  queryset=Subcategory.objects.filter(is_active=True))
-    )
-
-    if selected_category:
-        products = [
-            p for p in products
-            if p.get("category__slug", "").lower() == selected_category.lower()
-        ]
-
-    if selected_subcategory:
-        products = [
-            p for p in products
-            if p.get("subcategory__slug", "").lower() == selected_subcategory.lower()
-        ]
-
-    # Search query across relevant fields (adjust field names if needed)
-    query = request.GET.get("q", "").strip()
-    if query:
-        query = query.lower()
-        products = [
-            p for p in products if any(
-                fuzzy_search(query, str(p[field]).lower())
-                for field in [
-                    "name", "category__name", "description", "price",
-                    "original_price", "created_at", "image_url",
-                    "image_url2", "image_url3", "image_url4"
-                ] if p.get(field)
-            )
-        ]
+    ))
+
+    # Attach sidebar counts for the current filters
+    for category in categories:
+        category.product_count = facets["categories"].get(category.id, 0)
+        for sub in category.subcategories.all():
+            sub.product_count = facets["subcategories"].get(sub.id, 0)
+
+    price_filters = []
+    for index, (low, high) in enumerate(price_buckets()):
+        params = request.GET.copy()
+        params.pop("page", None)
+        params.pop("min_price", None)
+        params.pop("max_price", None)
+        if low is not None:
+            params["min_price"] = low
+        if high is not None:
+            params["max_price"] = high
+        price_filters.append({
+            "label": f"Under ₹{high + PRICE_STEP:,.0f}" if low is None
+            else f"₹{low:,.0f}+" if high is None
+            else f"₹{low:,.0f} – ₹{high + PRICE_STEP:,.0f}",
+            "url": f"{reverse('home')}?{params.urlencode()}",
+            "count": facets["price_buckets"].get(index, 0),
+            "selected": listing["min_price"] == low and listing["max_price"] == high,
+        })
 
-    # Retrieve and apply sort option
-    sort_option = request.GET.get("sort", "featured")
-    if sort_option == "price-low":
-        products.sort(key=lambda p: p.get("price", 0))
-    elif sort_option == "price-high":
-        products.sort(key=lambda p: p.get("price", 0), reverse=True)
-    elif sort_option == "newest":
-        products.sort(key=lambda p: p.get("created_at", ""), reverse=True)
-    # For 'featured' or any other sort, you can add additional sorting logic here
+    # Color / size / fit options, most common first; selecting one again clears it
+    attribute_filters = []
+    for attribute in VARIANT_ATTRIBUTES:
+        counts = facets["attributes"][attribute]
+        selected = listing["selected_attributes"][attribute]
+        values = sorted(counts, key=lambda value: (-counts[value], value))[:ATTRIBUTE_FILTER_LIMIT]
+        if selected and selected not in values:
+            values.append(selected)
+        options = []
+        for value in values:
+            params = request.GET.copy()
+            params.pop("page", None)
+            if value == selected:
+                params.pop(attribute, None)
+            else:
+                params[attribute] = value
+            options.append({
+                "label": attribute_labels[attribute].get(value, value),
+                "url": f"{reverse('home')}?{params.urlencode()}",
+                "count": counts.get(value, 0),
+                "selected": value == selected,
+            })
+        if options:
+            attribute_filters.append({"name": attribute.title(), "options": options})
+
+    in_stock_params = request.GET.copy()
+    in_stock_params.pop("page", None)
+    if listing["in_stock"]:
+        in_stock_params.pop("in_stock", None)
+    else:
+        in_stock_params["in_stock"] = "1"
+
+    # "Trending now" rail, only above the unfiltered catalog
+    trending_products = []
+    unfiltered = not (listing["query"] or listing["selected_category"] or listing["selected_subcategory"]
+                      or listing["min_price"] is not None or listing["max_price"] is not None
+                      or listing["in_stock"] or any(listing["selected_attributes"].values()))
+    if unfiltered and listing["page"] == 1:
+        products_by_id = get_active_products_by_id()
+        trending_products = [products_by_id[product_id] for product_id in get_trending_ids()
+                             if product_id in products_by_id][:TRENDING_SIZE]
 
     # --- Fetch all approved sellers (stores) ---
     sellers = AdminStore.objects.filter(
@@ -314,15 +461,17 @@ def home(request):
     logger.debug(f"Sellers count: {sellers.count()}")
 
     context = {
-        "products": products,
         "user_name": user_name,
         "user_email": user_email,
-        "query": query,
-        "sort_option": sort_option,
         "categories": categories,
-        "selected_category": selected_category,
-        "selected_subcategory": selected_subcategory,
+        "all_items_count": sum(facets["categories"].values()),
+        "price_filters": price_filters,
+        "attribute_filters": attribute_filters,
+        "in_stock_count": facets["in_stock"],
+        "in_stock_url": f"{reverse('home')}?{in_stock_params.urlencode()}",
+        "trending_products": trending_products,
         "sellers": sellers,  # Pass the sellers queryset here.
+        **listing,
     }
 
     return render(
@@ -332,10 +481,171 @@ def home(request):
     )
 
 
+@require_http_methods(["GET"])
+def product_grid_page(request):
+    """Return the next page of product cards as HTML for infinite scroll."""
+    listing = _storefront_listing(request)
+    html = render_to_string(
+        "store/partials/product_cards.html", {"products": listing["products"]}, request)
+    return JsonResponse({
+        "html": html,
+        "page": listing["page"],
+        "has_next": listing["has_next"],
+        "next_page_url": listing["next_page_url"],
+    })
+
+
+def _catalog_etag(request, *args, **kwargs):
+    # One tag per catalog revision and exact URL (fields/limit/cursor change the body)
+    digest = hashlib.sha1(request.get_full_path().encode()).hexdigest()[:12]
+    return f"{get_catalog_revision()}-{digest}"
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_last_modified()
+
+
+# Answers If-None-Match / If-Modified-Since with 304 from the catalog revision
+# alone, before the view queries or serializes anything.
+catalog_conditional = condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+
+
+API_MAX_LIMIT = 1000
+
+
+def _stream_products_json(fields, limit, cursor, paginated, expand=()):
+    """
+    Stream products as they come off the database cursor. Full products are
+    joined from their cached JSON blobs; sparse fieldsets are encoded per request.
+    Paginated responses are wrapped as {"results": [...], "next_cursor": position}.
+    """
+    encoder = DjangoJSONEncoder()
+    yield b'{"results": [' if paginated else b"["
+
+    # One extra row tells whether another page follows
+    fetch = limit + 1 if limit else None
+    if fields is None:
+        products = iter_product_json_blobs(fetch, cursor, expand=expand)
+    else:
+        products = ((position, encoder.encode(product).encode())
+                    for position, product in iter_products_with_variants(fields, fetch, cursor, expand=expand))
+
+    buffer = []
+    last_position = None
+    count = 0
+    for position, blob in products:
+        if limit and count == limit:
+            break
+        buffer.append(blob)
+        last_position = position
+        count += 1
+        if len(buffer) >= 100:
+            yield (b"," if count > len(buffer) else b"") + b",".join(buffer)
+            buffer = []
+    else:
+        last_position = None  # ran out of rows: no next page
+    if buffer:
+        yield (b"," if count > len(buffer) else b"") + b",".join(buffer)
+
+    if paginated:
+        yield f'], "next_cursor": {encoder.encode(last_position)}}}'.encode()
+    else:
+        yield b"]"
+
+
+def _parse_api_fields(request):
+    """Sparse fieldset from `?fields=a,b`; None means every field."""
+    if not request.GET.get("fields"):
+        return None
+    fields = {field.strip() for field in request.GET["fields"].split(",") if field.strip()}
+    unknown = fields - set(API_PRODUCT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def _parse_api_expand(request, fields):
+    """Collections to embed from `?expand=variants`; naming one in `?fields=` expands it too."""
+    expand = {name.strip() for name in request.GET.get("expand", "").split(",") if name.strip()}
+    unknown = expand - set(API_EXPANDABLE)
+    if unknown:
+        raise ValueError(f"Unknown expand: {', '.join(sorted(unknown))}")
+    if fields is not None:
+        expand |= fields & set(API_EXPANDABLE)
+    return expand
+
+
+@require_http_methods(["GET"])
+@catalog_conditional
 def api_products(request):
-    products = fetch_all_products()
+    """
+    Stream all non-deleted products as JSON, with variant aggregates; the full
+    variant lists are included with `?expand=variants`.
+    Optional `?fields=name,price` limits the keys of each product and
+    `?limit=&cursor=` pages through the catalog, newest first (by created_at,
+    then id); `cursor` is the opaque `next_cursor` of the previous page.
+    """
+    try:
+        fields = _parse_api_fields(request)
+        expand = _parse_api_expand(request, fields)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    cursor = request.GET.get("cursor") or None
+    if cursor is not None:
+        try:
+            decode_position_token(cursor)
+        except (ValueError, OverflowError):
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+    if limit is not None and not 1 <= limit <= API_MAX_LIMIT:
+        return JsonResponse({"error": f"limit must be between 1 and {API_MAX_LIMIT}"}, status=400)
+
+    paginated = limit is not None or cursor is not None
+    return StreamingHttpResponse(
+        _stream_products_json(fields, limit, cursor, paginated, expand),
+        content_type="application/json",
+    )
 
-    return JsonResponse(products, safe=False)
+
+@require_http_methods(["GET"])
+def api_product_changes(request):
+    """
+    Delta sync: products changed since `?since=<token>` (everything when
+    omitted), oldest first. Clients apply `changed` as upserts and `deleted`
+    as removals, then call again with `next_token` while `has_more` is true.
+    Deactivated products come in `changed` with `is_active` false, which is
+    sent even when `?fields=` leaves it out.
+    Accepts the same `?fields=` and `?expand=` as api_products and `?limit=`.
+    """
+    try:
+        fields = _parse_api_fields(request)
+        expand = _parse_api_expand(request, fields)
+        limit = int(request.GET.get("limit") or CHANGES_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not 1 <= limit <= API_MAX_LIMIT:
+        return JsonResponse({"error": f"limit must be between 1 and {API_MAX_LIMIT}"}, status=400)
+
+    try:
+        changes = get_product_changes(request.GET.get("since") or None, limit, fields, expand)
+    except (ValueError, OverflowError):
+        return JsonResponse({"error": "Invalid since token"}, status=400)
+    return JsonResponse(changes)
+
+
+@require_http_methods(["GET"])
+def api_suggest(request):
+    """Type-ahead completions for `?q=` (product, category, subcategory and seller names)."""
+    query = request.GET.get("q", "")
+    try:
+        limit = min(max(int(request.GET.get("limit") or SUGGEST_TOP_K), 1), SUGGEST_TOP_K)
+    except ValueError:
+        limit = SUGGEST_TOP_K
+    return JsonResponse({"query": query, "suggestions": suggest(query, limit)})
 
 
 def login_required(view_func):
@@ -557,7 +867,10 @@ def cart_view(request):
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'cart': cart_data}, safe=False)
-        return render(request, "store/cart.html", {"cart": cart_data})
+        return render(request, "store/cart.html", {
+            "cart": cart_data,
+            "recommendations": get_bought_together(cart_data.keys()),
+        })
 
     except Exception as e:
         print(f"Cart view error: {str(e)}")  # Add logging
@@ -722,24 +1035,6 @@ def admin_login(request):
         logger.error(f"❌ Unexpected error in admin_login: {str(e)}")
         return JsonResponse({"error": "Internal server error"}, status=500)
 
-# API endpoint to get all active categories
-
-
-@require_http_methods(["GET"])
-def get_categories(request):
-    categories = Category.objects.filter(is_active=True).values('id', 'name')
-    return JsonResponse(list(categories), safe=False)
-
-# API endpoint to get subcategories for a specific category
-
-
-@require_http_methods(["GET"])
-def get_subcategories(request, category_id):
-    subcategories = Subcategory.objects.filter(
-        category_id=category_id,
-        is_active=True
-    ).values('id', 'name')
-    return JsonResponse(list(subcategories), safe=False)
 
 
 @admin_required
@@ -805,9 +1100,6 @@ def add_product_view(request):
                 # Return the error message properly
                 return JsonResponse(product, status=400)
             if product:
-                # Invalidate the cache after a successful product addition.
-                clear_products_cache()
-
                 messages.success(request, "Product added successfully!")
                 return JsonResponse({"success": True}, status=200)
             else:
@@ -876,9 +1168,6 @@ def update_product_view(request, product_id):
             messages.error(request, update_response["error"])
             return JsonResponse({"error": update_response["error"]}, status=400)
         else:
-            # Invalidate the cache after updating
-            clear_products_cache()
-
             messages.success(request, "Product updated successfully!")
             return JsonResponse({"success": "Product updated successfully!"}, status=200)
 
@@ -1035,7 +1324,6 @@ def update_product_view(request, product_id):
 @admin_required
 def delete_product_view(request, product_id):
     response = delete_product(request, product_id)
-    clear_products_cache()  # Clear cache after deletion
     return response
 
 
@@ -1201,6 +1489,10 @@ def place_order(request):
                 delete_order(order_id)  # Rollback order
                 return JsonResponse({"error": "Order items creation failed, order canceled"}, status=500)
 
+            # Update the "frequently bought together" pairs for this basket
+            record_co_purchases(
+                OrderItem.objects.filter(order_id=order_id).values_list("product_id", flat=True))
+
             # # Delete purchased products
             # error = delete_purchased_products(cart)
             # if error:
@@ -1414,7 +1706,7 @@ def admin_approve_order(request, order_id, action):
                     product = order_item.product_id  # This should be a Product instance
                     product.stock += order_item.quantity  # Restore stock
                     product.is_active = True  # Ensure product is active again
-                    product.save()
+                    product.save(update_fields=["stock", "is_active", "updated_at"])  # see Product.save
 
                 send_rejection_email(order.user_id.id, order_id)
                 return redirect('admin_orders')
@@ -1600,7 +1892,7 @@ def cancel_order(request, order_id):
         product = order_item.product_id  # This should be a Product instance
         product.stock += order_item.quantity  # Restore stock
         product.is_active = True  # Ensure the product is marked as active again
-        product.save()
+        product.save(update_fields=["stock", "is_active", "updated_at"])  # see Product.save
 
     # Update the order status to "canceled"
     order.status = "canceled"
@@ -1681,7 +1973,7 @@ def update_stock(request):
         # Ensure is_active is True when stock is available
         product.is_active = new_stock > 0
 
-        product.save()
+        product.save(update_fields=["stock", "is_active", "updated_at"])  # see Product.save
 
         # Refresh from the database to ensure changes are reflected
         product.refresh_from_db()
@@ -1785,7 +2077,7 @@ def approve_admin_signup(request, seller_id):
     seller = get_object_or_404(AdminStore, id=seller_id)
     if request.method == "POST":
         seller.is_approved = True
-        seller.save()
+        seller.save()  # the seller now shows up in suggestions; see AdminStore.save
 
         # Retrieve seller email from the AdminStore record
         seller_email = seller.email
@@ -1821,8 +2113,7 @@ def seller_page(request):
     for seller in sellers:
         if seller.company_logo:
             try:
-                seller.company_logo = supabase.storage.from_(
-                    "product-image").get_public_url(seller.company_logo)
+                seller.company_logo = public_url(seller.company_logo)
                 logger.debug(f"Company logo public URL: {seller.company_logo}")
             except Exception as e:
                 logger.error(
@@ -1837,6 +2128,14 @@ def seller_page(request):
     return render(request, 'store/seller.html', context)
 
 
+# Seller-scoped caches, keyed by the seller's partition generation. Rebuilt by
+# one request at a time (cache_flight.get_or_build); the others keep serving the
+# previous generation meanwhile.
+SELLER_PRODUCTS_KEY = "seller_products:{seller_id}:{generation}"
+SELLER_LOW_STOCK_KEY = "seller_low_stock:{seller_id}:{generation}"
+SELLER_CACHE_TIMEOUT = 60 * 60 * 24
+
+
 def seller_details(request, adminstore_id):
     """
     View to fetch a single seller's details along with their products.
@@ -1849,8 +2148,7 @@ def seller_details(request, adminstore_id):
     if seller.company_logo:
         try:
             # Assuming company logos are stored in the same bucket as product images
-            seller.company_logo_url = supabase.storage.from_(
-                "product-image").get_public_url(seller.company_logo)
+            seller.company_logo_url = public_url(seller.company_logo)
             logger.debug(f"Company logo public URL: {seller.company_logo_url}")
         except Exception as e:
             logger.error(f"Error generating public URL for company logo: {e}")
@@ -1858,23 +2156,32 @@ def seller_details(request, adminstore_id):
     else:
         seller.company_logo_url = static('images/placeholder.png')
 
-    # Fetch products that belong to this seller, are active and not deleted
-    products = seller.products.filter(
-        is_active=True, is_deleted=False).order_by('-created_at')
+    # The seller's product list only changes with their own products, so it is
+    # cached per seller generation (see catalog_cache.get_partition_generation)
+    products_key = SELLER_PRODUCTS_KEY.format(
+        seller_id=seller.id, generation=get_partition_generation(seller_partition(seller.id)))
 
-    # Generate public URLs for product images
-    for product in products:
-        if product.image_url:
-            try:
-                product.main_image_url = supabase.storage.from_(
-                    "product-image").get_public_url(product.image_url)
-                logger.debug(f"Product image URL: {product.main_image_url}")
-            except Exception as e:
-                logger.error(
-                    f"Error generating public URL for product image: {e}")
+    def build():
+        # Fetch products that belong to this seller, are active and not deleted
+        products = list(seller.products.filter(
+            is_active=True, is_deleted=False).order_by('-created_at'))
+
+        # Generate public URLs for product images
+        for product in products:
+            if product.image_url:
+                try:
+                    product.main_image_url = public_url(product.image_url)
+                    logger.debug(f"Product image URL: {product.main_image_url}")
+                except Exception as e:
+                    logger.error(
+                        f"Error generating public URL for product image: {e}")
+                    product.main_image_url = static('images/placeholder.png')
+            else:
                 product.main_image_url = static('images/placeholder.png')
-        else:
-            product.main_image_url = static('images/placeholder.png')
+        return products
+
+    products, _ = get_or_build(products_key, build, SELLER_CACHE_TIMEOUT,
+        latest_key=SELLER_PRODUCTS_KEY.format(seller_id=seller.id, generation="latest"))
 
     context = {
         'seller': seller,
@@ -1896,33 +2203,28 @@ def seller_product_details(request, product_id):
     images = []
     # Always attempt to fetch the main image (image_url)
     if product.image_url:
-        main_url = supabase.storage.from_(
-            "product-image").get_public_url(product.image_url)
+        main_url = public_url(product.image_url)
         logger.debug(f"Main image public URL: {main_url}")
         images.append(main_url)
     else:
         # Optionally: fallback to first additional image if main is missing.
         if product.image_url2:
-            main_url = supabase.storage.from_(
-                "product-image").get_public_url(product.image_url2)
+            main_url = public_url(product.image_url2)
             logger.debug(f"Fallback main image from image_url2: {main_url}")
             images.append(main_url)
 
     # Fetch additional images if they exist; avoid duplicate if already added.
     if product.image_url2:
-        url2 = supabase.storage.from_(
-            "product-image").get_public_url(product.image_url2)
+        url2 = public_url(product.image_url2)
         if url2 not in images:
             logger.debug(f"Additional image 2 URL: {url2}")
             images.append(url2)
     if product.image_url3:
-        url3 = supabase.storage.from_(
-            "product-image").get_public_url(product.image_url3)
+        url3 = public_url(product.image_url3)
         logger.debug(f"Additional image 3 URL: {url3}")
         images.append(url3)
     if product.image_url4:
-        url4 = supabase.storage.from_(
-            "product-image").get_public_url(product.image_url4)
+        url4 = public_url(product.image_url4)
         logger.debug(f"Additional image 4 URL: {url4}")
         images.append(url4)
 
@@ -1937,7 +2239,14 @@ def seller_product_details(request, product_id):
         'product': product,
         # List of public URLs for each image field that exists.
         'images': images,
+        'frequently_bought_together': get_bought_together([product.id]),
+        # Content-based, so new products without sales still get neighbours
+        'similar_products': get_similar_products(product.id),
     }
+    context['recommendation_rails'] = [
+        ("Frequently bought together", context['frequently_bought_together']),
+        ("Similar items", context['similar_products']),
+    ]
     return render(request, 'store/product_detail.html', context)
 
 
@@ -2084,12 +2393,7 @@ def admin_dashboard(request, admin_id=None):
         return redirect(reverse('admin_signup'))  # Redirect if admin not found
 
     # Get the public URL for the main image if it exists
-    company_logo_url = (
-        supabase.storage.from_(
-            "product-image").get_public_url(admin.company_logo)
-        if admin.company_logo
-        else None
-    )
+    company_logo_url = public_url(admin.company_logo)
     print("Company logo URL:", company_logo_url)
 
     # Get today's date
@@ -2186,27 +2490,31 @@ def admin_dashboard(request, admin_id=None):
             'status_class': status_class
         })
 
-    # Get products with low stock
-    low_stock_products = Product.objects.filter(
-        admin_id=admin,
-        is_active=True,
-        is_deleted=False,
-        stock__lte=5
-    ).order_by('id').distinct('id')[:5]
-
-    # Debug: print product IDs
-    print("Low stock product IDs:")
-    for p in low_stock_products:
-        print(p.id)
-
-    # Format low stock products for display
-    low_stock_display = []
-    for product in low_stock_products:
-        low_stock_display.append({
-            'id': product.id,
-            'name': product.name,
-            'stock': product.stock
-        })
+    # Low-stock products, cached per seller generation like the seller page
+    low_stock_key = SELLER_LOW_STOCK_KEY.format(
+        seller_id=admin.id, generation=get_partition_generation(seller_partition(admin.id)))
+
+    def build():
+        # Get products with low stock
+        low_stock_products = Product.objects.filter(
+            admin_id=admin,
+            is_active=True,
+            is_deleted=False,
+            stock__lte=5
+        ).order_by('id').distinct('id')[:5]
+
+        # Format low stock products for display
+        low_stock_display = []
+        for product in low_stock_products:
+            low_stock_display.append({
+                'id': product.id,
+                'name': product.name,
+                'stock': product.stock
+            })
+        return low_stock_display
+
+    low_stock_display, _ = get_or_build(low_stock_key, build, SELLER_CACHE_TIMEOUT,
+        latest_key=SELLER_LOW_STOCK_KEY.format(seller_id=admin.id, generation="latest"))
 
     context = {
         'admin': admin,
@@ -2314,17 +2622,13 @@ def restock_product(request):
     product = get_object_or_404(Product, id=product_id)
     original_stock = product.stock
     product.stock += quantity
-    product.save()
+    product.save(update_fields=["stock", "updated_at"])  # see Product.save
 
     messages.success(
         request, f"Successfully restocked {product.name} from {original_stock} to {product.stock} units.")
     return redirect(reverse('admin_dashboard'))
 
 
-def clear_products_cache():
-    cache.delete("all_products_with_variants")
-
-
 @admin_required
 @csrf_exempt
 def add_product_view(request):
@@ -2388,9 +2692,6 @@ def add_product_view(request):
                 # Return the error message properly
                 return JsonResponse(product, status=400)
             if product:
-                # Invalidate the cache after a successful product addition.
-                clear_products_cache()
-
                 messages.success(request, "Product added successfully!")
                 return JsonResponse({"success": True}, status=200)
             else:
@@ -2452,7 +2753,6 @@ def update_product_view(request, product_id):
             messages.error(request, update_response["error"])
             return JsonResponse({"error": update_response["error"]}, status=400)
         else:
-            clear_products_cache()
             messages.success(request, "Product updated successfully!")
             return JsonResponse({"success": "Product updated successfully!"}, status=200)
 
@@ -2461,6 +2761,7 @@ def update_product_view(request, product_id):
 
 # API endpoint to get all active categories
 @require_http_methods(["GET"])
+@catalog_conditional
 def get_categories(request):
     categories = Category.objects.filter(is_active=True).values('id', 'name')
     return JsonResponse(list(categories), safe=False)
@@ -2469,6 +2770,7 @@ def get_categories(request):
 
 
 @require_http_methods(["GET"])
+@catalog_conditional
 def get_subcategories(request, category_id):
     subcategories = Subcategory.objects.filter(
         category_id=category_id,
@@ -2493,7 +2795,7 @@ def toggle_product_status(request, product_id):
     # Only allow POST requests (or check permissions as needed)
     product = get_object_or_404(Product, id=product_id)
     product.is_active = not product.is_active
-    product.save()
+    product.save()  # invalidates the product's catalog caches
     status = "activated" if product.is_active else "deactivated"
     messages.success(
         request, f"Product '{product.name}' has been {status}.", extra_tags='product_messages')
@@ -2503,7 +2805,6 @@ def toggle_product_status(request, product_id):
 @admin_required
 def delete_product_view(request, product_id):
     response = delete_product(request, product_id)
-    clear_products_cache()  # Clear cache after deletion
     messages.success(request, "Product deleted successfully",
                      extra_tags='product_messages')
     return response